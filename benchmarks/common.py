@@ -0,0 +1,78 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+SRC = os.path.join(ROOT, "src")
+PROD_CONFIG = os.path.join(SRC, "config_prod.json")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+    }
+
+
+def scaled_config(base: Dict[str, Any], scale: int) -> Dict[str, Any]:
+    config: Dict[str, Any] = {}
+    for copy in range(scale):
+        for index, details in enumerate(base.values()):
+            locks = [{**lock, "id": f"{copy}-{lock['id']}" if copy else lock["id"]} for lock in details["locks"]]
+            config[f"10.{copy}.{index}.1"] = {"boards": details["boards"], "locks": locks}
+    return config
+
+
+def load_prod_config(scale: int = 1) -> Dict[str, Any]:
+    with open(PROD_CONFIG) as jsonfile:
+        return scaled_config(json.load(jsonfile), scale)
+
+
+def lock_count(config: Dict[str, Any]) -> int:
+    return sum(len(details["locks"]) for details in config.values())
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_source_imports() -> None:
+    os.environ.setdefault("USERNAME", "bench")
+    os.environ.setdefault("PASSWORD_HASH", "unused")
+    os.environ.setdefault("TOKEN_DB", "")
+    os.environ["LOG_LEVEL"] = "CRITICAL"
+    os.chdir(SRC)
+    sys.path.insert(0, SRC)
+
+
+def write_report(suite: str, params: Dict[str, Any], results: List[Dict[str, Any]], output: Optional[str]) -> None:
+    report = {
+        "suite": suite,
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as jsonfile:
+            jsonfile.write(text + "\n")
+    print(text)
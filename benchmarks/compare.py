@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+LOWER_IS_BETTER = ("_ns", "_ms")
+HIGHER_IS_BETTER = ("_per_s",)
+IGNORED = ("loops", "requests", "errors", "codes", "median_ns", "max_ms", "mean_ms")
+
+
+def case_key(result: Dict[str, Any]) -> Tuple[Any, ...]:
+    labels = [(key, value) for key, value in result.items() if key not in IGNORED and not key.endswith(LOWER_IS_BETTER + HIGHER_IS_BETTER)]
+    return tuple(sorted((key, json.dumps(value)) for key, value in labels))
+
+
+def load_cases(path: str) -> Tuple[str, Dict[Tuple[Any, ...], Dict[str, Any]]]:
+    with open(path) as jsonfile:
+        report = json.load(jsonfile)
+    return report["suite"], {case_key(result): result for result in report["results"]}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Tuple[str, float, float, float, bool]]:
+    rows = []
+    for metric, before in baseline.items():
+        after = current.get(metric)
+        if metric in IGNORED or not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or not before:
+            continue
+        change = (after - before) / before
+        if metric.endswith(LOWER_IS_BETTER):
+            rows.append((metric, before, after, change, change > threshold))
+        elif metric.endswith(HIGHER_IS_BETTER):
+            rows.append((metric, before, after, change, -change > threshold))
+    return rows
+
+
+def main(args: argparse.Namespace) -> int:
+    suite, baseline = load_cases(args.baseline)
+    current_suite, current = load_cases(args.current)
+    if suite != current_suite:
+        print(f"Cannot compare a {suite} report with a {current_suite} report")
+        return 2
+    regressions = 0
+    for key, before in baseline.items():
+        after = current.get(key)
+        if after is None:
+            print(f"{before['name']}: missing in {args.current}")
+            continue
+        for metric, old, new, change, regressed in compare(before, after, args.threshold):
+            regressions += regressed
+            flag = "REGRESSION" if regressed else ""
+            labels = ", ".join(f"{label}={json.loads(value)}" for label, value in key if label != "name")
+            print(f"{before['name']:<24} {labels:<32} {metric:<18} {old:>14} {new:>14} {change:>+8.1%} {flag}")
+    print(f"{regressions} regressions over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports and fail on regressions")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression")
+    sys.exit(main(parser.parse_args()))
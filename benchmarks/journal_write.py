@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def probe_lag(lags: List[float], stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+def count_rows(path: str) -> int:
+    with sqlite3.connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+async def record_cost(journal: Any, events: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for i in range(events):
+        journal.record("state", f"{i % 288}", "10.0.0.1", outcome="open", details={"version": i})
+    elapsed = time.perf_counter() - started
+    await journal.flush()
+    return {"scenario": "record_call", "events": events, "ns_per_record": round(elapsed / events * 1e9)}
+
+
+async def sustained(journal: Any, pulse_rate: float, state_rate: float, duration: float, tick: float) -> Dict[str, Any]:
+    lags: List[float] = []
+    backlog: List[int] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(lags, stop, tick))
+    started = time.perf_counter()
+    pulses = states = 0
+    while time.perf_counter() - started < duration:
+        elapsed = time.perf_counter() - started
+        while pulses < pulse_rate * elapsed:
+            journal.record("pulse", f"{pulses % 288}", "10.0.0.1", "bench", "confirmed", {"message": "opened", "timings": {"queue_wait_ms": 0.1}})
+            pulses += 1
+        while states < state_rate * elapsed:
+            journal.record("state", f"{states % 288}", "10.0.0.1", outcome="open" if states % 2 else "closed", details={"version": states})
+            states += 1
+        backlog.append(len(journal.pending))
+        await asyncio.sleep(tick)
+    drain_started = time.perf_counter()
+    await journal.flush()
+    drain = time.perf_counter() - drain_started
+    stop.set()
+    await probe
+    return {
+        "scenario": "sustained",
+        "pulses_per_s": pulse_rate,
+        "state_changes_per_s": state_rate,
+        "duration_s": duration,
+        "recorded": pulses + states,
+        "max_backlog": max(backlog, default=0),
+        "drain_ms": round(drain * 1000, 1),
+        "loop_lag_ms": {"p50": round(percentile(lags, 0.5) * 1000, 2), "p99": round(percentile(lags, 0.99) * 1000, 2), "max": round(max(lags) * 1000, 2)},
+    }
+
+
+async def burst(journal: Any, locks: int, sweeps: int, interval: float) -> Dict[str, Any]:
+    record_times: List[float] = []
+    backlog: List[int] = []
+    for sweep in range(sweeps):
+        started = time.perf_counter()
+        for lock in range(locks):
+            journal.record("state", f"{lock}", f"10.0.{lock // 288}.1", outcome="open" if sweep % 2 else "closed", details={"version": sweep})
+        record_times.append(time.perf_counter() - started)
+        backlog.append(len(journal.pending))
+        await asyncio.sleep(interval)
+    started = time.perf_counter()
+    await journal.flush()
+    return {
+        "scenario": "burst",
+        "locks": locks,
+        "sweeps": sweeps,
+        "sweep_interval_s": interval,
+        "record_ms_per_sweep": round(max(record_times) * 1000, 1),
+        "max_backlog": max(backlog),
+        "drain_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    from loguru import logger
+
+    logger.remove()
+    from journal import Journal
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "journal.db")
+        journal = Journal(path, batch_size=args.batch_size, flush_interval=args.flush_interval, max_pending=args.max_pending)
+        journal.start()
+        await asyncio.sleep(0.1)
+        results = [
+            await record_cost(journal, args.events),
+            await sustained(journal, args.pulse_rate, args.state_rate, args.duration, args.tick),
+            await burst(journal, args.locks, args.sweeps, args.sweep_interval),
+        ]
+        started = time.perf_counter()
+        found = await journal.query(lock_id="7", start=time.time() - 3600, limit=100)
+        query_ms = round((time.perf_counter() - started) * 1000, 2)
+        await journal.stop()
+        dropped = journal._dropped.value
+        rows = count_rows(path)
+    print(
+        json.dumps(
+            {
+                "batch_size": args.batch_size,
+                "flush_interval": args.flush_interval,
+                "rows": rows,
+                "dropped": dropped,
+                "lock_query": {"events": len(found), "ms": query_ms},
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the event journal write path")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--pulse-rate", type=float, default=100)
+    parser.add_argument("--state-rate", type=float, default=5000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--tick", type=float, default=0.01)
+    parser.add_argument("--locks", type=int, default=14400)
+    parser.add_argument("--sweeps", type=int, default=10)
+    parser.add_argument("--sweep-interval", type=float, default=0.25)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    parser.add_argument("--max-pending", type=int, default=100000)
+    arguments = parser.parse_args()
+    os.environ["LOG_LEVEL"] = "CRITICAL"
+    sys.path.insert(0, SRC)
+    asyncio.run(main(arguments))
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+import bcrypt
+from common import latency_summary
+from common import load_prod_config
+from common import lock_count
+from common import SRC
+from common import write_report
+import httpx
+
+PASSWORD = "bench-password"
+
+Request = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+def wait_for_file(path: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not (os.path.exists(path) and os.path.getsize(path) > 2):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{path} was not written in {timeout} seconds")
+        time.sleep(0.05)
+    time.sleep(0.1)
+
+
+def wait_ready(base: str, timeout: float) -> Dict[str, Any]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(httpx.HTTPError):
+            response = httpx.get(f"{base}/ready")
+            if response.json()["status"] == "OK":
+                return response.json()
+        time.sleep(0.2)
+    raise TimeoutError(f"{base} did not become ready in {timeout} seconds")
+
+
+@contextlib.contextmanager
+def start(command: List[str], env: Dict[str, str], cwd: str, log: str) -> Iterator[subprocess.Popen]:
+    with open(os.path.join(cwd, log), "w") as output:
+        process = subprocess.Popen(command, env=env, cwd=cwd, stdout=output, stderr=subprocess.STDOUT)
+    try:
+        yield process
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+@contextlib.contextmanager
+def deployment(args: argparse.Namespace, config: Dict[str, Any], workdir: str) -> Iterator[str]:
+    with open(os.path.join(workdir, "base.json"), "w") as jsonfile:
+        json.dump(config, jsonfile)
+    env = dict(
+        os.environ,
+        USERNAME="bench",
+        PASSWORD_HASH=bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(4)).decode("utf-8"),
+        LOG_LEVEL=args.log_level,
+        PULSE_GAP_MS=str(args.pulse_gap_ms),
+        PYTHONPATH=SRC,
+    )
+    simulator = [sys.executable, os.path.join(SRC, "simulator.py"), "--config", "base.json", "--output", "config.json", "--latency", str(args.latency)]
+    server = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SRC, "--port", str(args.port), "--no-access-log"]
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(start(simulator, env, workdir, "simulator.log"))
+        wait_for_file(os.path.join(workdir, "config.json"), timeout=30)
+        if args.workers > 1:
+            env.update(BROKER_SOCKET=os.path.join(workdir, "broker.sock"), TOKEN_DB=os.path.join(workdir, "tokens.db"))
+            stack.enter_context(start([sys.executable, os.path.join(SRC, "broker.py")], env, workdir, "broker.log"))
+            server += ["--workers", str(args.workers)]
+        stack.enter_context(start(server, env, workdir, "server.log"))
+        yield f"http://127.0.0.1:{args.port}"
+
+
+async def run_scenario(name: str, base: str, headers: Dict[str, str], request: Request, args: argparse.Namespace) -> Dict[str, Any]:
+    latencies: List[float] = []
+    codes: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, headers=headers, limits=limits, timeout=30) as client:
+
+        async def worker(deadline: float, record: bool) -> None:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await request(client)
+                    code = str(response.status_code)
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    codes[code] = codes.get(code, 0) + 1
+
+        await asyncio.gather(*(worker(time.perf_counter() + args.warmup, False) for _ in range(args.concurrency)))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + args.duration, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    errors = sum(count for code, count in codes.items() if not code.startswith("2") and code != "304")
+    return {
+        "name": name,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "codes": codes,
+        "throughput_per_s": round(len(latencies) / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+def scenarios(lock_ids: List[str]) -> Dict[str, Request]:
+    seen = {"etag": ""}
+
+    async def status(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/v1/status")
+
+    async def status_not_modified(client: httpx.AsyncClient) -> httpx.Response:
+        response = await client.get("/api/v1/status", headers={"If-None-Match": seen["etag"]})
+        seen["etag"] = response.headers.get("ETag", seen["etag"])
+        return response
+
+    async def status_filtered(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/v1/status", params={"ids": random.choice(lock_ids)})
+
+    async def pulse(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post("/api/v1/pulse", json={"id": random.choice(lock_ids)})
+
+    async def mixed(client: httpx.AsyncClient) -> httpx.Response:
+        return await (pulse(client) if random.random() < 0.1 else status(client))
+
+    return {"status": status, "status_304": status_not_modified, "status_filtered": status_filtered, "pulse": pulse, "mixed": mixed}
+
+
+async def run(args: argparse.Namespace, base: str, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    token = httpx.post(f"{base}/api/v1/token", json={"username": "bench", "password": PASSWORD}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    lock_ids = [lock["id"] for details in config.values() for lock in details["locks"]]
+    requests = scenarios(lock_ids)
+    return [await run_scenario(name, base, headers, requests[name], args) for name in args.scenarios]
+
+
+def build_config(args: argparse.Namespace) -> Tuple[Dict[str, Any], str]:
+    if args.gateways:
+        from simulator import build_config as simulated_config
+
+        return simulated_config(args.gateways, args.boards), f"{args.gateways}x{args.boards} boards"
+    return load_prod_config(args.scale), f"config_prod.json x{args.scale}"
+
+
+def main(args: argparse.Namespace) -> None:
+    sys.path.insert(0, SRC)
+    config, source = build_config(args)
+    with tempfile.TemporaryDirectory() as workdir, deployment(args, config, workdir) as base:
+        wait_ready(base, timeout=60)
+        results = asyncio.run(run(args, base, config))
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "log_level", "port")}
+    write_report("load", {**params, "config": source, "gateways_total": len(config), "locks": lock_count(config)}, results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /api/v1/status and /api/v1/pulse against simulated gateways over local TCP")
+    parser.add_argument("--scenarios", nargs="+", default=["status", "status_304", "status_filtered", "pulse", "mixed"])
+    parser.add_argument("--scale", type=int, default=1, help="copies of config_prod.json to serve")
+    parser.add_argument("--gateways", type=int, default=0, help="use a generated config with this many gateways instead of config_prod.json")
+    parser.add_argument("--boards", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated gateway reply latency in seconds")
+    parser.add_argument("--pulse-gap-ms", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=18099)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    main(parser.parse_args())
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from common import latency_summary
+from common import prepare_source_imports
+from common import write_report
+import httpx
+
+Request = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+SINKS: Dict[str, Tuple[Optional[str], bool]] = {
+    "off": (None, False),
+    "text": ("text", False),
+    "json": ("json", False),
+    "json_sampled": ("json", True),
+}
+
+
+class CountingStream:
+    def __init__(self) -> None:
+        self.records = 0
+
+    def write(self, text: str) -> None:
+        self.records += 1
+
+    def flush(self) -> None:
+        pass
+
+
+def configure_logging(sink: str, level: str, stream: CountingStream, args: argparse.Namespace) -> None:
+    from loguru import logger
+
+    from logger_config import add_sinks
+    from logger_config import LogSampler
+
+    logger.remove()
+    log_format, sampled = SINKS[sink]
+    if log_format is not None:
+        sampler = LogSampler(args.sample_initial, args.sample_thereafter) if sampled else None
+        add_sinks(log_format, level, sampler, stream=stream, errors=stream)  # type: ignore[arg-type]
+
+
+def requests(lock_ids: List[str]) -> Dict[str, Request]:
+    async def status(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/v1/status")
+
+    async def status_filtered(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/v1/status", params={"ids": random.choice(lock_ids)})
+
+    async def pulse(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post("/api/v1/pulse", json={"id": random.choice(lock_ids)})
+
+    return {"status": status, "status_filtered": status_filtered, "pulse": pulse}
+
+
+async def measure(client: httpx.AsyncClient, request: Request, count: int, stream: CountingStream) -> Dict[str, Any]:
+    from loguru import logger
+
+    latencies: List[float] = []
+    errors = 0
+    records = stream.records
+    started = time.perf_counter()
+    for _ in range(count):
+        sent = time.perf_counter()
+        response = await request(client)
+        latencies.append(time.perf_counter() - sent)
+        errors += response.status_code >= 400
+    logger.complete()
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": count,
+        "errors": errors,
+        "records_per_request": round((stream.records - records) / count, 2),
+        "elapsed_per_request_us": round(elapsed / count * 1e6, 1),
+        **latency_summary(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import main
+    import security
+    from simulator import build_config
+    from simulator import SimulatedSite
+
+    results: List[Dict[str, Any]] = []
+    async with SimulatedSite(build_config(args.gateways, args.boards)) as site:
+        main.device_manager.start(site.config)
+        await asyncio.sleep(args.settle)
+        lock_ids = list(main.local_device_manager.lock_lookup)
+        headers = {"Authorization": f"Bearer {security.create_access_token({'sub': 'bench'})}"}
+        transport = httpx.ASGITransport(app=main.app)  # type: ignore[arg-type]
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+                for name, request in requests(lock_ids).items():
+                    for level in args.levels:
+                        for sink in SINKS:
+                            stream = CountingStream()
+                            configure_logging(sink, level, stream, args)
+                            await measure(client, request, args.warmup, stream)
+                            results.append(
+                                {
+                                    "name": f"{name}_{sink}",
+                                    "request": name,
+                                    "sink": sink,
+                                    "level": level,
+                                    **await measure(client, request, args.requests, stream),
+                                }
+                            )
+        finally:
+            configure_logging("off", "INFO", CountingStream(), args)
+            await main.device_manager.stop()
+    baseline = {(result["request"], result["level"]): result["elapsed_per_request_us"] for result in results if result["sink"] == "off"}
+    for result in results:
+        result["overhead_us"] = round(result["elapsed_per_request_us"] - baseline[result["request"], result["level"]], 1)
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    workdir = tempfile.mkdtemp(prefix="logging-bench-")
+    os.environ.update(JOURNAL_DB=os.path.join(workdir, "journal.db"), CHECKPOINT_FILE="", CONFIG_WATCH_INTERVAL="0", PULSE_GAP_MS="0")
+    prepare_source_imports()
+    results = asyncio.run(run(args))
+    params = {
+        "gateways": args.gateways,
+        "boards": args.boards,
+        "requests": args.requests,
+        "levels": args.levels,
+        "sample_initial": args.sample_initial,
+        "sample_thereafter": args.sample_thereafter,
+    }
+    write_report("logging_overhead", params, results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Logging cost per /api/v1/status and /api/v1/pulse request for each sink, in process against the simulator")
+    parser.add_argument("--gateways", type=int, default=4)
+    parser.add_argument("--boards", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--levels", nargs="+", default=["INFO", "DEBUG"])
+    parser.add_argument("--sample-initial", type=int, default=1, help="records per call site and second before sampling starts")
+    parser.add_argument("--sample-thereafter", type=int, default=100, help="then keep every n-th record")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait for the gateways to connect and the first status sweep")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+import bcrypt
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+PASSWORD = "bench-password"
+
+
+async def probe_lag(lags: List[float], stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run_burst(name: str, login: Callable[[int], Awaitable[Any]], logins: int, interval: float, concurrent: bool = True) -> Dict[str, Any]:
+    from fastapi import HTTPException
+
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(lags, stop, interval))
+    await asyncio.sleep(interval * 3)
+
+    async def attempt(i: int) -> str:
+        try:
+            return "ok" if await login(i) else "failed"
+        except HTTPException as e:
+            return str(e.status_code)
+
+    started = time.perf_counter()
+    if concurrent:
+        outcomes = await asyncio.gather(*(attempt(i) for i in range(logins)))
+    else:
+        outcomes = [await attempt(i) for i in range(logins)]
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    lags.sort()
+    return {
+        "scenario": name,
+        "logins": logins,
+        "elapsed_s": round(elapsed, 3),
+        "outcomes": {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))},
+        "loop_lag_ms": {
+            "mean": round(statistics.mean(lags) * 1000, 2),
+            "p99": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2),
+            "max": round(lags[-1] * 1000, 2),
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    from loguru import logger
+
+    logger.remove()
+    import config
+    import security
+
+    async def inline(i: int) -> bool:
+        return security.verify_password(PASSWORD, config.PASSWORD_HASH)
+
+    async def pooled(i: int) -> Any:
+        return await security.authenticate_user(config.USERNAME, PASSWORD, client=f"10.0.{i // 256}.{i % 256}")
+
+    async def wrong_password(i: int) -> Any:
+        return await security.authenticate_user(config.USERNAME, "wrong", client="10.1.0.1")
+
+    results = [
+        await run_burst("inline_checkpw", inline, args.logins, args.interval),
+        await run_burst("thread_pool", pooled, args.logins, args.interval),
+        await run_burst("throttled_bruteforce", wrong_password, args.logins, args.interval, concurrent=False),
+    ]
+    print(json.dumps({"rounds": args.rounds, "workers": security.LOGIN_WORKERS, "max_pending": security.LOGIN_MAX_PENDING, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure event loop lag during a burst of logins")
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--interval", type=float, default=0.005)
+    arguments = parser.parse_args()
+    os.environ["USERNAME"] = "bench"
+    os.environ["PASSWORD_HASH"] = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(arguments.rounds)).decode("utf-8")
+    os.environ["LOG_LEVEL"] = "CRITICAL"
+    os.environ.setdefault("TOKEN_DB", "")
+    os.chdir(SRC)
+    sys.path.insert(0, SRC)
+    asyncio.run(main(arguments))
@@ -0,0 +1,100 @@
+import argparse
+import statistics
+import timeit
+from typing import Any, Callable, Coroutine, Dict, List
+
+from common import load_prod_config
+from common import lock_count
+from common import prepare_source_imports
+from common import write_report
+
+
+def drive(coroutine: Coroutine[Any, Any, Any]) -> Any:
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("Benchmarked coroutine must not suspend")
+
+
+def measure(name: str, func: Callable[[], Any], repeat: int, **extra: Any) -> Dict[str, Any]:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    samples = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {"name": name, **extra, "loops": number, "best_ns": round(min(samples) * 1e9), "median_ns": round(statistics.median(samples) * 1e9)}
+
+
+def protocol_cases(repeat: int) -> List[Dict[str, Any]]:
+    from protocol import encode_status_reply
+    from relay import DeviceC
+
+    device = DeviceC("10.0.0.1", board_count=4)
+    reply = encode_status_reply(2, 0xA5A5_5A5A_F00F)
+    return [
+        measure("build_status_command", lambda: device._build_status_command(2), repeat),
+        measure("parse_status", lambda: drive(device.parse_status(reply)), repeat),
+    ]
+
+
+def status_cases(scale: int, repeat: int) -> List[Dict[str, Any]]:
+    import time
+
+    from layout import build_layouts
+    from poller import GatewaySnapshot
+    from relay import DeviceC
+    from relay import DeviceManager
+    from status_payload import StatusPayload
+
+    config = load_prod_config(scale)
+    manager = DeviceManager()
+    manager.layouts = build_layouts(config)
+    snapshots = {}
+    for ip, details in config.items():
+        manager.devices[ip] = DeviceC(ip, board_count=details["boards"])
+        masks = {board: (0x5555_5555_5555 << board) & 0xFFFF_FFFF_FFFF for board in range(details["boards"])}
+        snapshots[ip] = GatewaySnapshot(boards=masks, version=1, updated_at=time.time(), refreshed_at=time.monotonic())
+    status = manager._build_status(snapshots)
+    labels = {"gateways": len(config), "locks": lock_count(config)}
+    return [
+        measure("build_status", lambda: manager._build_status(snapshots), repeat, **labels),
+        measure("status_payload_build", lambda: StatusPayload.build(status, 1, None), repeat, **labels),
+    ]
+
+
+def token_cases(repeat: int) -> List[Dict[str, Any]]:
+    from datetime import timedelta
+
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from security import create_access_token
+    from security import decode_token
+    from security import token_cache
+
+    token = create_access_token({"sub": "bench"}, expires_delta=timedelta(minutes=5))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    def decode_uncached() -> None:
+        token_cache.clear()
+        decode_token(credentials)
+
+    return [measure("decode_token", lambda: decode_token(credentials), repeat), measure("decode_token_uncached", decode_uncached, repeat)]
+
+
+def main(args: argparse.Namespace) -> None:
+    prepare_source_imports()
+    from loguru import logger
+
+    logger.remove()
+    results = protocol_cases(args.repeat)
+    for scale in args.scales:
+        results.extend(status_cases(scale, args.repeat))
+    results.extend(token_cases(args.repeat))
+    write_report("micro", {"repeat": args.repeat, "scales": args.scales}, results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro benchmarks for the relay protocol, status assembly and token checks")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16], help="config_prod.json copies to build status for")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    main(parser.parse_args())
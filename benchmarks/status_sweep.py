@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from common import latency_summary
+from common import prepare_source_imports
+from common import write_report
+
+
+async def sweep_case(boards: int, pipeline: bool, args: argparse.Namespace, silent: int = 0) -> Dict[str, Any]:
+    from relay import DeviceC
+    from simulator import build_config
+    from simulator import GatewayFaults
+    from simulator import SimulatedSite
+
+    faults = GatewayFaults(latency=args.latency, rtt=args.rtt)
+    async with SimulatedSite(build_config(1, boards - silent), faults=faults) as site:
+        details = next(iter(site.config.values()))
+        device = DeviceC("10.0.0.1", boards, host=details["host"], port=details["port"], pipeline=pipeline)
+        device.timeout = args.timeout
+        await device.connect()
+        latencies: List[float] = []
+        answered = 0
+        try:
+            for _ in range(args.sweeps):
+                started = time.perf_counter()
+                masks = await device.get_masks(use_cache=False)
+                latencies.append(time.perf_counter() - started)
+                answered += len(masks)
+        finally:
+            await device.close()
+    return {
+        "name": f"{'pipelined' if pipeline else 'sequential'}_sweep",
+        "boards": boards,
+        "silent_boards": silent,
+        "sweeps": args.sweeps,
+        "boards_answered": answered,
+        **latency_summary(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    results = []
+    for boards in args.boards:
+        for pipeline in (False, True):
+            results.append(await sweep_case(boards, pipeline, args))
+    if args.silent:
+        for pipeline in (False, True):
+            results.append(await sweep_case(max(args.boards), pipeline, args, silent=args.silent))
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    prepare_source_imports()
+    from logger_config import setup_logger
+
+    setup_logger().remove()
+    results = asyncio.run(run(args))
+    params = {"boards": args.boards, "sweeps": args.sweeps, "rtt": args.rtt, "latency": args.latency, "timeout": args.timeout, "silent": args.silent}
+    write_report("status_sweep", params, results, args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Status sweep latency of one gateway, board by board versus pipelined, against the simulator")
+    parser.add_argument("--boards", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--sweeps", type=int, default=50)
+    parser.add_argument("--rtt", type=float, default=0.02, help="simulated network round trip per reply in seconds")
+    parser.add_argument("--latency", type=float, default=0.001, help="simulated processing time per request in seconds")
+    parser.add_argument("--timeout", type=float, default=0.5, help="reply timeout per board in seconds")
+    parser.add_argument("--silent", type=int, default=1, help="boards that never reply in the extra timeout scenario")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    main(parser.parse_args())
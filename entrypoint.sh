@@ -0,0 +1,48 @@
+#!/bin/bash
+set -u
+
+if [ "${WORKERS:-1}" -le 1 ]; then
+    exec uvicorn main:app --host 0.0.0.0 --port "$PORT"
+fi
+
+export BROKER_SOCKET="${BROKER_SOCKET:-/tmp/locker_broker.sock}" TOKEN_DB="${TOKEN_DB:-/tmp/tokens.db}"
+
+stopping=0
+broker=""
+server=""
+
+stop() {
+    stopping=1
+    kill -TERM "$server" "$broker" 2>/dev/null
+}
+
+start_broker() {
+    python broker.py &
+    broker=$!
+}
+
+trap stop TERM INT
+
+start_broker
+uvicorn main:app --host 0.0.0.0 --port "$PORT" --workers "$WORKERS" &
+server=$!
+
+while [ "$stopping" -eq 0 ]; do
+    wait -n "$broker" "$server"
+    status=$?
+    if [ "$stopping" -ne 0 ]; then
+        break
+    fi
+    if ! kill -0 "$server" 2>/dev/null; then
+        echo "uvicorn exited with status $status, stopping the device broker" >&2
+        kill -TERM "$broker" 2>/dev/null
+        wait "$broker"
+        exit "$status"
+    fi
+    echo "Device broker exited with status $status, restarting it" >&2
+    sleep 1
+    start_broker
+done
+
+wait "$server"
+wait "$broker"
@@ -0,0 +1,436 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import secrets
+import signal
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from config import BROKER_SOCKET
+from config import CONFIG
+from config import STATUS_FEED_HISTORY
+from feed import StatusFeed
+from logger_config import setup_logger
+from profiler import ProfilerBusy
+from relay import device_manager
+from relay import DeviceManager
+from relay import GatewayBusy
+from status_payload import StatusPayload
+from tracing import current_trace
+from tracing import Trace
+
+logger = setup_logger()
+
+DEFAULT_BROKER_SOCKET = "/tmp/locker_broker.sock"
+FRAME_HEADER = struct.Struct(">II")
+AUTH_TIMEOUT = 5
+
+Message = Tuple[Dict[str, Any], bytes]
+
+
+def encode_message(header: Dict[str, Any], body: bytes = b"") -> bytes:
+    data = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(data), len(body)) + data + body
+
+
+async def read_message(reader: asyncio.StreamReader) -> Message:
+    header_length, body_length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    header = json.loads(await reader.readexactly(header_length))
+    body = await reader.readexactly(body_length) if body_length else b""
+    return header, body
+
+
+def tcp_address(address: str) -> Optional[Tuple[str, int]]:
+    host, _, port = address.rpartition(":")
+    if address.startswith("/") or not host or not port.isdigit():
+        return None
+    return host, int(port)
+
+
+def sign_challenge(secret: str, challenge: str) -> str:
+    return hmac.new(secret.encode("utf-8"), challenge.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+async def open_connection(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    tcp = tcp_address(address)
+    if tcp is not None:
+        return await asyncio.open_connection(*tcp)
+    return await asyncio.open_unix_connection(address)
+
+
+class BrokerServer:
+    def __init__(self, manager: DeviceManager, path: str, secret: str = "") -> None:
+        self.manager = manager
+        self.path = path
+        self.secret = secret
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._devices: List[str] = []
+        self._payload: Optional[StatusPayload] = None
+        self._payload_serial = 0
+        self.methods: Dict[str, Callable[..., Awaitable[Any]]] = {
+            "devices": self._get_devices,
+            "pulse_lock": manager.pulse_lock,
+            "start_pulse_job": manager.start_pulse_job,
+            "get_pulse_job": manager.get_pulse_job,
+            "pulse_batch": manager.pulse_batch,
+            "query_status": manager.query_status,
+            "lock_snapshot": manager.lock_snapshot,
+            "device_metrics": manager.device_metrics,
+            "gateway_health": manager.gateway_health,
+            "history": manager.history,
+            "list_holds": manager.list_holds,
+            "cancel_hold": manager.cancel_hold,
+            "reload_config": manager.reload_config,
+            "profile": manager.profile,
+        }
+        manager.feed.listeners.append(self._broadcast_changes)
+
+    async def start(self) -> None:
+        tcp = tcp_address(self.path)
+        if tcp is not None and not self.secret:
+            raise ValueError(f"Broker address {self.path} is a TCP port, connections to it must be authenticated with a secret")
+        if tcp is not None:
+            self._server = await asyncio.start_server(self._handle, *tcp)
+        else:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+            os.chmod(self.path, 0o600)
+        logger.info(f"Device broker listening on {self.path}")
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in list(self._writers):
+            writer.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if tcp_address(self.path) is None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _authenticate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        if not self.secret:
+            return True
+        challenge = secrets.token_hex(16)
+        writer.write(encode_message({"challenge": challenge}))
+        try:
+            header, _ = await asyncio.wait_for(read_message(reader), timeout=AUTH_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            return False
+        return hmac.compare_digest(str(header.get("auth", "")).encode("utf-8"), sign_challenge(self.secret, challenge).encode("utf-8"))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if not await self._authenticate(reader, writer):
+            logger.warning(f"Broker client {writer.get_extra_info('peername')} failed to authenticate")
+            writer.close()
+            return
+        self._writers.add(writer)
+        writer.write(self._hello())
+        logger.info(f"Broker client connected, {len(self._writers)} connected")
+        calls: Dict[int, asyncio.Task] = {}
+        try:
+            while True:
+                header, _ = await read_message(reader)
+                if header.get("cancel"):
+                    self._cancel(calls, header["id"])
+                    continue
+                task = calls[header["id"]] = asyncio.create_task(self._call(writer, header))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                task.add_done_callback(functools.partial(self._forget_call, calls, header["id"]))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in calls.values():
+                task.cancel()
+            self._writers.discard(writer)
+            writer.close()
+            logger.info(f"Broker client disconnected, {len(self._writers)} connected")
+
+    def _forget_call(self, calls: Dict[int, asyncio.Task], request_id: int, task: asyncio.Task) -> None:
+        if calls.get(request_id) is task:
+            del calls[request_id]
+
+    def _cancel(self, calls: Dict[int, asyncio.Task], request_id: int) -> None:
+        task = calls.pop(request_id, None)
+        if task is not None:
+            logger.debug(f"Broker call {request_id} cancelled by client")
+            task.cancel()
+
+    async def _call(self, writer: asyncio.StreamWriter, header: Dict[str, Any]) -> None:
+        trace = Trace(header["trace"]) if header.get("trace") else None
+        current_trace.set(trace)
+        reply, body = await self._reply(header)
+        if trace is not None and trace.spans:
+            reply["spans"] = trace.spans
+        if not writer.is_closing():
+            writer.write(encode_message(reply, body))
+
+    async def _reply(self, header: Dict[str, Any]) -> Message:
+        reply: Dict[str, Any] = {"id": header["id"]}
+        body = b""
+        try:
+            reply["result"], body = await self._dispatch(header["method"], header.get("params", {}))
+        except GatewayBusy as e:
+            reply.update(error=e.detail, busy={"ip": e.ip, "reason": e.reason, "retry_after": e.retry_after})
+        except ProfilerBusy as e:
+            reply.update(error=str(e), profiler_busy=True)
+        except HTTPException as e:
+            reply.update(error=e.detail, status=e.status_code, headers=e.headers)
+        except Exception as e:  # noqa
+            logger.error(f"Broker call {header['method']} failed: {str(e)}")
+            reply["error"] = str(e)
+            reply["status"] = 400 if isinstance(e, ValueError) else 500
+        return reply, body
+
+    async def _dispatch(self, method: str, params: Dict[str, Any]) -> Tuple[Any, bytes]:
+        if method == "status_payload":
+            return await self._status_payload(**params)
+        return await self.methods[method](**params), b""
+
+    async def _get_devices(self) -> List[str]:
+        return list(self.manager.devices)
+
+    async def _status_payload(self, serial: int) -> Tuple[Dict[str, Any], bytes]:
+        payload = await self.manager.status_payload()
+        if payload is not self._payload:
+            self._payload = payload
+            self._payload_serial += 1
+        age = None if payload.oldest_refresh is None else time.monotonic() - payload.oldest_refresh
+        result = {"serial": self._payload_serial, "version": payload.version, "etag": payload.etag, "age": age}
+        return result, payload.body if serial != self._payload_serial else b""
+
+    def _hello(self) -> bytes:
+        return encode_message({"event": "hello", "version": self.manager.feed.version, "devices": list(self.manager.devices)})
+
+    def _broadcast_changes(self, version: int, changes: Dict[str, dict]) -> None:
+        if not changes:
+            self._devices = list(self.manager.devices)
+            messages = [self._hello()]
+        else:
+            messages = [encode_message({"event": "change", "version": version, "changes": changes})]
+        if list(self.manager.devices) != self._devices:
+            self._devices = list(self.manager.devices)
+            messages.append(encode_message({"event": "devices", "devices": self._devices}))
+        for writer in self._writers:
+            writer.writelines(messages)
+
+
+class BrokerClient:
+    def __init__(self, path: str, reconnect_delay: float = 1.0, secret: str = "") -> None:
+        self.path = path
+        self.secret = secret
+        self.reconnect_delay = reconnect_delay
+        self.devices: Dict[str, None] = {}
+        self.feed = StatusFeed(history=STATUS_FEED_HISTORY)
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._payload: Optional[StatusPayload] = None
+        self._payload_serial = 0
+        self.connect_listeners: List[Callable[[], None]] = []
+
+    def get_devices(self) -> Dict[str, None]:
+        return self.devices
+
+    def start(self, config: Dict[str, Any]) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader, self._writer = await open_connection(self.path)
+                await self._answer_challenge(reader, self._writer)
+                logger.info(f"Connected to device broker at {self.path}")
+                for listener in self.connect_listeners:
+                    listener()
+                await self._receive(reader)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                logger.warning(f"Device broker at {self.path} is not available: {str(e) or type(e).__name__}")
+            finally:
+                self._disconnected()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _answer_challenge(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if not self.secret:
+            return
+        header, _ = await asyncio.wait_for(read_message(reader), timeout=AUTH_TIMEOUT)
+        if "challenge" not in header:
+            raise ConnectionError(f"Device broker at {self.path} did not send an authentication challenge")
+        writer.write(encode_message({"auth": sign_challenge(self.secret, str(header["challenge"]))}))
+
+    async def _receive(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            header, body = await read_message(reader)
+            if "event" in header:
+                self._on_event(header)
+                continue
+            future = self._pending.pop(header["id"], None)
+            if future is not None and not future.done():
+                future.set_result((header, body))
+
+    def _on_event(self, header: Dict[str, Any]) -> None:
+        if header["event"] == "change":
+            self.feed.publish(header["version"], header["changes"])
+            return
+        if header["event"] == "hello":
+            self.feed.reset(header["version"])
+            self._payload = None
+            self._payload_serial = 0
+        self.devices = dict.fromkeys(header["devices"])
+
+    def _disconnected(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.devices = {}
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Device broker connection lost"))
+        self._pending.clear()
+
+    async def call(self, method: str, **params: Any) -> Tuple[Any, bytes]:
+        if self._writer is None:
+            raise HTTPException(status_code=503, detail="Device broker is not available")
+        request_id = next(self._ids)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        trace = current_trace.get()
+        self._writer.write(encode_message({"id": request_id, "method": method, "params": params, "trace": trace and trace.request_id}))
+        try:
+            header, body = await future
+        except ConnectionError:
+            raise HTTPException(status_code=503, detail="Device broker is not available")
+        except asyncio.CancelledError:
+            if self._writer is not None:
+                self._writer.write(encode_message({"id": request_id, "cancel": True}))
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+        return self._result(header, body, trace)
+
+    def _result(self, header: Dict[str, Any], body: bytes, trace: Optional[Trace]) -> Tuple[Any, bytes]:
+        if trace is not None and "spans" in header:
+            trace.merge(header["spans"])
+        if "busy" in header:
+            raise GatewayBusy(detail=header["error"], **header["busy"])
+        if header.get("profiler_busy"):
+            raise ProfilerBusy(header["error"])
+        if "error" in header:
+            raise HTTPException(status_code=header.get("status", 500), detail=header["error"], headers=header.get("headers"))
+        return header["result"], body
+
+    async def pulse_lock(self, lock_id: str, confirm: bool = False, user: Optional[str] = None, time_ms: Optional[int] = None) -> dict:
+        result, _ = await self.call("pulse_lock", lock_id=lock_id, confirm=confirm, user=user, time_ms=time_ms)
+        return result
+
+    async def start_pulse_job(self, lock_id: str, user: Optional[str] = None, time_ms: Optional[int] = None) -> dict:
+        result, _ = await self.call("start_pulse_job", lock_id=lock_id, user=user, time_ms=time_ms)
+        return result
+
+    async def get_pulse_job(self, job_id: str) -> Optional[dict]:
+        result, _ = await self.call("get_pulse_job", job_id=job_id)
+        return result
+
+    async def pulse_batch(self, lock_ids: List[str], user: Optional[str] = None) -> dict:
+        result, _ = await self.call("pulse_batch", lock_ids=lock_ids, user=user)
+        return result
+
+    async def query_status(self, ids: Optional[List[str]] = None, gateway: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+        result, _ = await self.call("query_status", ids=ids, gateway=gateway, prefix=prefix)
+        return result
+
+    async def lock_snapshot(self) -> Tuple[int, Dict[str, dict]]:
+        result, _ = await self.call("lock_snapshot")
+        return result[0], result[1]
+
+    async def device_metrics(self) -> str:
+        result, _ = await self.call("device_metrics")
+        return result
+
+    async def merge_tokens(self, tokens: Dict[str, Tuple[str, int]]) -> int:
+        result, _ = await self.call("merge_tokens", tokens=tokens)
+        return result
+
+    async def gateway_health(self) -> Dict[str, dict]:
+        result, _ = await self.call("gateway_health")
+        return result
+
+    async def list_holds(self) -> dict:
+        result, _ = await self.call("list_holds")
+        return result
+
+    async def cancel_hold(self, hold_id: str, user: Optional[str] = None) -> Optional[dict]:
+        result, _ = await self.call("cancel_hold", hold_id=hold_id, user=user)
+        return result
+
+    async def history(
+        self,
+        lock_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        before_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        result, _ = await self.call("history", lock_id=lock_id, kind=kind, start=start, end=end, before_id=before_id, cursor=cursor, limit=limit)
+        return result
+
+    async def reload_config(self) -> Dict[str, List[str]]:
+        result, _ = await self.call("reload_config")
+        return result
+
+    async def profile(self, seconds: float, interval_ms: float) -> str:
+        result, _ = await self.call("profile", seconds=seconds, interval_ms=interval_ms)
+        return result
+
+    async def status_payload(self) -> StatusPayload:
+        result, body = await self.call("status_payload", serial=self._payload_serial)
+        payload = self._payload
+        if payload is None or body:
+            payload = StatusPayload(body=body, version=result["version"], oldest_refresh=None)
+            payload.etag = result["etag"]
+            self._payload = payload
+            self._payload_serial = result["serial"]
+        payload.oldest_refresh = None if result["age"] is None else time.monotonic() - result["age"]
+        return payload
+
+
+async def serve(path: str) -> None:
+    server = BrokerServer(device_manager, path)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopped.set)
+    device_manager.start(CONFIG)
+    await server.start()
+    try:
+        await stopped.wait()
+    finally:
+        await server.stop()
+        await device_manager.stop()
+    logger.info("Device broker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(BROKER_SOCKET or DEFAULT_BROKER_SOCKET))
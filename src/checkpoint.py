@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+StateCollector = Callable[[], Dict[str, Any]]
+
+
+def write_atomic(path: str, data: Dict[str, Any]) -> None:
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as jsonfile:
+        json.dump(data, jsonfile, separators=(",", ":"))
+        jsonfile.flush()
+        os.fsync(jsonfile.fileno())
+    os.replace(temporary, path)
+
+
+class Checkpoint:
+    def __init__(self, path: str, interval: float) -> None:
+        self.path = path
+        self.interval = interval
+        self._collect: Optional[StateCollector] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="checkpoint")
+
+    def load(self) -> Dict[str, Any]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as jsonfile:
+                data = json.load(jsonfile)
+            gateways = data["gateways"]
+            age = time.time() - float(data["saved_at"])
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {str(e)}")
+            return {}
+        logger.info(f"Warm start from checkpoint {self.path} with {len(gateways)} gateways saved {age:.0f} seconds ago")
+        return gateways
+
+    def start(self, collect: StateCollector) -> None:
+        self._collect = collect
+        if self.path and self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.save()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+    async def save(self) -> None:
+        if not self.path or self._collect is None:
+            return
+        gateways = self._collect()
+        data = {"saved_at": time.time(), "gateways": gateways}
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, write_atomic, self.path, data)
+        except OSError as e:
+            logger.error(f"Failed to write checkpoint {self.path}: {str(e)}")
+            return
+        logger.debug(f"Checkpoint of {len(gateways)} gateways written to {self.path}")
@@ -0,0 +1,308 @@
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar, Union
+import zlib
+
+from broker import BrokerClient
+from broker import BrokerServer
+from config import STATUS_FEED_HISTORY
+from feed import StatusFeed
+from journal import event_cursor
+from layout import STATUS_OFFLINE
+from logger_config import setup_logger
+from relay import DeviceManager
+from security import active_tokens
+from status_payload import BOOT_ID
+from status_payload import StatusPayload
+from token_store import TokenEntry
+
+logger = setup_logger()
+
+T = TypeVar("T")
+Member = Union[DeviceManager, BrokerClient]
+LockFilter = Callable[[str, str], bool]
+MAX_EVENT_ID = 2**63 - 1
+
+
+def owner_of(gateway: str, nodes: List[str]) -> str:
+    return max(nodes, key=lambda node: hashlib.sha256(f"{node}|{gateway}".encode("utf-8")).digest())
+
+
+def error_detail(error: BaseException) -> str:
+    return str(getattr(error, "detail", None) or error)
+
+
+def select_all(lock_id: str, gateway: str) -> bool:
+    return True
+
+
+def parse_cluster_cursor(cursor: str) -> Tuple[float, int, int]:
+    parts = cursor.split(":")
+    if len(parts) != 3:
+        raise ValueError(f"Invalid history cursor: {cursor}")
+    return float(parts[0]), int(parts[1]), int(parts[2])
+
+
+def node_cursor(before: Optional[Tuple[float, int, int]], index: int) -> Optional[str]:
+    if before is None:
+        return None
+    ts, node, event_id = before
+    if index != node:
+        event_id = MAX_EVENT_ID if index < node else 0
+    return event_cursor(ts, event_id)
+
+
+def history_key(event: Dict[str, Any]) -> Tuple[float, int, int]:
+    return parse_cluster_cursor(event["cursor"])
+
+
+class ClusterManager:
+    def __init__(self, manager: DeviceManager, nodes: List[str], node: str, secret: str) -> None:
+        if node not in nodes:
+            raise ValueError(f"CLUSTER_NODE {node} is not listed in CLUSTER_NODES")
+        if not secret:
+            raise ValueError("CLUSTER_SECRET must be set when CLUSTER_NODES is configured")
+        self.local = manager
+        self.nodes = nodes
+        self.node = node
+        self.server = BrokerServer(manager, node, secret)
+        self.peers = {peer: BrokerClient(peer, secret=secret) for peer in nodes if peer != node}
+        self.members: Dict[str, Member] = {node: manager, **self.peers}
+        self.feed = StatusFeed(history=STATUS_FEED_HISTORY)
+        self.owners: Dict[str, str] = {}
+        self._server_task: Optional[asyncio.Task] = None
+        self._payload: Optional[StatusPayload] = None
+        self._payload_key: Tuple[str, ...] = ()
+        self._token_tasks: Set[asyncio.Task] = set()
+        manager.owns = self.owns
+        for member in self.members.values():
+            member.feed.listeners.append(self._forward_changes)
+        self.server.methods["merge_tokens"] = self._merge_tokens
+        active_tokens.listeners.append(self._share_tokens)
+        for peer in self.peers.values():
+            peer.connect_listeners.append(functools.partial(self._push_tokens, peer))
+
+    def owner(self, gateway: str) -> str:
+        node = self.owners.get(gateway)
+        if node is None:
+            node = self.owners[gateway] = owner_of(gateway, self.nodes)
+        return node
+
+    def owns(self, gateway: str) -> bool:
+        return self.owner(gateway) == self.node
+
+    def node_for(self, lock_id: str) -> str:
+        gateway = self.local.lock_gateways.get(lock_id)
+        return self.node if gateway is None else self.owner(gateway)
+
+    def get_devices(self) -> Dict[str, None]:
+        return dict.fromkeys(self.local.config_gateways)
+
+    def start(self, config: Dict[str, Any]) -> None:
+        self.local.start(config)
+        for peer in self.peers.values():
+            peer.start(config)
+        self._server_task = asyncio.create_task(self._serve())
+        logger.info(f"Cluster node {self.node} started with {len(self.nodes)} nodes")
+
+    async def _serve(self) -> None:
+        try:
+            await self.server.start()
+        except OSError as e:
+            logger.error(f"Cluster node {self.node} cannot listen for peers: {str(e)}")
+
+    async def stop(self) -> None:
+        if self._server_task:
+            await asyncio.gather(self._server_task, return_exceptions=True)
+            self._server_task = None
+        await self.server.stop()
+        for task in self._token_tasks:
+            task.cancel()
+        await asyncio.gather(*self._token_tasks, return_exceptions=True)
+        for peer in self.peers.values():
+            await peer.stop()
+        await self.local.stop()
+
+    async def _merge_tokens(self, tokens: Dict[str, TokenEntry]) -> int:
+        changed = active_tokens.merge(tokens)
+        if changed:
+            logger.info(f"Cluster node {self.node} took {changed} token changes from a peer")
+        return changed
+
+    def _share_tokens(self, tokens: Dict[str, TokenEntry]) -> None:
+        for peer in self.peers.values():
+            self._send_tokens(peer, tokens)
+
+    def _push_tokens(self, peer: BrokerClient) -> None:
+        self._send_tokens(peer, active_tokens.entries())
+
+    def _send_tokens(self, peer: BrokerClient, tokens: Dict[str, TokenEntry]) -> None:
+        task = asyncio.create_task(self._deliver_tokens(peer, tokens))
+        self._token_tasks.add(task)
+        task.add_done_callback(self._token_tasks.discard)
+
+    async def _deliver_tokens(self, peer: BrokerClient, tokens: Dict[str, TokenEntry]) -> None:
+        try:
+            await peer.merge_tokens(tokens)
+        except Exception as e:  # noqa
+            logger.warning(f"Cluster node {peer.path} did not take token changes: {error_detail(e)}")
+
+    def _forward_changes(self, version: int, changes: Dict[str, dict]) -> None:
+        if changes:
+            self.feed.publish(self.feed.version + 1, changes)
+        else:
+            self.feed.reset(self.feed.version + 1)
+
+    async def _gather(self, calls: Dict[str, Awaitable[T]]) -> Dict[str, Union[T, BaseException]]:
+        results = await asyncio.gather(*calls.values(), return_exceptions=True)
+        for node, result in zip(calls, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Cluster node {node} failed to answer: {error_detail(result)}")
+        return dict(zip(calls, results))
+
+    def _offline_status(self, node: str, select: LockFilter) -> Dict[str, Any]:
+        locks = {lock_id: ip for lock_id, ip in self.local.lock_gateways.items() if self.owner(ip) == node and select(lock_id, ip)}
+        gateways = [ip for ip in self.local.config_gateways if self.owner(ip) == node and (select is select_all or ip in locks.values())]
+        return {
+            "id": dict.fromkeys(locks, STATUS_OFFLINE),
+            "gateways": {ip: {"version": None, "updated_at": None, "online": False, "stale": False} for ip in gateways},
+        }
+
+    def _merge_status(self, replies: Dict[str, Any], select: LockFilter) -> dict:
+        status_result: dict = {"id": {}, "version": self.feed.version, "gateways": {}}
+        for node, reply in replies.items():
+            if isinstance(reply, BaseException):
+                reply = self._offline_status(node, select)
+            status_result["id"].update(reply["id"])
+            status_result["gateways"].update(reply["gateways"])
+        return status_result
+
+    async def pulse_lock(self, lock_id: str, confirm: bool = False, user: Optional[str] = None, time_ms: Optional[int] = None) -> dict:
+        return await self.members[self.node_for(lock_id)].pulse_lock(lock_id, confirm=confirm, user=user, time_ms=time_ms)
+
+    async def start_pulse_job(self, lock_id: str, user: Optional[str] = None, time_ms: Optional[int] = None) -> dict:
+        node = self.node_for(lock_id)
+        job = await self.members[node].start_pulse_job(lock_id, user=user, time_ms=time_ms)
+        return {**job, "id": f"{self.nodes.index(node)}.{job['id']}"}
+
+    async def get_pulse_job(self, job_id: str) -> Optional[dict]:
+        index, _, local_id = job_id.partition(".")
+        if not index.isdigit() or int(index) >= len(self.nodes):
+            return None
+        job = await self.members[self.nodes[int(index)]].get_pulse_job(local_id)
+        return None if job is None else {**job, "id": job_id}
+
+    async def pulse_batch(self, lock_ids: List[str], user: Optional[str] = None) -> dict:
+        groups: Dict[str, List[str]] = {}
+        for lock_id in dict.fromkeys(lock_ids):
+            groups.setdefault(self.node_for(lock_id), []).append(lock_id)
+        replies = await self._gather({node: self.members[node].pulse_batch(ids, user=user) for node, ids in groups.items()})
+        results: Dict[str, dict] = {}
+        for node, reply in replies.items():
+            if isinstance(reply, BaseException):
+                results.update({lock_id: {"ok": False, "message": f"Locker # {lock_id} not opened: {error_detail(reply)}"} for lock_id in groups[node]})
+            else:
+                results.update(reply["results"])
+        return {"results": {lock_id: results[lock_id] for lock_id in dict.fromkeys(lock_ids)}}
+
+    async def query_status(self, ids: Optional[List[str]] = None, gateway: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+        if gateway:
+            nodes = [self.owner(gateway)]
+        elif ids:
+            nodes = list(dict.fromkeys(self.node_for(lock_id) for lock_id in ids))
+        else:
+            nodes = self.nodes
+        replies = await self._gather({node: self.members[node].query_status(ids, gateway, prefix) for node in nodes})
+
+        def select(lock_id: str, ip: str) -> bool:
+            return (not ids or lock_id in ids) and (not gateway or ip == gateway) and (not prefix or lock_id.startswith(prefix))
+
+        return self._merge_status(replies, select)
+
+    async def status_payload(self) -> StatusPayload:
+        version = self.feed.version
+        replies = await self._gather({node: member.status_payload() for node, member in self.members.items()})
+        key = tuple(reply.etag if isinstance(reply, StatusPayload) else f"{node} offline" for node, reply in replies.items())
+        refreshes = [reply.oldest_refresh for reply in replies.values() if isinstance(reply, StatusPayload) and reply.oldest_refresh is not None]
+        if self._payload is None or key != self._payload_key or version != self._payload.version:
+            parts = {node: json.loads(reply.body) if isinstance(reply, StatusPayload) else reply for node, reply in replies.items()}
+            payload = StatusPayload.build(self._merge_status(parts, select_all), version, None)
+            payload.etag = f'W/"{BOOT_ID}-{version}-{zlib.crc32("|".join(key).encode("utf-8")):08x}"'
+            self._payload, self._payload_key = payload, key
+        self._payload.oldest_refresh = min(refreshes, default=None)
+        return self._payload
+
+    async def lock_snapshot(self) -> Tuple[int, Dict[str, dict]]:
+        version = self.feed.version
+        replies = await self._gather({node: member.lock_snapshot() for node, member in self.members.items()})
+        states: Dict[str, dict] = {}
+        for node, reply in replies.items():
+            states.update(self._offline_status(node, select_all)["id"] if isinstance(reply, BaseException) else reply[1])
+        return version, states
+
+    async def device_metrics(self) -> str:
+        return await self.local.device_metrics()
+
+    async def profile(self, seconds: float, interval_ms: float) -> str:
+        return await self.local.profile(seconds, interval_ms)
+
+    async def gateway_health(self) -> Dict[str, dict]:
+        replies = await self._gather({node: member.gateway_health() for node, member in self.members.items()})
+        health: Dict[str, dict] = {}
+        for node, reply in replies.items():
+            if isinstance(reply, BaseException):
+                unreachable = {"state": "unknown", "online": False, "failures": 0, "last_error": f"Cluster node {node} is not available"}
+                reply = {ip: {**unreachable, "last_success": None, "connected_since": None} for ip in self.local.config_gateways if self.owner(ip) == node}
+            health.update(reply)
+        return health
+
+    async def list_holds(self) -> dict:
+        replies = await self._gather({node: member.list_holds() for node, member in self.members.items()})
+        holds: dict = {"holds": [], "timers": {}}
+        for reply in replies.values():
+            if not isinstance(reply, BaseException):
+                holds["holds"].extend(reply["holds"])
+                holds["timers"].update(reply["timers"])
+        return holds
+
+    async def cancel_hold(self, hold_id: str, user: Optional[str] = None) -> Optional[dict]:
+        replies = await self._gather({node: member.cancel_hold(hold_id, user=user) for node, member in self.members.items()})
+        return next((reply for reply in replies.values() if isinstance(reply, dict)), None)
+
+    async def history(
+        self,
+        lock_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        before_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        if before_id is not None:
+            raise ValueError("Event ids are per node in a cluster, page the history with cursor instead of before_id")
+        before = parse_cluster_cursor(cursor) if cursor else None
+        params: Dict[str, Any] = {"lock_id": lock_id, "kind": kind, "start": start, "end": end, "limit": limit}
+        nodes = [self.node_for(lock_id)] if lock_id else self.nodes
+        replies = await self._gather({node: self.members[node].history(**params, cursor=node_cursor(before, self.nodes.index(node))) for node in nodes})
+        events = [
+            {**event, "cursor": f"{event['ts']!r}:{self.nodes.index(node)}:{event['id']}"}
+            for node, reply in replies.items()
+            if not isinstance(reply, BaseException)
+            for event in reply
+        ]
+        return sorted(events, key=history_key, reverse=True)[:limit]
+
+    async def reload_config(self) -> Dict[str, List[str]]:
+        started = time.perf_counter()
+        local = await self.local.reload_config()
+        replies = await self._gather({node: peer.reload_config() for node, peer in self.peers.items()})
+        changes = {key: list(value) for key, value in local.items()}
+        for reply in replies.values():
+            for key, gateways in ({} if isinstance(reply, BaseException) else reply).items():
+                changes.setdefault(key, []).extend(gateways)
+        logger.info(f"Cluster configuration reloaded in {time.perf_counter() - started:.2f} seconds: {changes}")
+        return changes
@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -16,10 +16,60 @@ ACCESS_TOKEN_EXPIRE_DAYS = 14
 
 USERNAME: str = os.getenv("USERNAME") or ""
 PASSWORD_HASH: str = os.getenv("PASSWORD_HASH") or ""
+USERS_FILE: str = os.getenv("USERS_FILE") or ""
 
-if not USERNAME or not PASSWORD_HASH:
-    logger.error("USERNAME and PASSWORD_HASH must be set in environment variables")
-    raise ValueError("USERNAME and PASSWORD_HASH must be set in environment variables")
+
+def read_users(filename: str) -> Dict[str, str]:
+    users = {USERNAME: PASSWORD_HASH} if USERNAME and PASSWORD_HASH else {}
+    if filename:
+        with open(filename) as jsonfile:
+            users.update(json.load(jsonfile))
+        logger.info(f"USERS: loaded {len(users)} users from {filename}")
+    return users
+
+
+USERS = read_users(USERS_FILE)
+ADMIN_USERS: List[str] = [user.strip() for user in (os.getenv("ADMIN_USERS") or USERNAME).split(",") if user.strip()]
+
+if not USERS:
+    logger.error("USERNAME and PASSWORD_HASH or USERS_FILE must be set in environment variables")
+    raise ValueError("USERNAME and PASSWORD_HASH or USERS_FILE must be set in environment variables")
+
+STATUS_POLL_INTERVAL: float = float(os.getenv("STATUS_POLL_INTERVAL") or 1)
+STATUS_MAX_AGE: float = float(os.getenv("STATUS_MAX_AGE") or 5)
+STATUS_FEED_HISTORY: int = int(os.getenv("STATUS_FEED_HISTORY") or 1000)
+STATUS_STREAM_KEEPALIVE: float = float(os.getenv("STATUS_STREAM_KEEPALIVE") or 15)
+PULSE_GAP_MS: int = int(os.getenv("PULSE_GAP_MS") or 500)
+COMMAND_QUEUE_SIZE: int = int(os.getenv("COMMAND_QUEUE_SIZE") or 256)
+COMMAND_DEADLINE_MS: int = int(os.getenv("COMMAND_DEADLINE_MS") or 5000)
+PULSE_CONFIRM_DELAY_MS: int = int(os.getenv("PULSE_CONFIRM_DELAY_MS") or 200)
+PULSE_JOBS_LIMIT: int = int(os.getenv("PULSE_JOBS_LIMIT") or 1000)
+HOLD_REPULSE_INTERVAL_MS: int = int(os.getenv("HOLD_REPULSE_INTERVAL_MS") or 1000)
+HOLD_MAX_MS: int = int(os.getenv("HOLD_MAX_MS") or 600000)
+GATEWAY_CONNECT_TIMEOUT: float = float(os.getenv("GATEWAY_CONNECT_TIMEOUT") or 3)
+GATEWAY_FAILURE_THRESHOLD: int = int(os.getenv("GATEWAY_FAILURE_THRESHOLD") or 3)
+GATEWAY_BACKOFF_MIN: float = float(os.getenv("GATEWAY_BACKOFF_MIN") or 1)
+GATEWAY_BACKOFF_MAX: float = float(os.getenv("GATEWAY_BACKOFF_MAX") or 30)
+STATUS_PIPELINE: bool = (os.getenv("STATUS_PIPELINE") or "").lower() in ("1", "true", "yes")
+STATUS_WAIT_TIMEOUT: float = float(os.getenv("STATUS_WAIT_TIMEOUT") or 2)
+LOGIN_WORKERS: int = int(os.getenv("LOGIN_WORKERS") or 2)
+LOGIN_MAX_PENDING: int = int(os.getenv("LOGIN_MAX_PENDING") or 16)
+LOGIN_MAX_FAILURES: int = int(os.getenv("LOGIN_MAX_FAILURES") or 5)
+LOGIN_FAILURE_WINDOW: float = float(os.getenv("LOGIN_FAILURE_WINDOW") or 300)
+BROKER_SOCKET: str = os.getenv("BROKER_SOCKET") or ""
+CLUSTER_NODES: List[str] = [node.strip() for node in (os.getenv("CLUSTER_NODES") or "").split(",") if node.strip()]
+CLUSTER_NODE: str = os.getenv("CLUSTER_NODE") or ""
+CLUSTER_SECRET: str = os.getenv("CLUSTER_SECRET") or ""
+TOKEN_DB: str = os.getenv("TOKEN_DB", "tokens.db")
+TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE") or 10000)
+TOKEN_REFRESH_INTERVAL: float = float(os.getenv("TOKEN_REFRESH_INTERVAL") or 1)
+JOURNAL_DB: str = os.getenv("JOURNAL_DB") or "journal.db"
+JOURNAL_BATCH_SIZE: int = int(os.getenv("JOURNAL_BATCH_SIZE") or 500)
+JOURNAL_FLUSH_INTERVAL: float = float(os.getenv("JOURNAL_FLUSH_INTERVAL") or 0.5)
+JOURNAL_MAX_PENDING: int = int(os.getenv("JOURNAL_MAX_PENDING") or 100000)
+CHECKPOINT_FILE: str = os.getenv("CHECKPOINT_FILE", "checkpoint.json")
+CHECKPOINT_INTERVAL: float = float(os.getenv("CHECKPOINT_INTERVAL") or 10)
+CONFIG_WATCH_INTERVAL: float = float(os.getenv("CONFIG_WATCH_INTERVAL") or 2)
 
 DEFAULT_CONFIG_FILENAME = "config.json"
 
@@ -31,6 +81,14 @@ def read_config_json(filename: str = DEFAULT_CONFIG_FILENAME) -> Dict[str, Any]:
     return config
 
 
+def config_stamp(filename: str = DEFAULT_CONFIG_FILENAME) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 CONFIG = read_config_json()
 RELAYS_IP = list(CONFIG.keys())
 
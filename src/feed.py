@@ -0,0 +1,62 @@
+import asyncio
+from collections import deque
+import json
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+FeedEvent = Tuple[int, Dict[str, dict]]
+FeedListener = Callable[[int, Dict[str, dict]], None]
+
+
+class StatusFeed:
+    def __init__(self, history: int) -> None:
+        self.events: Deque[FeedEvent] = deque(maxlen=history)
+        self.version = 0
+        self.evicted_version = 0
+        self._changed = asyncio.Event()
+        self.listeners: List[FeedListener] = []
+
+    def publish(self, version: int, changes: Dict[str, dict]) -> None:
+        if not changes:
+            return
+        if len(self.events) == self.events.maxlen:
+            self.evicted_version = self.events[0][0]
+        self.events.append((version, changes))
+        self.version = version
+        self._wake()
+        for listener in self.listeners:
+            listener(version, changes)
+        logger.debug(f"Status feed version {version} with {len(changes)} changes")
+
+    def reset(self, version: int) -> None:
+        self.events.clear()
+        self.version = self.evicted_version = version
+        self._wake()
+        for listener in self.listeners:
+            listener(version, {})
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def since(self, version: int) -> Optional[List[FeedEvent]]:
+        if version < self.evicted_version or version > self.version:
+            return None
+        if version == self.version:
+            return []
+        return [event for event in self.events if event[0] > version]
+
+    async def wait(self, version: int, timeout: float) -> Optional[List[FeedEvent]]:
+        if version == self.version:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return []
+        return self.since(version)
+
+
+def format_event(event: str, version: int, data: Any) -> str:
+    return f"event: {event}\nid: {version}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,80 @@
+import random
+import time
+from typing import Any, Dict, Optional
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+
+class GatewayHealth:
+    def __init__(self, ip: str, failure_threshold: int, backoff_min: float, backoff_max: float) -> None:
+        self.ip = ip
+        self.failure_threshold = failure_threshold
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.connected = False
+        self.failures = 0
+        self.open_until = 0.0
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[float] = None
+        self.connected_since: Optional[float] = None
+
+    @property
+    def circuit_open(self) -> bool:
+        return self.failures >= self.failure_threshold and time.monotonic() < self.open_until
+
+    @property
+    def online(self) -> bool:
+        return self.connected and self.failures < self.failure_threshold
+
+    @property
+    def state(self) -> str:
+        if not self.connected:
+            return "disconnected"
+        if self.failures < self.failure_threshold:
+            return "connected"
+        return "open" if self.circuit_open else "half_open"
+
+    def allow(self) -> bool:
+        return self.connected and not self.circuit_open
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_min * 2 ** min(attempt, 16))
+        return delay * random.uniform(0.5, 1.0)
+
+    def on_connected(self) -> None:
+        self.connected = True
+        self.connected_since = time.time()
+        self.failures = 0
+        self.open_until = 0.0
+
+    def on_disconnected(self, error: Optional[str] = None) -> None:
+        self.connected = False
+        self.connected_since = None
+        if error:
+            self.last_error = error
+
+    def on_success(self) -> None:
+        if self.failures >= self.failure_threshold:
+            logger.info(f"Circuit for gateway {self.ip} closed")
+        self.failures = 0
+        self.open_until = 0.0
+        self.last_success = time.time()
+
+    def on_failure(self, error: str) -> None:
+        self.failures += 1
+        self.last_error = error
+        if self.failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.backoff(self.failures - self.failure_threshold)
+            logger.warning(f"Circuit for gateway {self.ip} open after {self.failures} failures: {error}")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "online": self.online,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+            "connected_since": self.connected_since,
+        }
@@ -0,0 +1,156 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import json
+import sqlite3
+import time
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from logger_config import setup_logger
+import metrics
+
+logger = setup_logger()
+
+JournalRow = Tuple[float, str, str, Optional[str], Optional[str], Optional[str], Optional[Dict[str, Any]]]
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events ("
+    "id INTEGER PRIMARY KEY, ts REAL NOT NULL, kind TEXT NOT NULL, lock_id TEXT NOT NULL, "
+    "gateway TEXT, user TEXT, outcome TEXT, details TEXT)",
+    "CREATE INDEX IF NOT EXISTS events_lock_ts ON events (lock_id, ts)",
+    "CREATE INDEX IF NOT EXISTS events_ts ON events (ts)",
+)
+COLUMNS = ("id", "ts", "kind", "lock_id", "gateway", "user", "outcome", "details")
+
+
+def event_cursor(ts: float, event_id: int) -> str:
+    return f"{ts!r}:{event_id}"
+
+
+def parse_cursor(cursor: str) -> Tuple[float, int]:
+    ts, separator, event_id = cursor.rpartition(":")
+    if not separator:
+        raise ValueError(f"Invalid history cursor: {cursor}")
+    return float(ts), int(event_id)
+
+
+class Journal:
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 0.5, max_pending: int = 100000) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending: Deque[JournalRow] = deque()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="journal")
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flushing = asyncio.Lock()
+        self._recorded = {kind: metrics.JOURNAL_EVENTS.labels(kind) for kind in ("pulse", "state", "hold")}
+        self._dropped = metrics.JOURNAL_DROPPED.labels()
+        self._flush_duration = metrics.JOURNAL_FLUSH_DURATION.labels()
+
+    def record(
+        self,
+        kind: str,
+        lock_id: str,
+        gateway: Optional[str] = None,
+        user: Optional[str] = None,
+        outcome: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if len(self.pending) >= self.max_pending:
+            self._dropped.inc()
+            return
+        self.pending.append((time.time(), kind, lock_id, gateway, user, outcome, details))
+        self._recorded[kind].inc()
+        if len(self.pending) >= self.batch_size:
+            self._ready.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        await self._run_in_thread(self._close)
+
+    async def _run(self) -> None:
+        try:
+            await self._run_in_thread(self._open)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open event journal {self.path}: {str(e)}")
+            return
+        logger.info(f"Event journal writing to {self.path}")
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._ready.wait(), timeout=self.flush_interval)
+            self._ready.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flushing:
+            while self.pending and self._connection is not None:
+                rows = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                started = time.perf_counter()
+                try:
+                    await self._run_in_thread(self._write, rows)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to write {len(rows)} journal events: {str(e)}")
+                    self._dropped.inc(len(rows))
+                self._flush_duration.observe(time.perf_counter() - started)
+
+    async def query(
+        self,
+        lock_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        before_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        before = parse_cursor(cursor) if cursor else None
+        await self.flush()
+        filters = {"lock_id = ?": lock_id, "kind = ?": kind, "ts >= ?": start, "ts < ?": end, "id < ?": before_id}
+        clauses = [clause for clause, value in filters.items() if value is not None]
+        params: List[Any] = [value for value in filters.values() if value is not None]
+        if before is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            params.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM events {where} ORDER BY ts DESC, id DESC LIMIT ?"
+        rows = await self._run_in_thread(self._read, sql, params + [limit])
+        return [dict(zip(COLUMNS, row[:-1]), details=json.loads(row[-1]) if row[-1] else None, cursor=event_cursor(row[1], row[0])) for row in rows]
+
+    async def _run_in_thread(self, func: Any, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self) -> None:
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _write(self, rows: List[JournalRow]) -> None:
+        if self._connection is None:
+            raise sqlite3.OperationalError("journal is closed")
+        encoded = [(*row[:-1], json.dumps(row[-1], ensure_ascii=False) if row[-1] else None) for row in rows]
+        with self._connection:
+            self._connection.executemany("INSERT INTO events (ts, kind, lock_id, gateway, user, outcome, details) VALUES (?, ?, ?, ?, ?, ?, ?)", encoded)
+
+    def _read(self, sql: str, params: List[Any]) -> List[Tuple[Any, ...]]:
+        if self._connection is None:
+            return []
+        return self._connection.execute(sql, params).fetchall()
@@ -0,0 +1,51 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+STATUS_CLOSED = {"status": True}
+STATUS_OPEN = {"status": False}
+STATUS_OFFLINE: Dict[str, Any] = {"status": None}
+STATUS_VALUES = (STATUS_OPEN, STATUS_CLOSED)
+
+
+class GatewayLayout:
+    def __init__(self, ip: str, details: Dict[str, Any]) -> None:
+        self.ip = ip
+        self.boards: int = details["boards"]
+        self.entries: List[Tuple[str, int, int]] = [(lock["id"], lock["board"], lock["lock"] - 1) for lock in details["locks"]]
+        self.by_board: Dict[int, List[Tuple[int, str]]] = {}
+        for lock_id, board, bit in self.entries:
+            self.by_board.setdefault(board, []).append((bit, lock_id))
+
+    def lookup(self) -> Dict[str, Tuple[str, int, int]]:
+        return {lock_id: (self.ip, board, bit + 1) for lock_id, board, bit in self.entries}
+
+    def states(self, masks: Optional[Dict[int, int]]) -> Dict[str, dict]:
+        masks = masks or {}
+        return {lock_id: STATUS_VALUES[masks[board] >> bit & 1] if board in masks else STATUS_OFFLINE for lock_id, board, bit in self.entries}
+
+    def changes(self, before: Optional[Dict[int, int]], after: Dict[int, int]) -> Dict[str, dict]:
+        if before is None:
+            return self.states(after)
+        changed: Dict[str, dict] = {}
+        for board, locks in self.by_board.items():
+            changed.update(board_changes(locks, before.get(board), after.get(board)))
+        return changed
+
+
+def build_layouts(config: Dict[str, Any]) -> Dict[str, GatewayLayout]:
+    layouts = {}
+    for ip, details in config.items():
+        try:
+            layouts[ip] = GatewayLayout(ip, details)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid layout for gateway {ip}: {type(e).__name__} {str(e)}")
+    return layouts
+
+
+def board_changes(locks: List[Tuple[int, str]], before: Optional[int], after: Optional[int]) -> Iterator[Tuple[str, dict]]:
+    if after is None:
+        if before is not None:
+            yield from ((lock_id, STATUS_OFFLINE) for _, lock_id in locks)
+        return
+    diff = -1 if before is None else before ^ after
+    if diff:
+        yield from ((lock_id, STATUS_VALUES[after >> bit & 1]) for bit, lock_id in locks if diff >> bit & 1)
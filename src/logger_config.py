@@ -1,13 +1,25 @@
 import datetime
+import json
 import os
 import sys
-from typing import Any
+import time
+from typing import Any, Dict, Optional, TextIO, Tuple
 
 from dotenv import load_dotenv
 from loguru import logger
 
+import metrics
+from tracing import current_request_id
+
 load_dotenv()
 
+LOG_LEVEL: str = (os.getenv("LOG_LEVEL") or "INFO").upper()
+LOG_FORMAT: str = (os.getenv("LOG_FORMAT") or "text").lower()
+LOG_SAMPLE_INITIAL: int = int(os.getenv("LOG_SAMPLE_INITIAL") or 0)
+LOG_SAMPLE_THEREAFTER: int = int(os.getenv("LOG_SAMPLE_THEREAFTER") or 0)
+TEXT_FORMAT = "{time:DD.MM.YYYY HH:mm:ss:SSSS} | {level: <8} | {extra[request_id]: <16} | {message: <50} | {name}:{function}:{line}"
+ERROR_LEVEL_NO = 40
+
 logger_initialized: bool = False
 
 
@@ -35,25 +47,68 @@ class Rotator:
 rotator: Rotator = Rotator(size=5e8, at=datetime.time(0, 0, 0))
 
 
+def add_request_id(record: Any) -> None:
+    record["extra"].setdefault("request_id", current_request_id())
+
+
+class LogSampler:
+    def __init__(self, initial: int, thereafter: int, period: float = 1.0) -> None:
+        self.initial = initial
+        self.thereafter = thereafter
+        self.period = period
+        self.window = 0
+        self.counts: Dict[Tuple[str, int], int] = {}
+
+    def __call__(self, record: Any) -> bool:
+        if record["level"].no >= ERROR_LEVEL_NO:
+            return True
+        window = int(time.monotonic() // self.period)
+        if window != self.window:
+            self.window = window
+            self.counts.clear()
+        key = (record["name"], record["line"])
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count <= self.initial or (self.thereafter > 0 and (count - self.initial) % self.thereafter == 0):
+            return True
+        metrics.LOG_SUPPRESSED.labels(record["level"].name).inc()
+        return False
+
+
+class JsonSink:
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def write(self, message: Any) -> None:
+        record = message.record
+        entry = {
+            **record["extra"],
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "message": record["message"],
+            "source": f"{record['name']}:{record['function']}:{record['line']}",
+        }
+        if record["exception"]:
+            entry["exception"] = message.strip()
+        self.stream.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def add_sinks(log_format: str, level: str, sampler: Optional[LogSampler] = None, stream: TextIO = sys.stdout, errors: TextIO = sys.stderr) -> None:
+    if log_format == "json":
+        logger.add(JsonSink(stream), enqueue=True, level=level, format="", filter=sampler, colorize=False, backtrace=False, diagnose=False)
+        return
+    logger.add(stream, enqueue=True, level=level, format=TEXT_FORMAT, filter=sampler, colorize=None, backtrace=True)
+    logger.add(errors, enqueue=True, level="ERROR", format=TEXT_FORMAT, colorize=None, backtrace=True)
+
+
 def setup_logger() -> Any:
     global logger_initialized
     if not logger_initialized:
-        log_level = os.getenv("LOG_LEVEL", "INFO").upper()
-        logger.add(
-            sys.stdout,
-            enqueue=True,
-            level=log_level,
-            format="{time:DD.MM.YYYY HH:mm:ss:SSSS} | {level: <8} | {message: <50} | {name}:{function}:{line}",
-            colorize=True,
-            backtrace=True,
-        )
-        logger.add(
-            sys.stderr,
-            enqueue=True,
-            level="ERROR",
-            format="{time:DD.MM.YYYY HH:mm:ss:SSSS} | {level: <8} | {message: <50} | {name}:{function}:{line}",
-            colorize=True,
-            backtrace=True,
-        )
+        logger.configure(patcher=add_request_id)
+        logger.remove()
+        sampler = LogSampler(LOG_SAMPLE_INITIAL, LOG_SAMPLE_THEREAFTER) if LOG_SAMPLE_INITIAL > 0 else None
+        add_sinks(LOG_FORMAT, LOG_LEVEL, sampler)
         logger_initialized = True
     return logger
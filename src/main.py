@@ -1,30 +1,74 @@
 import asyncio
 from contextlib import asynccontextmanager
+from datetime import datetime
 from datetime import timedelta
-from typing import Any, AsyncGenerator, Dict
+import math
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Dict, List, Literal, Optional, TypeVar, Union
 
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import FastAPI
+from fastapi import Header
 from fastapi import HTTPException
+from fastapi import Query
+from fastapi import Request
+from fastapi import Response
 from fastapi import status
+from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
 
+from broker import BrokerClient
+from cluster import ClusterManager
+from config import BROKER_SOCKET
+from config import CLUSTER_NODE
+from config import CLUSTER_NODES
+from config import CLUSTER_SECRET
 from config import CONFIG
+from config import STATUS_STREAM_KEEPALIVE
+from feed import format_event
 from logger_config import setup_logger
+from metrics import HTTP_REQUEST_DURATION
+from metrics import MetricsMiddleware
+from metrics import render_metrics
 from models import CommandPulse
+from models import CommandPulseBatch
+from models import HoldState
+from models import ResponseConfigReload
+from models import ResponseHistory
+from models import ResponseHolds
 from models import ResponsePulse
+from models import ResponsePulseBatch
+from models import ResponsePulseJob
 from models import ResponseStatus
 from models import TokenRequest
 from models import TokenResponse
-from relay import device_manager
+from profiler import ProfilerBusy
+from relay import device_manager as local_device_manager
+from relay import DeviceManager
+from relay import GatewayBusy
 from security import authenticate_user
 from security import create_access_token
+from security import decode_admin_token
 from security import decode_token
 from security import oauth2_scheme
+from security import revoke_token
+from status_payload import payload_response
+from tracing import TracingMiddleware
 
 logger = setup_logger()
 
+T = TypeVar("T")
+
+device_manager: Union[DeviceManager, BrokerClient, ClusterManager]
+if CLUSTER_NODES:
+    device_manager = ClusterManager(local_device_manager, CLUSTER_NODES, CLUSTER_NODE, CLUSTER_SECRET)
+elif BROKER_SOCKET:
+    device_manager = BrokerClient(BROKER_SOCKET)
+else:
+    device_manager = local_device_manager
+
 description = """
 Команды для управления замочной системой
 """
@@ -32,10 +76,9 @@ description = """
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[Any, Any]:
-    asyncio.create_task(device_manager.initialize_devices_background(CONFIG))
+    device_manager.start(CONFIG)
     yield
-    for device in device_manager.get_devices().values():
-        await device.disconnect()
+    await device_manager.stop()
 
 
 app = FastAPI(
@@ -43,6 +86,29 @@ app = FastAPI(
     description=description,
     lifespan=lifespan,
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+GATEWAY_BUSY_STATUS = {
+    "full": status.HTTP_429_TOO_MANY_REQUESTS,
+    "deadline": status.HTTP_503_SERVICE_UNAVAILABLE,
+}
+
+
+@app.exception_handler(GatewayBusy)
+async def gateway_busy(request: Request, exc: GatewayBusy) -> JSONResponse:
+    return JSONResponse(
+        {"detail": exc.detail},
+        status_code=GATEWAY_BUSY_STATUS.get(exc.reason, status.HTTP_503_SERVICE_UNAVAILABLE),
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(ProfilerBusy)
+async def profiler_busy(request: Request, exc: ProfilerBusy) -> JSONResponse:
+    return JSONResponse({"detail": str(exc)}, status_code=status.HTTP_409_CONFLICT)
+
+
 router_v1 = APIRouter(
     prefix="/api/v1",
 )
@@ -50,9 +116,29 @@ router_v1 = APIRouter(
 devices: Dict[str, Any] = {}
 
 
+async def until_disconnected(request: Request) -> None:
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def unless_disconnected(request: Request, call: Awaitable[T]) -> T:
+    task = asyncio.ensure_future(call)
+    watcher = asyncio.ensure_future(until_disconnected(request))
+    try:
+        await asyncio.wait((task, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        gone = not task.done()
+        task.cancel()
+    if gone:
+        logger.info(f"Client left {request.url.path} before the reply, its queued commands are dropped")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
 @router_v1.post("/token", response_model=TokenResponse, summary="Method for getting access token")
-async def login_for_access_token(form_data: TokenRequest) -> TokenResponse:
-    user = authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(form_data: TokenRequest, request: Request) -> TokenResponse:
+    user = await authenticate_user(form_data.username, form_data.password, request.client.host if request.client else "")
     logger.info(f"User {form_data.username} attempted to login")
     if not user:
         logger.warning(f"Failed login attempt for user: {form_data.username}")
@@ -70,6 +156,13 @@ async def login_for_access_token(form_data: TokenRequest) -> TokenResponse:
     return TokenResponse(access_token=access_token, token_type="bearer")
 
 
+@router_v1.delete("/token", status_code=204, summary="Method for revoking access token")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> Response:
+    token_data = decode_token(credentials)
+    revoke_token(token_data.username or "")
+    return Response(status_code=204)
+
+
 @router_v1.get("/users/me")
 async def read_users_me(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
     token_data = decode_token(credentials)
@@ -80,18 +173,193 @@ async def read_users_me(credentials: HTTPAuthorizationCredentials = Depends(oaut
 @router_v1.post(
     "/pulse",
     tags=["Open"],
-    description=("Открытие замка, и автоматическое " "закрытие через заданное время. " "ID устройства и время задаются в запросе."),
+    description=(
+        "Открытие замка, и автоматическое "
+        "закрытие через заданное время. "
+        "ID устройства и время задаются в запросе. "
+        "Если time_ms больше интервала HOLD_REPULSE_INTERVAL_MS, замок удерживается открытым повторными импульсами до истечения времени, "
+        "удержание видно в /api/v1/holds и его можно отменить. "
+        "Если шлюз не успеет повторять импульсы еще одного удержания с учетом PULSE_GAP_MS, замок открывается без удержания, "
+        "а причина возвращается в поле hold_error. "
+        "Ответ возвращается после отправки команды на шлюз; если команда не ушла до COMMAND_DEADLINE_MS, открытие считается неудачным. "
+        "С confirm=true ответ возвращается после отправки команды и проверки статуса платы, "
+        "с временем ожидания в очереди, отправки и проверки. "
+        "Если очередь шлюза заполнена, возвращается 429, если команду не успеть отправить за COMMAND_DEADLINE_MS — 503; "
+        "в обоих случаях заголовок Retry-After подсказывает, через сколько секунд повторить запрос."
+    ),
     response_model=ResponsePulse,
+    response_model_exclude_none=True,
+)
+async def pulse(command: CommandPulse, request: Request, credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+    token_data = decode_token(credentials)
+    logger.info("Unlocking lock with ID: {lock_id} by user {user}", lock_id=command.id, user=token_data.username)
+
+    devices = device_manager.get_devices()
+    if not devices:
+        raise HTTPException(status_code=503, detail="Devices are not initialized yet")
+
+    return await unless_disconnected(request, device_manager.pulse_lock(command.id, confirm=command.confirm, user=token_data.username, time_ms=command.time_ms))
+
+
+@router_v1.post(
+    "/pulse/jobs",
+    tags=["Open"],
+    description=("Асинхронное открытие замка с проверкой. " "Сразу возвращает ID задачи, результат можно получить через GET /api/v1/pulse/jobs/{job_id}."),
+    response_model=ResponsePulseJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def pulse_job(command: CommandPulse, credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+    token_data = decode_token(credentials)
+    logger.info(f"Queueing pulse job for lock ID: {command.id} by user {token_data.username}")
+
+    devices = device_manager.get_devices()
+    if not devices:
+        raise HTTPException(status_code=503, detail="Devices are not initialized yet")
+
+    return await device_manager.start_pulse_job(command.id, user=token_data.username, time_ms=command.time_ms)
+
+
+@router_v1.get(
+    "/pulse/jobs/{job_id}",
+    tags=["Open"],
+    description="Статус асинхронного открытия замка.",
+    response_model=ResponsePulseJob,
+)
+async def pulse_job_status(job_id: str, credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+    decode_token(credentials)
+    job = await device_manager.get_pulse_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Pulse job not found")
+    return job
+
+
+@router_v1.get(
+    "/holds",
+    tags=["Open"],
+    description="Замки, удерживаемые открытыми по time_ms, и число запланированных таймеров на каждом шлюзе.",
+    response_model=ResponseHolds,
+    response_model_exclude_none=True,
 )
-async def pulse(command: CommandPulse, credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+async def holds(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+    decode_token(credentials)
+    return await device_manager.list_holds()
+
+
+@router_v1.delete(
+    "/holds/{hold_id}",
+    tags=["Open"],
+    description="Досрочно прекращает удержание замка открытым.",
+    response_model=HoldState,
+    response_model_exclude_none=True,
+)
+async def cancel_hold(hold_id: str, credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
     token_data = decode_token(credentials)
-    logger.info(f"Unlocking lock with ID: {command.id} by user {token_data.username}")
+    hold = await device_manager.cancel_hold(hold_id, user=token_data.username)
+    if hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    logger.info(f"Hold {hold_id} of lock {hold['lock_id']} cancelled by user {token_data.username}")
+    return hold
+
+
+@router_v1.post(
+    "/pulse/batch",
+    tags=["Open"],
+    description=(
+        "Открытие нескольких замков одним запросом. "
+        "Команды группируются по шлюзам: шлюзы обрабатываются параллельно, "
+        "внутри шлюза команды отправляются с настроенным интервалом. "
+        "Возвращается результат по каждому замку."
+    ),
+    response_model=ResponsePulseBatch,
+)
+async def pulse_batch(command: CommandPulseBatch, request: Request, credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+    token_data = decode_token(credentials)
+    logger.info(f"Unlocking {len(command.ids)} locks by user {token_data.username}")
 
     devices = device_manager.get_devices()
     if not devices:
         raise HTTPException(status_code=503, detail="Devices are not initialized yet")
 
-    return await device_manager.pulse_lock(command.id)
+    return await unless_disconnected(request, device_manager.pulse_batch(command.ids, user=token_data.username))
+
+
+@router_v1.get(
+    "/history",
+    tags=["Status"],
+    description=(
+        "Журнал открытий и изменений состояния замков, новые события первыми. "
+        "kind=pulse — вызовы открытия с пользователем и результатом, kind=state — наблюдаемые изменения состояния, kind=hold — окончание удержания замка открытым. "
+        "Фильтры: lock_id, kind, период start/end (ISO 8601 или Unix-время). "
+        "Для следующей страницы передайте cursor последнего полученного события; "
+        "before_id (id последнего события) поддерживается только без кластера."
+    ),
+    response_model=ResponseHistory,
+    response_model_exclude_none=True,
+)
+async def history(
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+    lock_id: Optional[str] = None,
+    kind: Optional[Literal["pulse", "state", "hold"]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+) -> dict:
+    decode_token(credentials)
+    try:
+        events = await device_manager.history(
+            lock_id=lock_id,
+            kind=kind,
+            start=start.timestamp() if start else None,
+            end=end.timestamp() if end else None,
+            before_id=before_id,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"events": events}
+
+
+@router_v1.post(
+    "/admin/reload-config",
+    tags=["Admin"],
+    description=(
+        "Перечитывает config.json без перезапуска сервиса. "
+        "Подключаются только новые шлюзы, удалённые закрываются, шлюзы с изменённым адресом или числом плат переподключаются, "
+        "остальные сохраняют соединение и кэш статусов. Доступно только пользователям из ADMIN_USERS."
+    ),
+    response_model=ResponseConfigReload,
+)
+async def reload_config(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+    token_data = decode_admin_token(credentials)
+    logger.info(f"Reloading configuration by user {token_data.username}")
+    try:
+        return await device_manager.reload_config()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router_v1.post(
+    "/admin/profile",
+    tags=["Admin"],
+    description=(
+        "Включает семплирующий профилировщик цикла событий на seconds секунд и возвращает стеки в свернутом формате "
+        "(строка «стек количество»), который принимают flamegraph.pl, speedscope и Inferno. "
+        "С брокером профилируется процесс broker.py, в кластере — узел, принявший запрос. Одновременно работает только один профилировщик, "
+        "повторный запрос во время работы получает 409. Доступно только пользователям из ADMIN_USERS."
+    ),
+    response_class=PlainTextResponse,
+)
+async def profile(
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+    seconds: float = Query(10, ge=1, le=120),
+    interval_ms: float = Query(5, ge=1, le=100),
+) -> str:
+    token_data = decode_admin_token(credentials)
+    logger.info(f"Profiling for {seconds} seconds by user {token_data.username}")
+    return await device_manager.profile(seconds, interval_ms)
 
 
 @app.get("/health")
@@ -100,25 +368,110 @@ async def health_check() -> dict:
 
 
 @app.get("/ready")
-async def readiness_check() -> dict:
-    return {"status": "OK"}
+async def readiness_check(response: Response) -> dict:
+    gateways = await device_manager.gateway_health()
+    online = sum(1 for gateway in gateways.values() if gateway["online"])
+    if not online:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "NOT_READY", "gateways": gateways}
+    return {"status": "OK" if online == len(gateways) else "DEGRADED", "gateways": gateways}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> str:
+    return render_metrics([HTTP_REQUEST_DURATION]) + await device_manager.device_metrics()
 
 
 @router_v1.get(
     "/status",
     tags=["Status"],
-    description=("Получить статус локеров тип C. " "True - закрыт, False - открыт, null - оффлайн. " "Будет возвращен статус всех замков в системе."),
+    description=(
+        "Получить статус локеров тип C. "
+        "True - закрыт, False - открыт, null - оффлайн. "
+        "Будет возвращен статус всех замков в системе. "
+        "Статус берется из снимка, который периодически обновляется в фоне; "
+        "в gateways указано время опроса, который вернул текущие статусы шлюза (без фильтров ответ не пересобирается, пока статусы не изменятся), "
+        "в заголовке Age - возраст самых старых данных. "
+        "Ответ содержит ETag: повторный запрос с If-None-Match вернет 304, если не изменились статусы и признаки online и stale шлюзов; время опроса в ETag не входит, его показывает заголовок Age. "
+        "Поддерживается сжатие gzip. "
+        "Фильтры ids (список ID через запятую), gateway и prefix (например 5-) ограничивают ответ нужными замками; "
+        "при устаревшем снимке опрашиваются только платы с этими замками."
+    ),
     response_model=ResponseStatus,
+    responses={304: {"description": "Статусы не изменились"}},
+)
+async def lock_status(
+    request: Request,
+    ids: Optional[List[str]] = Query(default=None, description="ID замков, можно через запятую или повторяя параметр"),
+    gateway: Optional[str] = Query(default=None, description="IP шлюза"),
+    prefix: Optional[str] = Query(default=None, description="Префикс ID замков"),
+    if_none_match: Optional[str] = Header(default=None),
+    accept_encoding: str = Header(default=""),
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+) -> Union[Response, dict]:
+    token_data = decode_token(credentials)
+    logger.info("User {user} is checking lock status", user=token_data.username)
+
+    devices = device_manager.get_devices()
+    if not devices:
+        raise HTTPException(status_code=503, detail="Devices are not initialized yet")
+
+    if ids or gateway or prefix:
+        return await unless_disconnected(request, filtered_lock_status(ids, gateway, prefix))
+
+    payload = await device_manager.status_payload()
+    return payload_response(payload, if_none_match, accept_encoding)
+
+
+async def filtered_lock_status(ids: Optional[List[str]], gateway: Optional[str], prefix: Optional[str]) -> dict:
+    if gateway and gateway not in device_manager.get_devices():
+        raise HTTPException(status_code=404, detail=f"Gateway {gateway} not found")
+    lock_ids = [lock_id for value in ids for lock_id in value.split(",") if lock_id] if ids else None
+    return await device_manager.query_status(lock_ids, gateway, prefix)
+
+
+async def status_events(since: Optional[int]) -> AsyncIterator[str]:
+    feed = device_manager.feed
+    version = since or 0
+    events = feed.since(since) if since is not None else None
+    while True:
+        if events is None:
+            version, states = await device_manager.lock_snapshot()
+            yield format_event("snapshot", version, {"version": version, "id": states})
+        elif events:
+            version = events[-1][0]
+            yield "".join(format_event("change", event_version, {"version": event_version, "id": changes}) for event_version, changes in events)
+        else:
+            yield ": keep-alive\n\n"
+        events = await feed.wait(version, timeout=STATUS_STREAM_KEEPALIVE)
+
+
+@router_v1.get(
+    "/status/stream",
+    tags=["Status"],
+    description=(
+        "Поток изменений статусов локеров (Server-Sent Events). "
+        "Сначала отправляется событие snapshot со статусами всех замков, затем события change "
+        "только с изменившимися замками. Каждое событие помечено версией в поле id; "
+        "при переподключении передайте последнюю версию в since или Last-Event-ID, "
+        "чтобы получить пропущенные изменения."
+    ),
 )
-async def lock_status(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> dict:
+async def lock_status_stream(
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(default=None),
+    credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+) -> StreamingResponse:
     token_data = decode_token(credentials)
-    logger.info(f"User {token_data.username} is checking lock status")
+    logger.info(f"User {token_data.username} subscribed to lock status stream")
 
     devices = device_manager.get_devices()
     if not devices:
         raise HTTPException(status_code=503, detail="Devices are not initialized yet")
 
-    return await device_manager.relaystatus()
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(status_events(since), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 app.include_router(router_v1)
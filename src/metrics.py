@@ -0,0 +1,178 @@
+from bisect import bisect_left
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], Any] = {}
+        registry.append(self)
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self._new_child()
+        return child
+
+    def _new_child(self) -> Any:
+        return CounterValue()
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        if not self.children:
+            return []
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self._samples(self._label_text(values), values, child))
+        return lines
+
+    def _samples(self, labels: str, values: Tuple[str, ...], child: Any) -> List[str]:
+        return [f"{self.name}{labels} {format_value(child.value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _samples(self, labels: str, values: Tuple[str, ...], child: Any) -> List[str]:
+        return [f"{self.name}_total{labels} {format_value(child.value)}"]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def _samples(self, labels: str, values: Tuple[str, ...], child: Any) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), child.counts):
+            cumulative += count
+            bucket = f'le="{format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{self._label_text(values, bucket)} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry: List[Metric] = []
+collectors: List[Callable[[], None]] = []
+
+
+def render_metrics(metrics: Optional[Iterable[Metric]] = None) -> str:
+    for collect in collectors:
+        collect()
+    lines: List[str] = []
+    for metric in registry if metrics is None else metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+GATEWAY_RTT = Histogram("locker_gateway_rtt_seconds", "Status command round trip to a gateway board", ("gateway", "board"))
+GATEWAY_RETRIES = Counter("locker_gateway_retries", "Gateway command attempts that failed and were retried", ("gateway",))
+GATEWAY_RECONNECTS = Counter("locker_gateway_reconnects", "Gateway reconnects after connection errors", ("gateway",))
+COMMAND_QUEUE_DEPTH = Gauge("locker_command_queue_depth", "Commands waiting in the gateway command queue", ("gateway",))
+COMMAND_QUEUE_WAIT = Histogram("locker_command_queue_wait_seconds", "Time commands spent in the gateway command queue", ("gateway", "command"))
+COMMANDS_REJECTED = Counter("locker_commands_rejected", "Gateway commands refused at admission or dropped before sending", ("gateway", "reason"))
+STATUS_CACHE = Counter("locker_status_cache_requests", "Board status cache lookups", ("gateway", "result"))
+STATUS_PAYLOAD_CACHE = Counter("locker_status_payload_requests", "Status payload cache lookups", ("result",))
+JOURNAL_EVENTS = Counter("locker_journal_events", "Events recorded in the event journal", ("kind",))
+JOURNAL_DROPPED = Counter("locker_journal_dropped", "Journal events dropped because the write buffer was full or the write failed")
+JOURNAL_FLUSH_DURATION = Histogram("locker_journal_flush_seconds", "Time to write one batch of journal events")
+HTTP_REQUEST_DURATION = Histogram("locker_http_request_duration_seconds", "Time to the response start of HTTP requests", ("method", "route", "status"))
+LOG_SUPPRESSED = Counter("locker_log_suppressed", "Log records dropped by sampling", ("level",))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.routes: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def send_with_metrics(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                route = self._route(scope)
+                HTTP_REQUEST_DURATION.labels(scope["method"], route, message["status"]).observe(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, send_with_metrics)
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self.routes:
+            self.routes.update((getattr(route, "endpoint", None), getattr(route, "path", "")) for route in scope["app"].routes)
+        return self.routes.get(endpoint, "unmatched")
@@ -1,3 +1,5 @@
+from typing import Any, Dict, List, Optional
+
 from pydantic import BaseModel
 from pydantic import Field
 
@@ -28,31 +30,198 @@ class TokenResponse(BaseModel):
 class CommandPulse(BaseModel):
     id: str = Field(title="ID замка")  # noqa
     time_ms: int = Field(title="Время открытия/закрытия в миллисекундах", gt=0, default=1000)
+    confirm: bool = Field(title="Дождаться отправки команды и проверить, что замок открылся", default=False)
 
     class Config:
         json_schema_extra = {"example": {"id": 1, "time_ms": 10000}}
 
 
+class PulseTimings(BaseModel):
+    queue_wait_ms: float
+    write_ms: float
+    confirm_ms: float
+
+
+class HoldState(BaseModel):
+    id: str  # noqa
+    lock_id: str
+    gateway: str
+    user: Optional[str] = None
+    time_ms: int
+    started_at: float
+    ends_at: float
+    remaining_ms: int
+    pulses: int
+    missed: int = 0
+    status: str
+
+
 class ResponsePulse(BaseModel):
     message: str
+    confirmed: Optional[bool] = None
+    timings: Optional[PulseTimings] = None
+    hold: Optional[HoldState] = None
+    hold_error: Optional[str] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "message": "Locker # 1 opened successfully",
+                "hold": {
+                    "id": "8f14e45fceea167a5a36dedd4bea2543",
+                    "lock_id": "1",
+                    "gateway": "192.168.77.238",
+                    "user": "admin",
+                    "time_ms": 10000,
+                    "started_at": 1728900000.5,
+                    "ends_at": 1728900010.5,
+                    "remaining_ms": 10000,
+                    "pulses": 1,
+                    "status": "active",
+                },
+            }
+        }
+
+
+class ResponseHolds(BaseModel):
+    holds: List[HoldState]
+    timers: Dict[str, int]
+
+
+class ResponsePulseJob(BaseModel):
+    id: str  # noqa
+    lock_id: str
+    status: str
+    created_at: float
+    result: Optional[ResponsePulse] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "id": "3f1c0d7e9a0b4c2d8e6f5a4b3c2d1e0f",
+                "lock_id": "5-1",
+                "status": "done",
+                "created_at": 1728900000.5,
+                "result": {
+                    "message": "Locker # 5-1 opened successfully",
+                    "confirmed": True,
+                    "timings": {"queue_wait_ms": 1.2, "write_ms": 0.4, "confirm_ms": 215.3},
+                },
+            }
+        }
+
+
+class CommandPulseBatch(BaseModel):
+    ids: List[str] = Field(title="ID замков", min_length=1, max_length=1000)
+
+    class Config:
+        json_schema_extra = {"example": {"ids": ["5-1", "5-2", "6-10"]}}
+
+
+class PulseResult(BaseModel):
+    ok: bool
+    message: str
+
+
+class ResponsePulseBatch(BaseModel):
+    results: Dict[str, PulseResult]
 
     class Config:
-        json_schema_extra = {"example": {"message": "Locker # 1 opened and closed for 10 seconds"}}
+        json_schema_extra = {
+            "example": {
+                "results": {
+                    "5-1": {"ok": True, "message": "Locker # 5-1 opened successfully"},
+                    "5-999": {"ok": False, "message": "Locker # 5-999 not found"},
+                }
+            }
+        }
+
+
+class LockState(BaseModel):
+    status: Optional[bool]
+
+
+class GatewayState(BaseModel):
+    version: Optional[int]
+    updated_at: Optional[float]
+    online: Optional[bool] = None
+    stale: bool = False
 
 
 class ResponseStatus(BaseModel):
-    id: dict  # noqa
+    id: Dict[str, LockState]  # noqa
+    version: int
+    gateways: Dict[str, GatewayState]
 
     class Config:
         json_schema_extra = {
             "example": {
                 "id": {
-                    1: {"status": True},
-                    2: {"status": False},
-                    3: {"status": "offline"},
-                }
+                    "1": {"status": True},
+                    "2": {"status": False},
+                    "3": {"status": None},
+                },
+                "version": 42,
+                "gateways": {
+                    "192.168.77.238": {"version": 42, "updated_at": 1728900000.5, "online": True, "stale": False},
+                },
             }
         }
 
 
+class HistoryEvent(BaseModel):
+    id: int  # noqa
+    ts: float
+    kind: str
+    lock_id: str
+    gateway: Optional[str] = None
+    user: Optional[str] = None
+    outcome: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+    cursor: str
+
+
+class ResponseHistory(BaseModel):
+    events: List[HistoryEvent]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "events": [
+                    {
+                        "id": 1042,
+                        "ts": 1728900012.4,
+                        "kind": "state",
+                        "lock_id": "5-1",
+                        "gateway": "192.168.77.238",
+                        "outcome": "open",
+                        "details": {"version": 57},
+                        "cursor": "1728900012.4:1042",
+                    },
+                    {
+                        "id": 1041,
+                        "ts": 1728900012.1,
+                        "kind": "pulse",
+                        "lock_id": "5-1",
+                        "gateway": "192.168.77.238",
+                        "user": "admin",
+                        "outcome": "confirmed",
+                        "details": {"message": "Locker # 5-1 opened successfully"},
+                        "cursor": "1728900012.1:1041",
+                    },
+                ]
+            }
+        }
+
+
+class ResponseConfigReload(BaseModel):
+    added: List[str]
+    removed: List[str]
+    replaced: List[str]
+    updated: List[str]
+
+    class Config:
+        json_schema_extra = {"example": {"added": ["192.168.77.240"], "removed": [], "replaced": [], "updated": ["192.168.77.238"]}}
+
+
 logger.info("MODELS: defined successfully")
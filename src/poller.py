@@ -0,0 +1,126 @@
+import asyncio
+from dataclasses import dataclass
+import time
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING
+
+from logger_config import setup_logger
+
+if TYPE_CHECKING:
+    from relay import DeviceC
+
+logger = setup_logger()
+
+SnapshotListener = Callable[[str, Optional["GatewaySnapshot"], "GatewaySnapshot"], None]
+
+
+@dataclass(frozen=True)
+class GatewaySnapshot:
+    boards: Dict[int, int]
+    version: int
+    updated_at: float
+    refreshed_at: float
+    stale: bool = False
+
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed_at
+
+
+class StatusPoller:
+    def __init__(self, devices: Dict[str, "DeviceC"], interval: float, max_age: float, priority: int = 0) -> None:
+        self.devices = devices
+        self.priority = priority
+        self.interval = interval
+        self.max_age = max_age
+        self.version = 0
+        self.snapshots: Dict[str, GatewaySnapshot] = {}
+        self.listeners: List[SnapshotListener] = []
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+
+    async def run(self) -> None:
+        logger.info(f"Status poller started with interval {self.interval}s")
+        while True:
+            for ip in list(self.devices):
+                if ip not in self._inflight:
+                    self._start_sweep(ip)
+            await asyncio.sleep(self.interval)
+
+    def fresh(self, ip: str) -> Optional[GatewaySnapshot]:
+        snapshot = self.snapshots.get(ip)
+        if snapshot and snapshot.age() <= self.max_age:
+            return snapshot
+        return None
+
+    async def get(self, ip: str) -> Optional[GatewaySnapshot]:
+        snapshot = self.fresh(ip)
+        if snapshot:
+            return snapshot
+        logger.debug(f"Status snapshot miss for {ip}, waiting for sweep")
+        return await self.refresh(ip)
+
+    async def refresh(self, ip: str) -> Optional[GatewaySnapshot]:
+        task = self._inflight.get(ip) or self._start_sweep(ip)
+        return await asyncio.shield(task)
+
+    def restore(self, ip: str, boards: Dict[int, int], updated_at: float) -> None:
+        self.version += 1
+        refreshed_at = time.monotonic() - max(0.0, time.time() - updated_at)
+        self.snapshots[ip] = GatewaySnapshot(boards=boards, version=self.version, updated_at=updated_at, refreshed_at=refreshed_at, stale=True)
+
+    def forget(self, ip: str) -> None:
+        self.snapshots.pop(ip, None)
+
+    def _start_sweep(self, ip: str) -> asyncio.Task:
+        task = asyncio.create_task(self._sweep(ip))
+        self._inflight[ip] = task
+        task.add_done_callback(lambda done: self._finish_sweep(ip, done))
+        return task
+
+    def _finish_sweep(self, ip: str, task: asyncio.Task) -> None:
+        if self._inflight.get(ip) is task:
+            del self._inflight[ip]
+
+    async def _sweep(self, ip: str) -> Optional[GatewaySnapshot]:
+        device = self.devices.get(ip)
+        previous = self.snapshots.get(ip)
+        if device is None or (previous is not None and previous.stale and not device.attempted):
+            return previous
+        try:
+            boards = await device.get_masks(use_cache=False, priority=self.priority)
+        except Exception as e:  # noqa
+            logger.error(f"Status sweep failed for {ip}: {str(e)}")
+            return previous
+        if self.devices.get(ip) is not device:
+            return self.snapshots.get(ip)
+        return self._store(ip, previous, boards)
+
+    def _store(self, ip: str, previous: Optional[GatewaySnapshot], boards: Dict[int, int]) -> GatewaySnapshot:
+        if previous is None or previous.boards != boards:
+            self.version += 1
+            version = self.version
+        else:
+            version = previous.version
+        snapshot = GatewaySnapshot(boards=boards, version=version, updated_at=time.time(), refreshed_at=time.monotonic())
+        self.snapshots[ip] = snapshot
+        if previous is None or previous.version != version:
+            self._notify(ip, previous, snapshot)
+        return snapshot
+
+    def _notify(self, ip: str, previous: Optional[GatewaySnapshot], snapshot: GatewaySnapshot) -> None:
+        for listener in self.listeners:
+            try:
+                listener(ip, previous, snapshot)
+            except Exception as e:  # noqa
+                logger.error(f"Status listener failed for {ip}: {str(e)}")
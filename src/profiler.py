@@ -0,0 +1,51 @@
+import asyncio
+from collections import Counter
+import os
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Optional
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+_running = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def fold_stack(frame: Optional[FrameType]) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float) -> Counter:
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[fold_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+async def profile(seconds: float, interval_ms: float = 5) -> str:
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("Profiler is already running")
+    try:
+        logger.info(f"Sampling the event loop every {interval_ms} ms for {seconds} seconds")
+        stacks = await asyncio.get_running_loop().run_in_executor(None, sample_stacks, threading.get_ident(), seconds, interval_ms / 1000)
+    finally:
+        _running.release()
+    logger.info(f"Profiler collected {sum(stacks.values())} samples in {len(stacks)} distinct stacks")
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
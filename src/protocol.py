@@ -0,0 +1,107 @@
+from typing import Dict, List, NamedTuple, Optional
+
+STX = 0x02
+ETX = 0x03
+CMD_STATUS = 0x50
+CMD_UNLOCK = 0x51
+LOCKS_PER_BOARD = 48
+
+# Frame lengths by command byte: a status reply carries a 6-byte lock mask, unlock is echoed back.
+REPLY_LENGTHS: Dict[int, int] = {CMD_STATUS: 12, CMD_UNLOCK: 6}
+REQUEST_LENGTHS: Dict[int, int] = {CMD_STATUS: 6, CMD_UNLOCK: 6}
+HEADER_LENGTH = 4
+MAX_BUFFER = 4096
+
+
+class Frame(NamedTuple):
+    cmd: int
+    board: int
+    lock: int
+    mask: int
+    raw: bytes
+
+
+def checksum(data: bytes) -> int:
+    return sum(data) & 0xFF
+
+
+def _seal(body: bytes) -> bytes:
+    return body + bytes([checksum(body)])
+
+
+def encode_status(board: int) -> bytes:
+    return _seal(bytes([STX, board, 0x00, CMD_STATUS, ETX]))
+
+
+def encode_unlock(board: int, lock: int) -> bytes:
+    return _seal(bytes([STX, board, lock - 1, CMD_UNLOCK, ETX]))
+
+
+def encode_status_reply(board: int, mask: int) -> bytes:
+    return _seal(bytes([STX, board, 0x00, CMD_STATUS]) + mask.to_bytes(LOCKS_PER_BOARD // 8, "little") + bytes([ETX]))
+
+
+def encode_unlock_reply(board: int, lock: int) -> bytes:
+    return encode_unlock(board, lock)
+
+
+def decode_frame(data: bytes, lengths: Dict[int, int] = REPLY_LENGTHS) -> Optional[Frame]:
+    if len(data) < HEADER_LENGTH or data[0] != STX:
+        return None
+    cmd = data[3]
+    length = lengths.get(cmd)
+    if length is None or len(data) != length or data[-2] != ETX or data[-1] != checksum(data[:-1]):
+        return None
+    if cmd == CMD_UNLOCK:
+        return Frame(cmd=cmd, board=data[1], lock=data[2] + 1, mask=0, raw=bytes(data))
+    return Frame(cmd=cmd, board=data[1], lock=0, mask=int.from_bytes(data[4:-2], "little"), raw=bytes(data))
+
+
+def mask_to_status(mask: int) -> Dict[int, Dict[str, bool]]:
+    return {i + 1: {"lock": bool(mask >> i & 1)} for i in range(LOCKS_PER_BOARD)}
+
+
+class FrameDecoder:
+    def __init__(self, lengths: Dict[int, int] = REPLY_LENGTHS) -> None:
+        self.lengths = lengths
+        self._buffer = bytearray()
+        self.dropped = 0
+
+    def reset(self) -> None:
+        self.dropped += len(self._buffer)
+        self._buffer.clear()
+
+    def feed(self, data: bytes) -> List[Frame]:
+        self._buffer.extend(data)
+        frames: List[Frame] = []
+        frame = self._next_frame()
+        while frame is not None:
+            frames.append(frame)
+            frame = self._next_frame()
+        if len(self._buffer) > MAX_BUFFER:
+            self.reset()
+        return frames
+
+    def _next_frame(self) -> Optional[Frame]:
+        while self._align():
+            length = self.lengths.get(self._buffer[3], 0)
+            if len(self._buffer) < length:
+                return None
+            frame = decode_frame(bytes(self._buffer[:length]), self.lengths) if length else None
+            if frame is not None:
+                del self._buffer[:length]
+                return frame
+            self._drop(1)
+        return None
+
+    def _align(self) -> bool:
+        start = self._buffer.find(STX)
+        if start < 0:
+            self.reset()
+            return False
+        self._drop(start)
+        return len(self._buffer) >= HEADER_LENGTH
+
+    def _drop(self, count: int) -> None:
+        self.dropped += count
+        del self._buffer[:count]
@@ -1,284 +1,1218 @@
 import asyncio
 from collections import deque
-import contextlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from datetime import timedelta
+import functools
+import heapq
+import itertools
 import time
-from typing import Any, Deque, Dict, Optional, Tuple
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import uuid
 
-from config import CONFIG
+from checkpoint import Checkpoint
+from config import CHECKPOINT_FILE
+from config import CHECKPOINT_INTERVAL
+from config import COMMAND_DEADLINE_MS
+from config import COMMAND_QUEUE_SIZE
+from config import config_stamp
+from config import CONFIG_WATCH_INTERVAL
+from config import DEFAULT_CONFIG_FILENAME
+from config import GATEWAY_BACKOFF_MAX
+from config import GATEWAY_BACKOFF_MIN
+from config import GATEWAY_CONNECT_TIMEOUT
+from config import GATEWAY_FAILURE_THRESHOLD
+from config import HOLD_MAX_MS
+from config import HOLD_REPULSE_INTERVAL_MS
+from config import JOURNAL_BATCH_SIZE
+from config import JOURNAL_DB
+from config import JOURNAL_FLUSH_INTERVAL
+from config import JOURNAL_MAX_PENDING
+from config import PULSE_CONFIRM_DELAY_MS
+from config import PULSE_GAP_MS
+from config import PULSE_JOBS_LIMIT
+from config import read_config_json
+from config import STATUS_FEED_HISTORY
+from config import STATUS_MAX_AGE
+from config import STATUS_PIPELINE
+from config import STATUS_POLL_INTERVAL
+from config import STATUS_WAIT_TIMEOUT
+from feed import StatusFeed
+from health import GatewayHealth
+from journal import Journal
+from layout import build_layouts
+from layout import GatewayLayout
+from layout import STATUS_OFFLINE
+from layout import STATUS_VALUES
 from logger_config import setup_logger
+import metrics
+from poller import GatewaySnapshot
+from poller import StatusPoller
+from profiler import profile
+from protocol import CMD_STATUS
+from protocol import CMD_UNLOCK
+from protocol import decode_frame
+from protocol import encode_status
+from protocol import encode_unlock
+from protocol import Frame
+from protocol import FrameDecoder
+from protocol import mask_to_status
+from protocol import REQUEST_LENGTHS
+from scheduler import Timer
+from scheduler import TimerScheduler
+from status_payload import StatusPayload
+from tracing import background_task
+from tracing import current_trace
+from tracing import record
+from tracing import span
+from tracing import Trace
 
 logger = setup_logger()
+lazy_logger = logger.opt(lazy=True)
+
+PRIORITY_UNLOCK = 0
+PRIORITY_HOLD = 1
+PRIORITY_STATUS = 2
+PRIORITY_POLL = 3
+
+CONNECTION_KEYS = ("host", "port", "boards")
+STATE_NAMES = {True: "closed", False: "open", None: "offline"}
+SERVICE_TIME_WEIGHT = 0.2
+
+
+class GatewayBusy(Exception):
+    def __init__(self, ip: str, reason: str, detail: str, retry_after: float) -> None:
+        super().__init__(detail)
+        self.ip = ip
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class Command:
+    priority: int
+    seq: int
+    payload: bytes = field(compare=False)
+    retries: int = field(compare=False, default=3)
+    future: asyncio.Future = field(compare=False, default_factory=lambda: asyncio.get_running_loop().create_future())
+    enqueued_at: float = field(compare=False, default_factory=time.perf_counter)
+    started_at: float = field(compare=False, default=0.0)
+    finished_at: float = field(compare=False, default=0.0)
+    deadline: Optional[float] = field(compare=False, default=None)
+    parked_at: float = field(compare=False, default=0.0)
+    trace: Optional[Trace] = field(compare=False, default_factory=current_trace.get)
+
+    @property
+    def cmd(self) -> int:
+        return self.payload[3]
+
+    @property
+    def board(self) -> int:
+        return self.payload[1]
+
+    @property
+    def queue_wait(self) -> float:
+        return (self.started_at or time.perf_counter()) - self.enqueued_at
+
+    @property
+    def service_time(self) -> float:
+        return self.finished_at - self.started_at if self.finished_at else 0.0
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+
+@dataclass
+class Hold:
+    id: str  # noqa
+    lock_id: str
+    gateway: str
+    board: int
+    lock: int
+    user: Optional[str]
+    time_ms: int
+    started_at: float
+    until: float
+    pulses: int = 1
+    missed: int = 0
+    status: str = "active"
+    timer: Optional[Timer] = field(default=None, repr=False)
+    command: Optional[Command] = field(default=None, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "lock_id": self.lock_id,
+            "gateway": self.gateway,
+            "user": self.user,
+            "time_ms": self.time_ms,
+            "started_at": self.started_at,
+            "ends_at": self.started_at + self.time_ms / 1000,
+            "remaining_ms": max(0, round((self.until - time.monotonic()) * 1000)) if self.status == "active" else 0,
+            "pulses": self.pulses,
+            "missed": self.missed,
+            "status": self.status,
+        }
 
 
 class DeviceC:
-    def __init__(self, ip_address: str, board_count: int):
+    def __init__(
+        self,
+        ip_address: str,
+        board_count: int,
+        host: Optional[str] = None,
+        port: int = 23,
+        pulse_gap: float = PULSE_GAP_MS / 1000,
+        pipeline: bool = STATUS_PIPELINE,
+    ):
         self.ip = ip_address
-        self.port = 23
+        self._lazy_ip = functools.partial(str, ip_address)
+        self.host = host or ip_address
+        self.port = port
         self.board_count = board_count
         self.reader: Optional[asyncio.StreamReader] = None
         self.writer: Optional[asyncio.StreamWriter] = None
-        self.semaphore = asyncio.Semaphore(1)
-        self.command_queue: Deque[Tuple[bytes, int]] = deque()
-        self.queue_lock = asyncio.Lock()
+        self.command_queue: asyncio.PriorityQueue[Command] = asyncio.PriorityQueue(maxsize=COMMAND_QUEUE_SIZE)
+        self._parked: List[Command] = []
         self.cache: Dict[bytes, Dict[str, Any]] = {}
+        self.decoder = FrameDecoder()
+        self.pending_frames: Deque[Frame] = deque()
         self.timeout = 2
-        self.retry_delay = 2
-        logger.info(f"DeviceC initialized for IP: {ip_address} with {board_count} boards")
+        self.connect_timeout = GATEWAY_CONNECT_TIMEOUT
+        self.pulse_gap = pulse_gap
+        self.pipeline = pipeline
+        self.deadline = COMMAND_DEADLINE_MS / 1000
+        self.health = GatewayHealth(ip_address, GATEWAY_FAILURE_THRESHOLD, GATEWAY_BACKOFF_MIN, GATEWAY_BACKOFF_MAX)
+        self._sequence = itertools.count()
+        self._worker: Optional[asyncio.Task] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self._lost = asyncio.Event()
+        self._attempted = asyncio.Event()
+        self._next_unlock_at = 0.0
+        self._queued: Dict[Tuple[int, int], int] = {}
+        self._service_time = {CMD_STATUS: 0.0, CMD_UNLOCK: pulse_gap}
+        self.timers = TimerScheduler(ip_address)
+        self._rtt = [metrics.GATEWAY_RTT.labels(ip_address, board) for board in range(board_count)]
+        self._retries = metrics.GATEWAY_RETRIES.labels(ip_address)
+        self._reconnects = metrics.GATEWAY_RECONNECTS.labels(ip_address)
+        self._queue_wait = {
+            CMD_STATUS: metrics.COMMAND_QUEUE_WAIT.labels(ip_address, "status"),
+            CMD_UNLOCK: metrics.COMMAND_QUEUE_WAIT.labels(ip_address, "unlock"),
+        }
+        self._rejected = {reason: metrics.COMMANDS_REJECTED.labels(ip_address, reason) for reason in ("full", "deadline", "expired", "cancelled")}
+        self._cache_hits = metrics.STATUS_CACHE.labels(ip_address, "hit")
+        self._cache_misses = metrics.STATUS_CACHE.labels(ip_address, "miss")
+        logger.info("DeviceC initialized for IP: {ip} with {boards} boards", ip=ip_address, boards=board_count)
 
     async def connect(self) -> None:
-        logger.info(f"Attempting to connect to device: {self.ip}")
-        self.reader, self.writer = await asyncio.open_connection(self.ip, self.port)
-        logger.info(f"Successfully connected to device: {self.ip}")
+        logger.info("Attempting to connect to device: {ip}", ip=self.ip)
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout=self.connect_timeout)
+        self.decoder.reset()
+        self.pending_frames.clear()
+        self.health.on_connected()
+        self._connected.set()
+        logger.info("Successfully connected to device: {ip}", ip=self.ip)
 
     async def disconnect(self) -> None:
         if self.writer:
-            logger.debug(f"Disconnecting from device: {self.ip}")
+            logger.debug("Disconnecting from device: {ip}", ip=self.ip)
             try:
                 self.writer.close()
                 await self.writer.wait_closed()
             except ConnectionResetError:
-                logger.warning(f"Connection to {self.ip} already closed.")
+                logger.warning("Connection to {ip} already closed.", ip=self.ip)
             finally:
                 self.reader = None
                 self.writer = None
+                self._connected.clear()
+                self.health.on_disconnected()
+
+    async def close(self) -> None:
+        for task in (self._supervisor, self._worker):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._supervisor = self._worker = None
+        await self.timers.close()
+        while not self.command_queue.empty():
+            self._settle(self.command_queue.get_nowait())
+        for command in self._parked:
+            self._settle(command)
+        self._parked.clear()
+        self._queued.clear()
+        await self.disconnect()
+
+    def start(self) -> None:
+        if self._supervisor is None or self._supervisor.done():
+            self._supervisor = background_task(self._supervise())
+
+    async def wait_connected(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _supervise(self) -> None:
+        attempt = 0
+        while True:
+            if self.writer is not None:
+                await self._lost.wait()
+                self._lost.clear()
+            elif await self._reconnect():
+                attempt = 0
+            else:
+                delay = self.health.backoff(attempt)
+                attempt += 1
+                logger.warning("Reconnect to {ip} failed ({error}), next attempt in {delay:.1f} seconds", ip=self.ip, error=self.health.last_error, delay=delay)
+                await asyncio.sleep(delay)
 
-    async def status_send(self, command: bytes, retries: int = 3) -> Optional[bytes]:
-        logger.debug(f"Sending status command to {self.ip}: {command.hex()}")
-        cached_response = self._get_cached_response(command)
+    @property
+    def attempted(self) -> bool:
+        return self._attempted.is_set()
+
+    async def wait_attempted(self) -> bool:
+        await self._attempted.wait()
+        return self.health.connected
+
+    async def _reconnect(self) -> bool:
+        try:
+            await self.connect()
+        except (OSError, asyncio.TimeoutError) as e:
+            self.health.on_disconnected(str(e) or type(e).__name__)
+            return False
+        finally:
+            self._attempted.set()
+        return True
+
+    def submit(self, payload: bytes, priority: int, retries: int = 3, timeout: Optional[float] = None) -> Command:
+        command = Command(priority=priority, seq=next(self._sequence), payload=payload, retries=retries)
+        if timeout is not None:
+            command.deadline = command.enqueued_at + timeout
+        self.admit(priority, command.cmd, 1, timeout)
+        self._ensure_worker()
+        self.command_queue.put_nowait(command)
+        key = (priority, command.cmd)
+        self._queued[key] = self._queued.get(key, 0) + 1
+        return command
+
+    def submit_nowait(self, payload: bytes, priority: int, retries: int = 3, timeout: Optional[float] = None) -> Optional[Command]:
+        try:
+            return self.submit(payload, priority, retries, timeout)
+        except GatewayBusy as e:
+            logger.warning("Dropping command {command} for {ip}: {detail}", command=payload.hex(), ip=self.ip, detail=e.detail)
+            return None
+
+    @property
+    def pending(self) -> int:
+        return self.command_queue.qsize() + len(self._parked)
+
+    def admit(self, priority: int, cmd: int, count: int = 1, timeout: Optional[float] = None) -> None:
+        if self.pending + count > self.command_queue.maxsize:
+            self._rejected["full"].inc(count)
+            raise GatewayBusy(self.ip, "full", f"Command queue of gateway {self.ip} is full", self.expected_wait(PRIORITY_POLL, cmd))
+        wait = self.expected_wait(priority, cmd) + (count - 1) * self.interval(cmd)
+        if timeout is not None and wait > timeout:
+            self._rejected["deadline"].inc(count)
+            raise GatewayBusy(self.ip, "deadline", f"Gateway {self.ip} is busy, expected wait {wait:.1f}s exceeds {timeout:.1f}s", wait - timeout)
+
+    def interval(self, cmd: int) -> float:
+        return max(self.pulse_gap, self._service_time[cmd]) if cmd == CMD_UNLOCK else self._service_time[cmd]
+
+    def expected_wait(self, priority: int, cmd: int) -> float:
+        if cmd != CMD_UNLOCK:
+            return sum(count * self._service_time[queued] for (ahead, queued), count in self._queued.items() if ahead <= priority)
+        unlocks = sum(count for (ahead, queued), count in self._queued.items() if ahead <= priority and queued == CMD_UNLOCK)
+        return max(0.0, self._unlock_delay()) + unlocks * self.interval(CMD_UNLOCK)
+
+    def _unlock_delay(self) -> float:
+        return self._next_unlock_at - time.perf_counter()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = background_task(self._run())
+
+    async def _run(self) -> None:
+        logger.debug("Command worker started for {ip}", ip=self.ip)
+        while True:
+            command = await self._next_command()
+            self._queued[command.priority, command.cmd] -= 1
+            token = current_trace.set(command.trace)
+            try:
+                await self._execute(command)
+            finally:
+                current_trace.reset(token)
+                self._settle(command)
+                self.command_queue.task_done()
+
+    async def _next_command(self) -> Command:
+        while True:
+            if self._parked and self._unlock_delay() <= 0:
+                return heapq.heappop(self._parked)
+            command = await self._receive()
+            if command is not None and not self._park(command):
+                return command
+
+    async def _receive(self) -> Optional[Command]:
+        if not self.command_queue.empty():
+            return self.command_queue.get_nowait()
+        if not self._parked:
+            return await self.command_queue.get()
+        getter = asyncio.ensure_future(self.command_queue.get())
+        await asyncio.wait({getter}, timeout=self._unlock_delay())
+        if getter.cancel():
+            return None
+        return getter.result()
+
+    def _park(self, command: Command) -> bool:
+        if command.cmd != CMD_UNLOCK or not (self._parked or self._unlock_delay() > 0):
+            return False
+        command.parked_at = time.perf_counter()
+        heapq.heappush(self._parked, command)
+        return True
+
+    def _drop_stale(self, command: Command) -> bool:
+        if command.future.done():
+            reason = "cancelled"
+        elif command.expired:
+            reason = "expired"
+        else:
+            return False
+        self._rejected[reason].inc()
+        logger.warning(
+            "Dropping {reason} command {command} for {ip} after {waited:.0f} ms in queue",
+            reason=reason,
+            command=command.payload.hex(),
+            ip=self.ip,
+            waited=command.queue_wait * 1000,
+        )
+        return True
+
+    def _settle(self, command: Command) -> None:
+        if not command.future.done():
+            command.future.set_result(False if command.cmd == CMD_UNLOCK else None)
+
+    async def _execute(self, command: Command) -> None:
+        dequeued_at = time.perf_counter()
+        record(command.trace, "queue", (command.parked_at or dequeued_at) - command.enqueued_at)
+        if command.parked_at:
+            record(command.trace, "gap", dequeued_at - command.parked_at)
+        if self._drop_stale(command):
+            return
+        command.started_at = time.perf_counter()
+        self._queue_wait[command.cmd].observe(command.queue_wait)
+        try:
+            result = await self._dispatch(command)
+        except Exception as e:  # noqa
+            logger.error("Command {command} failed for device {ip}: {error}", command=command.payload.hex(), ip=self.ip, error=str(e))
+            result = False if command.cmd == CMD_UNLOCK else e
+        command.finished_at = time.perf_counter()
+        self._service_time[command.cmd] += SERVICE_TIME_WEIGHT * (command.finished_at - dequeued_at - self._service_time[command.cmd])
+        logger.debug(
+            "Command {command} on {ip} waited {queue_wait_ms:.1f} ms, served in {service_ms:.1f} ms",
+            command=command.payload.hex(),
+            ip=self.ip,
+            queue_wait_ms=command.queue_wait * 1000,
+            service_ms=command.service_time * 1000,
+        )
+        self._resolve(command, result)
+
+    def _resolve(self, command: Command, result: Any) -> None:
+        if command.future.done():
+            return
+        if isinstance(result, Exception):
+            command.future.set_exception(result)
+        else:
+            command.future.set_result(result)
+
+    async def _dispatch(self, command: Command) -> Any:
+        if command.cmd != CMD_UNLOCK:
+            return await self._attempt_send_command(command.payload, command.retries)
+        try:
+            return await self._attempt_command(command.payload, command.retries)
+        finally:
+            self._next_unlock_at = time.perf_counter() + self.pulse_gap
+
+    async def status_send(self, command: bytes, retries: int = 3, use_cache: bool = True, priority: int = PRIORITY_STATUS) -> Optional[bytes]:
+        logger.debug("Sending status command to {ip}: {command}", ip=self.ip, command=command.hex())
+        cached_response = self._get_cached_response(command) if use_cache else None
         if cached_response:
             return cached_response
 
-        return await self._attempt_send_command(command, retries)
+        queued = self.submit(command, priority=priority, retries=retries, timeout=None if priority == PRIORITY_POLL else self.deadline)
+        return await queued.future
 
     def _get_cached_response(self, command: bytes) -> Optional[bytes]:
         if command in self.cache:
             cache_entry = self.cache[command]
             if datetime.now() - cache_entry["timestamp"] < timedelta(seconds=5):
                 logger.debug("Using cached response")
+                self._cache_hits.inc()
                 return cache_entry["response"]
+        self._cache_misses.inc()
         return None
 
     async def _attempt_send_command(self, command: bytes, retries: int) -> Optional[bytes]:
-        logger.debug(f"Attempting to send command to {self.ip}: {command.hex()}")
-        async with self.semaphore:
-            for attempt in range(retries):
-                try:
-                    await self._write_command(command)
-                    response = await self._read_response()
-                    if response is not None:
-                        logger.debug(f"Received response from {self.ip}: {response.hex()}")
-                        self._cache_response(command, response)
-                    return response
-                except (ConnectionResetError, asyncio.IncompleteReadError) as e:
-                    logger.warning(f"Attempt {attempt + 1}/{retries} failed for device {self.ip}: {str(e)}. Retrying...")
-                    await self._handle_connect_error()
-                except Exception as e:  # noqa
-                    logger.error(f"Unhandled exception for device {self.ip}: {str(e)}")
-                    break
-            logger.warning(f"No response received from {self.ip} after {retries} attempts")
+        logger.debug("Attempting to send command to {ip}: {command}", ip=self.ip, command=command.hex())
+        for attempt in range(retries):
+            if not self.health.allow():
+                logger.debug("Gateway {ip} is {state}, skipping command {command}", ip=self.ip, state=self.health.state, command=command.hex())
+                return None
+            try:
+                return await self._exchange(command)
+            except (ConnectionResetError, asyncio.IncompleteReadError) as e:
+                logger.warning(
+                    "Attempt {attempt}/{retries} failed for device {ip}: {error}. Retrying...", attempt=attempt + 1, retries=retries, ip=self.ip, error=str(e)
+                )
+                self._retries.inc()
+                await self._handle_connect_error()
+            except Exception as e:  # noqa
+                logger.error("Unhandled exception for device {ip}: {error}", ip=self.ip, error=str(e))
+                break
+        logger.warning("No response received from {ip} after {retries} attempts", ip=self.ip, retries=retries)
+        return None
+
+    async def _exchange(self, command: bytes) -> Optional[bytes]:
+        self._discard_stale_frames()
+        boards = command[1 :: REQUEST_LENGTHS[CMD_STATUS]]
+        started = time.perf_counter()
+        await self._write_command(command)
+        with span("read"):
+            responses = await self._read_responses(boards, started)
+        for board in boards:
+            if board not in responses:
+                logger.warning("Timed out waiting for board {board} reply from {ip}", board=board, ip=self.ip)
+        if not responses:
+            self.health.on_failure(f"no reply from board {', '.join(str(board) for board in boards)}")
             return None
+        self.health.on_success()
+        for board, response in responses.items():
+            logger.debug("Received response from {ip}: {response}", ip=self.ip, response=response.hex())
+            self._cache_response(self._build_status_command(board), response)
+        return b"".join(responses.values())
+
+    def _observe_rtt(self, board: int, duration: float) -> None:
+        if board < len(self._rtt):
+            self._rtt[board].observe(duration)
 
     def _cache_response(self, command: bytes, response: bytes) -> None:
         self.cache[command] = {"response": response, "timestamp": datetime.now()}
 
-    async def unlock_send(self, board: int, lock: int, retries: int = 3) -> None:
+    async def unlock_send(self, board: int, lock: int, retries: int = 3, timeout: Optional[float] = None) -> Command:
         command = self._build_unlock_command(board, lock)
-        logger.info(f"Queueing unlock command for {self.ip}, board {board}, lock {lock}: {command.hex()}")
-        async with self.queue_lock:
-            self.command_queue.append((command, retries))
-        asyncio.create_task(self._process_command_queue())
+        logger.info("Queueing unlock command for {ip}, board {board}, lock {lock}: {command}", ip=self.ip, board=board, lock=lock, command=command.hex())
+        return self.submit(command, priority=PRIORITY_UNLOCK, retries=retries, timeout=timeout or self.deadline)
+
+    async def unlock_batch(self, targets: List[Tuple[int, int]], retries: int = 3) -> List[bool]:
+        logger.info("Sending {commands} unlock commands to {ip} with {gap}s gap", commands=len(targets), ip=self.ip, gap=self.pulse_gap)
+        interval = self.interval(CMD_UNLOCK)
+        self.admit(PRIORITY_UNLOCK, CMD_UNLOCK, len(targets), self.deadline + interval * (len(targets) - 1))
+        commands = [await self.unlock_send(board, lock, retries, self.deadline + interval * index) for index, (board, lock) in enumerate(targets)]
+        return list(await asyncio.gather(*(command.future for command in commands)))
 
     def _build_unlock_command(self, board: int, lock: int) -> bytes:
-        stx = 0x02
-        etx = 0x03
-        cmd = 0x51
-        lock -= 1
-        sum_value = (stx + board + lock + cmd + etx) & 0xFF
-        return bytes([stx, board, lock, cmd, etx, sum_value])
-
-    async def _process_command_queue(self) -> None:
-        logger.debug(f"Processing command queue for {self.ip}")
-        async with self.queue_lock:
-            while self.command_queue:
-                command, retries = self.command_queue.popleft()
-                await self._attempt_command(command, retries)
-                await asyncio.sleep(0.5)
-
-    async def _attempt_command(self, command: bytes, retries: int) -> None:
+        return encode_unlock(board, lock)
+
+    async def _attempt_command(self, command: bytes, retries: int) -> bool:
         for attempt in range(retries):
+            if not self.health.allow():
+                logger.error("Gateway {ip} is {state}, command {command} not sent", ip=self.ip, state=self.health.state, command=command.hex())
+                return False
             try:
                 await self._write_command(command)
-                logger.info(f"Command sent successfully to device {self.ip}")
-                break
+                logger.info("Command sent successfully to device {ip}", ip=self.ip)
+                return self.writer is not None
             except (ConnectionResetError, asyncio.IncompleteReadError) as e:
-                logger.warning(f"Attempt {attempt + 1}/{retries} failed for device {self.ip}: {str(e)}. Retrying...")
+                logger.warning(
+                    "Attempt {attempt}/{retries} failed for device {ip}: {error}. Retrying...", attempt=attempt + 1, retries=retries, ip=self.ip, error=str(e)
+                )
+                self._retries.inc()
                 await self._handle_connect_error()
             except Exception as e:  # noqa
-                logger.error(f"Unhandled exception for device {self.ip}: {str(e)}")
+                logger.error("Unhandled exception for device {ip}: {error}", ip=self.ip, error=str(e))
+                self._retries.inc()
                 await self._handle_connect_error()
+        return False
 
     async def _write_command(self, command: bytes) -> None:
-        logger.debug(f"Writing command to device {self.ip}")
+        logger.debug("Writing command to device {ip}", ip=self.ip)
         if self.writer:
-            self.writer.write(command)
-            await self.writer.drain()
+            with span("write"):
+                self.writer.write(command)
+                await self.writer.drain()
         else:
             logger.error("Writer is not initialized")
 
-    async def _read_response(self) -> Optional[bytes]:
+    async def _read_responses(self, boards: bytes, started: float) -> Dict[int, bytes]:
+        responses: Dict[int, bytes] = {}
         if not self.reader:
             logger.error("Reader is not initialized")
-            return None
+            return responses
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while True:
+            self._take_frames(boards, responses, started)
+            if len(responses) == len(boards):
+                return responses
+            if not await self._receive_frames(self.reader, deadline - loop.time()):
+                return responses
+
+    async def _receive_frames(self, reader: asyncio.StreamReader, timeout: float) -> bool:
+        if timeout <= 0:
+            return False
+        try:
+            data = await asyncio.wait_for(reader.read(256), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        if not data:
+            raise asyncio.IncompleteReadError(b"", None)
+        self.pending_frames.extend(self.decoder.feed(data))
+        return True
+
+    def _take_frames(self, boards: bytes, responses: Dict[int, bytes], started: float) -> None:
+        while self.pending_frames:
+            frame = self.pending_frames.popleft()
+            if frame.cmd == CMD_STATUS and frame.board in boards and frame.board not in responses:
+                responses[frame.board] = frame.raw
+                self._observe_rtt(frame.board, time.perf_counter() - started)
+            else:
+                logger.debug("Dropping unexpected frame from {ip}: {frame}", ip=self.ip, frame=frame.raw.hex())
 
-        full_response = bytearray()
-        expected_length = 12
-        with contextlib.suppress(asyncio.TimeoutError):
-            while len(full_response) < expected_length:
-                response = await self._read_partial_response(expected_length - len(full_response))
-                if response:
-                    full_response.extend(response)
-                else:
-                    break
-        return bytes(full_response)
+    def _discard_stale_frames(self) -> None:
+        if self.pending_frames:
+            logger.debug("Discarding {frames} stale frames from {ip}", frames=len(self.pending_frames), ip=self.ip)
+            self.pending_frames.clear()
 
     async def _handle_connect_error(self) -> None:
-        await self.disconnect()
-        await asyncio.sleep(self.retry_delay)
-        await self.connect()
+        self._reconnects.inc()
+        with span("reconnect"):
+            await self.disconnect()
+            self.start()
+            self._lost.set()
+            await self.wait_connected(self.connect_timeout)
 
-    async def _read_partial_response(self, length: int) -> Optional[bytes]:
-        if not self.reader:
-            logger.error("Reader is not initialized")
-            return None
+    async def get_status(self, use_cache: bool = True, priority: int = PRIORITY_STATUS) -> dict:
+        masks = await self.get_masks(use_cache=use_cache, priority=priority)
+        return {board: mask_to_status(mask) for board, mask in masks.items()}
+
+    async def get_masks(self, use_cache: bool = True, priority: int = PRIORITY_STATUS) -> Dict[int, int]:
+        if not self.health.allow():
+            logger.debug("Gateway {ip} is {state}, skipping status sweep", ip=self.ip, state=self.health.state)
+            return {}
+        logger.debug("Getting status for all boards on {ip}", ip=self.ip)
+        masks = await self.read_boards(range(self.board_count), use_cache=use_cache, priority=priority)
+        lazy_logger.debug("Status masks retrieved for {ip}: {masks}", ip=self._lazy_ip, masks=lambda: {board: f"{mask:012x}" for board, mask in masks.items()})
+        return masks
+
+    async def read_board(self, board: int, use_cache: bool = True, priority: int = PRIORITY_STATUS) -> Optional[int]:
         try:
-            response = await asyncio.wait_for(self.reader.read(length), timeout=self.timeout)
-            return response if response else None
-        except asyncio.TimeoutError:
+            response = await self.status_send(self._build_status_command(board), use_cache=use_cache, priority=priority)
+        except GatewayBusy as e:
+            logger.warning("Status of board {board} on {ip} not read: {detail}", board=board, ip=self.ip, detail=e.detail)
             return None
+        mask = self.parse_mask(response) if response is not None else None
+        if mask is None and self.health.connected:
+            logger.error("Failed to get status for board {board} on {ip}", board=board, ip=self.ip)
+        return mask
 
-    async def get_status(self) -> dict:
-        logger.info(f"Getting status for all boards on {self.ip}")
-        combined_status = {}
-        for board in range(self.board_count):
-            command = self._build_status_command(board)
-            responses = await self.status_send(command)
-            if responses is None:
-                logger.error(f"Failed to get status for board {board} on {self.ip}")
-                continue
-            module_responses = [responses[i : i + 12] for i in range(0, len(responses), 12)]
-            logger.debug(f"Module responses from ip {self.ip} board {board}: {module_responses}")
-            for module_response in module_responses:
-                module_status = await self.parse_status(module_response)
-                combined_status[board] = module_status
-        logger.info(f"Status retrieved for {self.ip}: {combined_status}")
-        return combined_status
+    async def read_boards(self, boards: Iterable[int], use_cache: bool = True, priority: int = PRIORITY_STATUS) -> Dict[int, int]:
+        if not self.pipeline:
+            masks = {board: await self.read_board(board, use_cache=use_cache, priority=priority) for board in boards}
+            return {board: mask for board, mask in masks.items() if mask is not None}
+        responses = {board: self._get_cached_response(self._build_status_command(board)) if use_cache else None for board in boards}
+        pending = [board for board, response in responses.items() if response is None]
+        if pending:
+            responses.update(await self._sweep(pending, priority))
+        masks = {board: self.parse_mask(response) for board, response in responses.items() if response is not None}
+        return {board: mask for board, mask in masks.items() if mask is not None}
+
+    async def _sweep(self, boards: List[int], priority: int) -> Dict[int, bytes]:
+        command = b"".join(self._build_status_command(board) for board in boards)
+        try:
+            response = await self.status_send(command, use_cache=False, priority=priority)
+        except GatewayBusy as e:
+            logger.warning("Status sweep of {boards} boards on {ip} not sent: {detail}", boards=len(boards), ip=self.ip, detail=e.detail)
+            return {}
+        return {frame.board: frame.raw for frame in FrameDecoder().feed(response or b"")}
+
+    async def confirm_open(self, board: int, lock: int) -> Optional[bool]:
+        mask = await self.read_board(board, use_cache=False, priority=PRIORITY_UNLOCK)
+        if mask is None:
+            logger.warning("Could not confirm lock {lock} on board {board} of device {ip}", lock=lock, board=board, ip=self.ip)
+            return None
+        return not mask >> (lock - 1) & 1
 
     def _build_status_command(self, board: int) -> bytes:
-        stx = 0x02
-        etx = 0x03
-        cmd = 0x50
-        sum_value = (stx + board + cmd + etx) & 0xFF
-        return bytes([stx, board, 0x00, cmd, etx, sum_value])
+        return encode_status(board)
 
-    async def parse_status(self, response: bytes) -> dict:
-        if not response or len(response) != 12:
+    def parse_mask(self, response: bytes) -> Optional[int]:
+        frame = decode_frame(response)
+        if frame is None or frame.cmd != CMD_STATUS:
             logger.error("Invalid response")
-            return {}
-        logger.debug(f"Pre parsed status for {self.ip}: {response.hex()}")
-        statuses = response[4:10]
-        module_status = {}
-
-        for i in range(48):
-            byte_index = i // 8
-            bit_index = i % 8
-            lock_status = bool(statuses[byte_index] & (1 << bit_index))
-            module_status[i + 1] = {"lock": lock_status}
-        logger.debug(f"Module parsed status for {self.ip}: {module_status}")
+            return None
+        return frame.mask
 
-        return module_status
+    async def parse_status(self, response: bytes) -> dict:
+        mask = self.parse_mask(response)
+        return {} if mask is None else mask_to_status(mask)
 
 
 class DeviceManager:
     def __init__(self) -> None:
         self.devices: Dict[str, DeviceC] = {}
         self.lock_lookup: Dict[str, Tuple[str, int, int]] = {}
+        self.config: Dict[str, Dict[str, Any]] = {}
+        self.layouts: Dict[str, GatewayLayout] = {}
+        self.owns: Callable[[str], bool] = lambda ip: True
+        self.config_gateways: List[str] = []
+        self.lock_gateways: Dict[str, str] = {}
+        self._payload: Optional[StatusPayload] = None
+        self._payload_key: Tuple[Tuple[str, Optional[float], bool, bool], ...] = ()
+        self.jobs: OrderedDict[str, dict] = OrderedDict()
+        self._job_tasks: Set[asyncio.Task] = set()
+        self.holds: Dict[str, Hold] = {}
+        self.hold_locks: Dict[str, str] = {}
+        self._init_task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self.poller = StatusPoller(self.devices, interval=STATUS_POLL_INTERVAL, max_age=STATUS_MAX_AGE, priority=PRIORITY_POLL)
+        self.feed = StatusFeed(history=STATUS_FEED_HISTORY)
+        self.poller.listeners.append(self._publish_changes)
+        self.journal = Journal(JOURNAL_DB, batch_size=JOURNAL_BATCH_SIZE, flush_interval=JOURNAL_FLUSH_INTERVAL, max_pending=JOURNAL_MAX_PENDING)
+        self.feed.listeners.append(self._journal_changes)
+        self.checkpoint = Checkpoint(CHECKPOINT_FILE, CHECKPOINT_INTERVAL)
+        self._restored: Dict[str, Any] = {}
+        self._last_known: Dict[str, Dict[str, Any]] = {}
+        metrics.collectors.append(self._collect_metrics)
+        self._payload_hits = metrics.STATUS_PAYLOAD_CACHE.labels("hit")
+        self._payload_misses = metrics.STATUS_PAYLOAD_CACHE.labels("miss")
 
-    async def connect_device(self, ip: str, details: Dict[str, Any]) -> None:
-        board_count = details["boards"]
-        dev = DeviceC(ip_address=ip, board_count=board_count)
-        await dev.connect()
+    def add_device(self, ip: str, details: Dict[str, Any]) -> DeviceC:
+        dev = DeviceC(
+            ip_address=ip,
+            board_count=details["boards"],
+            host=details.get("host"),
+            port=details.get("port", 23),
+            pulse_gap=details.get("pulse_gap_ms", PULSE_GAP_MS) / 1000,
+            pipeline=details.get("pipeline", STATUS_PIPELINE),
+        )
         self.devices[ip] = dev
+        self._warm_start(ip, dev)
+        dev.start()
+        return dev
 
-        for lock in details["locks"]:
-            self.lock_lookup[lock["id"]] = (ip, lock["board"], lock["lock"])
+    def _warm_start(self, ip: str, device: DeviceC) -> None:
+        saved = self._restored.pop(ip, None)
+        if not saved:
+            return
+        try:
+            boards = {int(board): int(mask) for board, mask in saved["boards"].items() if int(board) < device.board_count}
+            device.health.last_success = saved["health"]["last_success"]
+            device.health.last_error = saved["health"]["last_error"]
+            if boards:
+                self.poller.restore(ip, boards, float(saved["updated_at"]))
+                self._last_known[ip] = {"boards": boards, "updated_at": float(saved["updated_at"])}
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning("Ignoring checkpoint of gateway {ip}: {error}", ip=ip, error=str(e))
 
-        logger.info(f"Device {ip} initialized successfully")
+    def _checkpoint_state(self) -> Dict[str, Any]:
+        for ip, device in self.devices.items():
+            snapshot = self.poller.snapshots.get(ip)
+            entry = self._last_known.setdefault(ip, {"boards": {}, "updated_at": None})
+            if snapshot is not None and snapshot.boards:
+                entry.update(boards=snapshot.boards, updated_at=snapshot.updated_at)
+            entry["health"] = {"last_success": device.health.last_success, "last_error": device.health.last_error}
+        return {ip: self._last_known[ip] for ip in self.devices}
 
-    async def initialize_single_device(self, ip: str, details: Dict[str, Any]) -> bool:
-        if ip in self.devices:
-            return True
+    async def apply_config(self, config: Dict[str, Any]) -> Dict[str, List[str]]:
+        layouts = build_layouts(config)
+        self.config_gateways = list(config)
+        self.lock_gateways = {lock_id: ip for ip, layout in layouts.items() for lock_id, _, _ in layout.entries}
+        config = {ip: details for ip, details in config.items() if self.owns(ip)}
+        layouts = {ip: layouts[ip] for ip in config}
+        changes = diff_config(self.config, config)
+        dropped = changes["removed"] + changes["replaced"]
+        self._drop_holds(dropped)
+        stale = [self.devices.pop(ip) for ip in dropped if ip in self.devices]
+        for ip in dropped:
+            self.poller.forget(ip)
+        self.config = dict(config)
+        self.layouts = layouts
+        self.lock_lookup = {lock_id: target for layout in layouts.values() for lock_id, target in layout.lookup().items()}
+        for ip in changes["added"] + changes["replaced"]:
+            self.add_device(ip, config[ip])
+        for ip in changes["updated"]:
+            self.devices[ip].pulse_gap = config[ip].get("pulse_gap_ms", PULSE_GAP_MS) / 1000
+            self.devices[ip].pipeline = config[ip].get("pipeline", STATUS_PIPELINE)
+        if any(changes.values()):
+            self._payload = None
+            self.poller.version += 1
+            self.feed.reset(self.poller.version)
+        await asyncio.gather(*(device.close() for device in stale))
+        return changes
 
+    async def reload_config(self) -> Dict[str, List[str]]:
         try:
-            await self.connect_device(ip, details)
-            return True
-        except Exception as e:  # noqa
-            logger.error(f"Failed to initialize device {ip}: {str(e)}")
+            config = read_config_json()
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Failed to read {DEFAULT_CONFIG_FILENAME}: {str(e)}")
+        if not isinstance(config, dict):
+            raise ValueError(f"{DEFAULT_CONFIG_FILENAME} must map gateway IPs to their settings, got {type(config).__name__}")
+        changes = await self.apply_config(config)
+        logger.info("Configuration reloaded: {changes}", changes=changes)
+        return changes
+
+    async def _watch_config(self) -> None:
+        stamp = config_stamp()
+        while True:
+            await asyncio.sleep(CONFIG_WATCH_INTERVAL)
+            current = config_stamp()
+            if current == stamp:
+                continue
+            stamp = current
+            try:
+                await self.reload_config()
+            except Exception as e:  # noqa
+                logger.error("Configuration reload failed, keeping the previous layout: {error}", error=str(e) or type(e).__name__)
+
+    async def initialize_single_device(self, ip: str) -> bool:
+        device = self.devices.get(ip)
+        if device is None:
+            logger.error("Device {ip} is no longer configured", ip=ip)
             return False
+        if await device.wait_attempted():
+            logger.info("Device {ip} initialized successfully", ip=ip)
+            return True
+        logger.error("Failed to initialize device {ip}: {error}, reconnecting in background", ip=ip, error=device.health.last_error)
+        return False
 
     async def initialize_devices(self, config: Dict[str, Any]) -> bool:
-        tasks = [self.initialize_single_device(ip, details) for ip, details in config.items()]
-        results = await asyncio.gather(*tasks)
+        await self.apply_config(config)
+        results = await asyncio.gather(*(self.initialize_single_device(ip) for ip in list(self.devices)))
         return all(results)
 
     async def initialize_devices_background(self, config: Dict[str, Any]) -> None:
-        while True:
-            all_initialized = await self.initialize_devices(config)
+        if await self.initialize_devices(config):
+            logger.info("All devices initialized successfully")
+        offline = [ip for ip, device in self.devices.items() if not device.health.connected]
+        logger.info("Devices initialized: {connected} connected, offline: {offline}", connected=len(self.devices) - len(offline), offline=offline)
 
-            if all_initialized:
-                logger.info("All devices initialized successfully")
-                break
+    def get_devices(self) -> Dict[str, DeviceC]:
+        return self.devices
 
-            await asyncio.sleep(10)
+    def start(self, config: Dict[str, Any]) -> None:
+        self._restored = self.checkpoint.load()
+        self._init_task = asyncio.create_task(self.initialize_devices_background(config))
+        if CONFIG_WATCH_INTERVAL > 0:
+            self._watch_task = asyncio.create_task(self._watch_config())
+        self.journal.start()
+        self.poller.start()
+        self.checkpoint.start(self._checkpoint_state)
 
-        logger.info(f"Devices initialized: {self.devices}")
+    async def stop(self) -> None:
+        if self._watch_task:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        await self.poller.stop()
+        await self.checkpoint.stop()
+        for device in self.devices.values():
+            await device.close()
+        await self.journal.stop()
 
-    def get_devices(self) -> Dict[str, DeviceC]:
-        return self.devices
+    async def pulse_lock(self, lock_id: str, confirm: bool = False, user: Optional[str] = None, time_ms: Optional[int] = None) -> dict:
+        try:
+            with span("pulse"):
+                result = await self._pulse_lock(lock_id, confirm)
+        except GatewayBusy as e:
+            logger.warning("Locker # {lock_id} not opened: {detail}", lock_id=lock_id, detail=e.detail)
+            self.journal.record("pulse", lock_id, e.ip, user, "rejected", {"message": e.detail, "time_ms": time_ms})
+            raise
+        outcome = pulse_outcome(result)
+        target = self.lock_lookup.get(lock_id)
+        if time_ms and time_ms > HOLD_REPULSE_INTERVAL_MS and target and outcome in ("sent", "confirmed"):
+            result.update(self._try_hold(lock_id, target, time_ms, user))
+        details = {
+            "message": result.get("message") or result.get("error"),
+            "timings": result.get("timings"),
+            "time_ms": time_ms,
+            "hold_error": result.get("hold_error"),
+        }
+        self.journal.record("pulse", lock_id, target[0] if target else None, user, outcome, {k: v for k, v in details.items() if v})
+        return result
+
+    def _try_hold(self, lock_id: str, target: Tuple[str, int, int], time_ms: int, user: Optional[str]) -> Dict[str, Any]:
+        ip = target[0]
+        device = self.devices.get(ip)
+        if device is None:
+            return {"hold_error": f"Gateway {ip} is no longer configured"}
+        holds = sum(1 for hold in self.holds.values() if hold.gateway == ip and hold.lock_id != lock_id)
+        cost = device.interval(CMD_UNLOCK)
+        if (holds + 1) * cost > HOLD_REPULSE_INTERVAL_MS / 1000:
+            detail = f"Gateway {ip} cannot repulse {holds + 1} held lockers every {HOLD_REPULSE_INTERVAL_MS} ms at {cost * 1000:.0f} ms per pulse"
+            logger.warning("Locker # {lock_id} opened without a hold: {detail}", lock_id=lock_id, detail=detail)
+            return {"hold_error": detail}
+        return {"hold": self._start_hold(lock_id, target, time_ms, user)}
+
+    def _start_hold(self, lock_id: str, target: Tuple[str, int, int], time_ms: int, user: Optional[str]) -> dict:
+        previous = self.holds.get(self.hold_locks.get(lock_id, ""))
+        if previous is not None:
+            self._end_hold(previous, "replaced", user)
+        time_ms = min(time_ms, HOLD_MAX_MS)
+        ip, board, lock_number = target
+        hold = Hold(uuid.uuid4().hex, lock_id, ip, board, lock_number, user, time_ms, time.time(), time.monotonic() + time_ms / 1000)
+        self.holds[hold.id] = hold
+        self.hold_locks[lock_id] = hold.id
+        self._schedule_hold(hold)
+        logger.info("Holding locker # {lock_id} open for {time_ms} ms on device {ip}", lock_id=lock_id, time_ms=time_ms, ip=ip)
+        return hold.as_dict()
+
+    def _schedule_hold(self, hold: Hold) -> None:
+        timers = self.devices[hold.gateway].timers
+        next_pulse = time.monotonic() + HOLD_REPULSE_INTERVAL_MS / 1000
+        if next_pulse < hold.until:
+            hold.timer = timers.call_at(next_pulse, lambda: self._repulse_hold(hold))
+        else:
+            hold.timer = timers.call_at(hold.until, lambda: self._end_hold(hold, "done"))
+
+    def _repulse_hold(self, hold: Hold) -> None:
+        device = self.devices[hold.gateway]
+        if hold.command is not None and not hold.command.future.done():
+            hold.missed += 1
+            logger.warning(
+                "Hold pulse for locker # {lock_id} is still queued on {ip}, {missed} pulses missed", lock_id=hold.lock_id, ip=hold.gateway, missed=hold.missed
+            )
+        else:
+            hold.missed += pulse_missed(hold.command)
+            hold.command = device.submit_nowait(encode_unlock(hold.board, hold.lock), priority=PRIORITY_HOLD, timeout=HOLD_REPULSE_INTERVAL_MS / 1000)
+            hold.pulses += hold.command is not None
+            hold.missed += hold.command is None
+        self._schedule_hold(hold)
 
-    async def pulse_lock(self, lock_id: str) -> dict:
-        logger.info(f"Attempting to pulse lock: {lock_id}")
+    def _end_hold(self, hold: Hold, status: str, user: Optional[str] = None) -> dict:
+        device = self.devices.get(hold.gateway)
+        if device is not None and hold.timer is not None:
+            device.timers.cancel(hold.timer)
+        hold.status = status
+        self.holds.pop(hold.id, None)
+        if self.hold_locks.get(hold.lock_id) == hold.id:
+            del self.hold_locks[hold.lock_id]
+        logger.info(
+            "Hold of locker # {lock_id} {status} after {pulses} pulses, {missed} missed",
+            lock_id=hold.lock_id,
+            status=status,
+            pulses=hold.pulses,
+            missed=hold.missed,
+        )
+        details = {"hold_id": hold.id, "time_ms": hold.time_ms, "pulses": hold.pulses, "missed": hold.missed}
+        self.journal.record("hold", hold.lock_id, hold.gateway, user or hold.user, status, details)
+        return hold.as_dict()
+
+    def _drop_holds(self, gateways: List[str]) -> None:
+        for hold in [hold for hold in self.holds.values() if hold.gateway in gateways]:
+            self._end_hold(hold, "cancelled")
+
+    async def list_holds(self) -> dict:
+        return {"holds": [hold.as_dict() for hold in self.holds.values()], "timers": {ip: len(device.timers) for ip, device in self.devices.items()}}
+
+    async def cancel_hold(self, hold_id: str, user: Optional[str] = None) -> Optional[dict]:
+        hold = self.holds.get(hold_id)
+        if hold is None:
+            return None
+        return self._end_hold(hold, "cancelled", user)
+
+    async def _pulse_lock(self, lock_id: str, confirm: bool) -> dict:
+        logger.info("Attempting to pulse lock: {lock_id}", lock_id=lock_id)
         if lock_id in self.lock_lookup:
             ip, board, lock_number = self.lock_lookup[lock_id]
             device = self.devices[ip]
-            logger.info(f"Unlocking locker # {lock_number} on board {board} of device {ip}")
-            await device.unlock_send(board, lock_number)
-            logger.info(f"Locker # {lock_id} opened on board {board} of device {ip}")
+            if not device.health.allow():
+                logger.error("Gateway {ip} is {state}, locker # {lock_id} not opened", ip=ip, state=device.health.state, lock_id=lock_id)
+                return {"message": f"Locker # {lock_id} gateway is offline", "confirmed": False}
+            logger.info("Unlocking locker # {lock} on board {board} of device {ip}", lock=lock_number, board=board, ip=ip)
+            command = await device.unlock_send(board, lock_number)
+            if confirm:
+                return await self._confirm_pulse(lock_id, device, command, board, lock_number)
+            if not await command.future:
+                logger.error("Locker # {lock_id} unlock command was not written to device {ip}", lock_id=lock_id, ip=ip)
+                return {"message": f"Locker # {lock_id} failed to open", "confirmed": False}
+            logger.info("Locker # {lock_id} opened on board {board} of device {ip}", lock_id=lock_id, board=board, ip=ip)
             return {"message": f"Locker # {lock_id} opened successfully"}
 
-        logger.error(f"Lock ID not found in lookup: {lock_id}")
+        logger.error("Lock ID not found in lookup: {lock_id}", lock_id=lock_id)
         return {"error": f"Locker # {lock_id} not found"}
 
-    async def relaystatus(self) -> dict:
-        logger.info("Starting relaystatus request")
-        start_time = time.time()
-        status_result: dict = {"id": {}}
+    async def _confirm_pulse(self, lock_id: str, device: DeviceC, command: Command, board: int, lock_number: int) -> dict:
+        sent = await command.future
+        timings = {"queue_wait_ms": round(command.queue_wait * 1000, 1), "write_ms": round(command.service_time * 1000, 1), "confirm_ms": 0.0}
+        if not sent:
+            logger.error("Locker # {lock_id} unlock command was not written to device {ip}", lock_id=lock_id, ip=device.ip)
+            return {"message": f"Locker # {lock_id} failed to open", "confirmed": False, "timings": timings}
+
+        started = time.perf_counter()
+        await asyncio.sleep(PULSE_CONFIRM_DELAY_MS / 1000)
+        opened = await device.confirm_open(board, lock_number)
+        timings["confirm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if opened:
+            message = f"Locker # {lock_id} opened successfully"
+        elif opened is None:
+            message = f"Locker # {lock_id} opening could not be confirmed"
+        else:
+            message = f"Locker # {lock_id} is still closed"
+        logger.info("{result} on board {board} of device {ip}, timings: {timings}", result=message, board=board, ip=device.ip, timings=timings)
+        return {"message": message, "confirmed": bool(opened), "timings": timings}
 
-        tasks = [device.get_status() for device in self.devices.values()]
-        all_statuses = await asyncio.gather(*tasks)
+    async def start_pulse_job(self, lock_id: str, user: Optional[str] = None, time_ms: Optional[int] = None) -> dict:
+        job: Dict[str, Any] = {"id": uuid.uuid4().hex, "lock_id": lock_id, "status": "pending", "created_at": time.time(), "result": None}
+        self.jobs[job["id"]] = job
+        while len(self.jobs) > PULSE_JOBS_LIMIT:
+            self.jobs.popitem(last=False)
+        task = asyncio.create_task(self._run_pulse_job(job, user, time_ms))
+        self._job_tasks.add(task)
+        task.add_done_callback(self._job_tasks.discard)
+        return job
 
-        for ip, gateway_status in zip(self.devices.keys(), all_statuses):
-            for lock in CONFIG[ip]["locks"]:
-                board = lock["board"]
-                lock_number = lock["lock"]
-                status = gateway_status.get(board, {}).get(lock_number, {}).get("lock", False)
-                status_result["id"][lock["id"]] = {"status": status}
+    async def _run_pulse_job(self, job: dict, user: Optional[str], time_ms: Optional[int]) -> None:
+        try:
+            result = await self.pulse_lock(job["lock_id"], confirm=True, user=user, time_ms=time_ms)
+        except Exception as e:  # noqa
+            logger.error("Pulse job {job} failed: {error}", job=job["id"], error=str(e))
+            job.update(status="failed", result={"message": str(e), "confirmed": False})
+            return
+        job.update(status="done" if result.get("confirmed") else "failed", result=result if "message" in result else {"message": result["error"]})
+
+    async def get_pulse_job(self, job_id: str) -> Optional[dict]:
+        return self.jobs.get(job_id)
+
+    async def history(
+        self,
+        lock_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        before_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        return await self.journal.query(lock_id=lock_id, kind=kind, start=start, end=end, before_id=before_id, cursor=cursor, limit=limit)
+
+    async def device_metrics(self) -> str:
+        return metrics.render_metrics(metric for metric in metrics.registry if metric is not metrics.HTTP_REQUEST_DURATION)
+
+    async def profile(self, seconds: float, interval_ms: float) -> str:
+        return await profile(seconds, interval_ms)
+
+    async def gateway_health(self) -> Dict[str, dict]:
+        return {ip: device.health.as_dict() for ip, device in self.devices.items()}
+
+    async def pulse_batch(self, lock_ids: List[str], user: Optional[str] = None) -> dict:
+        logger.info("Attempting to pulse {locks} locks", locks=len(lock_ids))
+        results: Dict[str, dict] = {}
+        targets: Dict[str, List[Tuple[str, int, int]]] = {}
+        for lock_id in dict.fromkeys(lock_ids):
+            if lock_id not in self.lock_lookup:
+                logger.error("Lock ID not found in lookup: {lock_id}", lock_id=lock_id)
+                results[lock_id] = {"ok": False, "message": f"Locker # {lock_id} not found"}
+                continue
+            ip, board, lock_number = self.lock_lookup[lock_id]
+            targets.setdefault(ip, []).append((lock_id, board, lock_number))
+
+        outcomes = await asyncio.gather(*(self._pulse_gateway(ip, locks) for ip, locks in targets.items()))
+        for outcome in outcomes:
+            results.update(outcome)
+        for lock_id, result in results.items():
+            target = self.lock_lookup.get(lock_id)
+            self.journal.record("pulse", lock_id, target[0] if target else None, user, pulse_outcome(result), {"message": result["message"], "batch": True})
+        return {"results": {lock_id: results[lock_id] for lock_id in dict.fromkeys(lock_ids)}}
+
+    async def _pulse_gateway(self, ip: str, locks: List[Tuple[str, int, int]]) -> Dict[str, dict]:
+        locks = sorted(locks, key=lambda item: item[1])
+        device = self.devices.get(ip)
+        if device is None:
+            return {lock_id: {"ok": False, "message": f"Locker # {lock_id} not found"} for lock_id, _, _ in locks}
+        try:
+            sent = await device.unlock_batch([(board, lock_number) for _, board, lock_number in locks])
+        except GatewayBusy as e:
+            logger.warning("{locks} lockers not opened: {detail}", locks=len(locks), detail=e.detail)
+            return {lock_id: {"ok": False, "message": f"Locker # {lock_id} not opened: {e.detail}"} for lock_id, _, _ in locks}
+        results = {}
+        for (lock_id, board, _), ok in zip(locks, sent):
+            message = f"Locker # {lock_id} opened successfully" if ok else f"Locker # {lock_id} failed to open"
+            logger.info("{result} on board {board} of device {ip}", result=message, board=board, ip=ip)
+            results[lock_id] = {"ok": ok, "message": message}
+        return results
+
+    async def relaystatus(self) -> dict:
+        start_time = time.time()
+        with span("status"):
+            status_result = self._build_status(await self._get_snapshots())
         end_time = time.time()
         duration = end_time - start_time
-        logger.info(f"Relaystatus request completed. Result: {status_result}")
-        logger.info(f"Request took {duration:.2f} seconds")
+        lazy_logger.debug("Relaystatus result: {result}", result=lambda: status_result)
+        logger.info("Relaystatus of {locks} locks took {duration:.2f} seconds", locks=len(status_result["id"]), duration=duration)
+        return status_result
+
+    async def status_payload(self) -> StatusPayload:
+        start_time = time.time()
+        with span("snapshots"):
+            snapshots = await self._get_snapshots()
+        key = tuple(
+            (ip, snapshot.version if snapshot else None, self.devices[ip].health.online, snapshot is not None and self._stale(snapshot))
+            for ip, snapshot in snapshots.items()
+        )
+        oldest_refresh = min((snapshot.refreshed_at for snapshot in snapshots.values() if snapshot), default=None)
+        if self._payload is None or key != self._payload_key:
+            self._payload_misses.inc()
+            with span("build"):
+                self._payload = StatusPayload.build(self._build_status(snapshots), self.feed.version, oldest_refresh)
+            self._payload_key = key
+            duration = time.time() - start_time
+            logger.info(
+                "Status payload rebuilt for version {version}: {size} bytes in {duration:.4f} seconds",
+                version=self._payload.version,
+                size=len(self._payload.body),
+                duration=duration,
+            )
+        else:
+            self._payload_hits.inc()
+            self._payload.oldest_refresh = oldest_refresh
+        return self._payload
+
+    def select_locks(self, ids: Optional[List[str]] = None, gateway: Optional[str] = None, prefix: Optional[str] = None) -> Dict[str, Tuple[str, int, int]]:
+        candidates: Iterable[str] = ids or self.lock_lookup
+        selected = {}
+        for lock_id in candidates:
+            target = self.lock_lookup.get(lock_id)
+            if target is None or (gateway and target[0] != gateway) or (prefix and not lock_id.startswith(prefix)):
+                continue
+            selected[lock_id] = target
+        return selected
+
+    async def query_status(self, ids: Optional[List[str]] = None, gateway: Optional[str] = None, prefix: Optional[str] = None) -> dict:
+        return await self.filtered_status(self.select_locks(ids, gateway, prefix))
+
+    async def filtered_status(self, locks: Dict[str, Tuple[str, int, int]]) -> dict:
+        start_time = time.time()
+        boards: Dict[str, Set[int]] = {}
+        for ip, board, _ in locks.values():
+            boards.setdefault(ip, set()).add(board)
+        with span("boards"):
+            gateways = dict(zip(boards, await asyncio.gather(*(self._read_boards(ip, needed) for ip, needed in boards.items()))))
+
+        found = {ip: reply for ip, reply in gateways.items() if reply is not None}
+        status_result: dict = {"id": {}, "version": self.feed.version, "gateways": {ip: info for ip, (_, info) in found.items()}}
+        for lock_id, (ip, board, lock_number) in locks.items():
+            if ip not in found:
+                continue
+            mask = found[ip][0].get(board)
+            status_result["id"][lock_id] = STATUS_OFFLINE if mask is None else STATUS_VALUES[mask >> (lock_number - 1) & 1]
+        logger.info(
+            "Filtered status for {locks} locks on {boards} boards took {duration:.2f} seconds",
+            locks=len(locks),
+            boards=sum(map(len, boards.values())),
+            duration=time.time() - start_time,
+        )
         return status_result
 
+    async def _read_boards(self, ip: str, boards: Set[int]) -> Optional[Tuple[Dict[int, int], Dict[str, Any]]]:
+        snapshot = self.poller.fresh(ip)
+        if snapshot is not None:
+            return snapshot.boards, self._gateway_info(ip, snapshot)
+        device = self.devices.get(ip)
+        if device is None:
+            return None
+        try:
+            masks = await asyncio.wait_for(device.read_boards(sorted(boards)), STATUS_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            if self.devices.get(ip) is not device:
+                return None
+            logger.warning(
+                "Status of {boards} boards on {ip} not read in {timeout} seconds, answering from the last snapshot",
+                boards=len(boards),
+                ip=ip,
+                timeout=STATUS_WAIT_TIMEOUT,
+            )
+            previous = self.poller.snapshots.get(ip)
+            return previous.boards if previous else {}, self._gateway_info(ip, previous)
+        return masks, {"version": None, "updated_at": time.time(), "online": device.health.online, "stale": False}
+
+    def _build_status(self, snapshots: Dict[str, Optional[GatewaySnapshot]]) -> dict:
+        status_result: dict = {"id": {}, "version": self.feed.version, "gateways": {}}
+        for ip, snapshot in snapshots.items():
+            status_result["id"].update(self.layouts[ip].states(snapshot.boards if snapshot else None))
+            status_result["gateways"][ip] = self._gateway_info(ip, snapshot)
+        return status_result
+
+    def _publish_changes(self, ip: str, previous: Optional[GatewaySnapshot], snapshot: GatewaySnapshot) -> None:
+        layout = self.layouts.get(ip)
+        if layout is not None:
+            self.feed.publish(snapshot.version, layout.changes(previous.boards if previous else None, snapshot.boards))
+
+    def _journal_changes(self, version: int, changes: Dict[str, dict]) -> None:
+        for lock_id, state in changes.items():
+            target = self.lock_lookup.get(lock_id)
+            self.journal.record("state", lock_id, target[0] if target else None, outcome=STATE_NAMES[state["status"]], details={"version": version})
+
+    async def lock_snapshot(self) -> Tuple[int, Dict[str, dict]]:
+        snapshots = await self._get_snapshots()
+        states: Dict[str, dict] = {}
+        for ip, snapshot in snapshots.items():
+            states.update(self.layouts[ip].states(snapshot.boards if snapshot else None))
+        return self.feed.version, states
+
+    async def _get_snapshots(self) -> Dict[str, Optional[GatewaySnapshot]]:
+        snapshots = {ip: self.poller.fresh(ip) for ip in self.devices}
+        misses = [ip for ip, snapshot in snapshots.items() if snapshot is None]
+        if misses:
+            await asyncio.gather(*(asyncio.wait_for(self.poller.get(ip), STATUS_WAIT_TIMEOUT) for ip in misses), return_exceptions=True)
+            snapshots = {ip: self.poller.snapshots.get(ip) for ip in self.devices}
+        return snapshots
+
+    def _collect_metrics(self) -> None:
+        for ip, device in self.devices.items():
+            metrics.COMMAND_QUEUE_DEPTH.labels(ip).set(device.pending)
+
+    def _gateway_info(self, ip: str, snapshot: Optional[GatewaySnapshot]) -> Dict[str, Any]:
+        device = self.devices.get(ip)
+        online = device is not None and device.health.online
+        if snapshot is None:
+            return {"version": None, "updated_at": None, "online": online, "stale": False}
+        return {"version": snapshot.version, "updated_at": snapshot.updated_at, "online": online, "stale": self._stale(snapshot)}
+
+    def _stale(self, snapshot: GatewaySnapshot) -> bool:
+        return snapshot.stale or snapshot.age() > self.poller.max_age
+
+
+def pulse_missed(command: Optional[Command]) -> bool:
+    return command is not None and command.future.done() and not command.future.cancelled() and command.future.result() is False
+
+
+def pulse_outcome(result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return "not_found"
+    if "ok" in result:
+        return "sent" if result["ok"] else "failed"
+    if "confirmed" not in result:
+        return "sent"
+    return "confirmed" if result["confirmed"] else "failed"
+
+
+def diff_config(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, List[str]]:
+    changes: Dict[str, List[str]] = {"added": [], "removed": [ip for ip in before if ip not in after], "replaced": [], "updated": []}
+    for ip, details in after.items():
+        previous = before.get(ip)
+        if previous is None:
+            changes["added"].append(ip)
+        elif any(previous.get(key) != details.get(key) for key in CONNECTION_KEYS):
+            changes["replaced"].append(ip)
+        elif previous != details:
+            changes["updated"].append(ip)
+    return changes
+
 
 device_manager = DeviceManager()
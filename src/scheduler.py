@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from logger_config import setup_logger
+from tracing import background_task
+
+logger = setup_logger()
+
+
+class Timer:
+    __slots__ = ("due", "callback", "cancelled")
+
+    def __init__(self, due: float, callback: Callable[[], Any]) -> None:
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerScheduler:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._heap: List[Tuple[float, int, Timer]] = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def call_at(self, due: float, callback: Callable[[], Any]) -> Timer:
+        timer = Timer(due, callback)
+        heapq.heappush(self._heap, (due, next(self._sequence), timer))
+        if self._heap[0][2] is timer:
+            self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = background_task(self._run())
+        return timer
+
+    def call_later(self, delay: float, callback: Callable[[], Any]) -> Timer:
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def cancel(self, timer: Timer) -> None:
+        if timer.cancelled:
+            return
+        timer.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for _, _, timer in self._heap:
+            timer.cancelled = True
+        self._heap.clear()
+        self._cancelled = 0
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self._next_delay()
+            if delay is None or delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                continue
+            self._fire_due()
+
+    def _next_delay(self) -> Optional[float]:
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        if not self._heap:
+            return None
+        return self._heap[0][0] - time.monotonic()
+
+    def _fire_due(self) -> None:
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                self._cancelled -= 1
+                continue
+            timer.cancelled = True
+            try:
+                timer.callback()
+            except Exception as e:  # noqa
+                logger.error(f"Timer callback failed on {self.name}: {str(e)}")
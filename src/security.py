@@ -1,7 +1,13 @@
+import asyncio
+from collections import deque
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
-from typing import Optional
+import hashlib
+import time
+from typing import Deque, Optional, Tuple
 import uuid
 
 import bcrypt
@@ -12,20 +18,92 @@ from fastapi.security import HTTPBearer
 import jwt
 from jwt.exceptions import PyJWTError
 
+from config import ADMIN_USERS
 from config import ALGORITHM
-from config import PASSWORD_HASH
+from config import LOGIN_FAILURE_WINDOW
+from config import LOGIN_MAX_FAILURES
+from config import LOGIN_MAX_PENDING
+from config import LOGIN_WORKERS
 from config import SECRET_KEY
-from config import USERNAME
+from config import TOKEN_CACHE_SIZE
+from config import TOKEN_DB
+from config import TOKEN_REFRESH_INTERVAL
+from config import USERS
 from logger_config import setup_logger
 from models import TokenData
+from token_store import open_token_store
+from tracing import span
 
-active_tokens = {}
+active_tokens = open_token_store(TOKEN_DB, TOKEN_REFRESH_INTERVAL)
 
 logger = setup_logger()
 
 oauth2_scheme = HTTPBearer()
 
 
+class LoginThrottle:
+    def __init__(self, max_failures: int, window: float, max_keys: int = 10000) -> None:
+        self.max_failures = max_failures
+        self.window = window
+        self.max_keys = max_keys
+        self.failures: OrderedDict[str, Deque[float]] = OrderedDict()
+
+    def retry_after(self, key: str) -> float:
+        attempts = self.failures.get(key)
+        if not attempts:
+            return 0
+        now = time.monotonic()
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if len(attempts) < self.max_failures:
+            return 0
+        return attempts[0] + self.window - now
+
+    def failed(self, key: str) -> None:
+        attempts = self.failures.pop(key, None) or deque(maxlen=self.max_failures)
+        attempts.append(time.monotonic())
+        self.failures[key] = attempts
+        while len(self.failures) > self.max_keys:
+            self.failures.popitem(last=False)
+
+    def succeeded(self, key: str) -> None:
+        self.failures.pop(key, None)
+
+
+class TokenCache:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.entries: OrderedDict[bytes, Tuple[str, str, float]] = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[Tuple[str, str]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def put(self, key: bytes, username: str, token_id: str, expires: float) -> None:
+        self.entries[key] = (username, token_id, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def discard(self, key: bytes) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+login_throttle = LoginThrottle(LOGIN_MAX_FAILURES, LOGIN_FAILURE_WINDOW)
+password_executor = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="password")
+pending_logins = 0
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         result = bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
@@ -36,10 +114,33 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
-def authenticate_user(username: str, password: str) -> Optional[str]:
-    if username == USERNAME and verify_password(password, PASSWORD_HASH):
+async def authenticate_user(username: str, password: str, client: str = "") -> Optional[str]:
+    global pending_logins
+    keys = [f"user:{username}", f"client:{client}"]
+    retry_after = max(login_throttle.retry_after(key) for key in keys)
+    if retry_after > 0:
+        logger.warning(f"Login throttled for user {username} from {client}")
+        raise HTTPException(status_code=429, detail="Too many failed login attempts", headers={"Retry-After": str(int(retry_after) + 1)})
+    if pending_logins >= LOGIN_MAX_PENDING:
+        logger.warning(f"Login rejected for user {username}: {pending_logins} verifications pending")
+        raise HTTPException(status_code=503, detail="Too many concurrent logins", headers={"Retry-After": "1"})
+
+    pending_logins += 1
+    try:
+        hashed_password = USERS.get(username)
+        verified = hashed_password is not None and await asyncio.get_running_loop().run_in_executor(
+            password_executor, verify_password, password, hashed_password
+        )
+    finally:
+        pending_logins -= 1
+
+    if verified:
+        for key in keys:
+            login_throttle.succeeded(key)
         logger.info(f"User authenticated: {username}")
         return username
+    for key in keys:
+        login_throttle.failed(key)
     logger.warning(f"Authentication failed for user: {username}")
     return None
 
@@ -55,29 +156,56 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-    active_tokens[to_encode["sub"]] = token_id
+    active_tokens.set(to_encode["sub"], token_id)
 
     logger.info("Access token created")
     return token
 
 
-def decode_token(credentials: HTTPAuthorizationCredentials) -> TokenData:
-    token = credentials.credentials
-    credentials_exception = HTTPException(
+def revoke_token(username: str) -> None:
+    active_tokens.delete(username)
+    logger.info(f"Access token of user {username} revoked")
+
+
+def verified_claims(key: bytes, token: str) -> Tuple[str, str]:
+    claims = token_cache.get(key)
+    if claims is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        claims = payload.get("sub", ""), payload.get("jti", "")
+        token_cache.put(key, *claims, float(payload.get("exp") or 0))
+    return claims
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_token(credentials: HTTPAuthorizationCredentials) -> TokenData:
+    token = credentials.credentials
+    key = hashlib.sha256(token.encode("utf-8")).digest()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub", "")
-        token_id: str = payload.get("jti", "")
+        with span("auth"):
+            username, token_id = verified_claims(key, token)
+            active = bool(username) and active_tokens.get(username) == token_id
 
-        if not username or active_tokens.get(username) != token_id:
-            raise credentials_exception
+        if not active:
+            token_cache.discard(key)
+            raise credentials_exception()
 
-        logger.info("Token decoded successfully")
+        logger.debug("Token decoded successfully")
         return TokenData(username=username)
     except PyJWTError:
         logger.error("Token decoding failed")
-        raise credentials_exception
+        raise credentials_exception()
+
+
+def decode_admin_token(credentials: HTTPAuthorizationCredentials) -> TokenData:
+    token_data = decode_token(credentials)
+    if token_data.username not in ADMIN_USERS:
+        logger.warning(f"User {token_data.username} is not allowed to use admin endpoints")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin rights required")
+    return token_data
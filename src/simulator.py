@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+from dataclasses import dataclass
+from dataclasses import field
+import json
+import random
+from typing import Any, Dict, List, Optional, Set
+
+from logger_config import setup_logger
+from protocol import CMD_STATUS
+from protocol import CMD_UNLOCK
+from protocol import encode_status_reply
+from protocol import encode_unlock_reply
+from protocol import Frame
+from protocol import FrameDecoder
+from protocol import LOCKS_PER_BOARD
+from protocol import REQUEST_LENGTHS
+
+logger = setup_logger()
+
+ALL_CLOSED = (1 << LOCKS_PER_BOARD) - 1
+
+
+@dataclass
+class GatewayFaults:
+    latency: float = 0.0
+    jitter: float = 0.0
+    rtt: float = 0.0
+    drop_rate: float = 0.0
+    partial_rate: float = 0.0
+    garbage_rate: float = 0.0
+    reset_rate: float = 0.0
+    ack_unlock: bool = True
+    close_after: Optional[float] = None
+
+
+@dataclass
+class GatewayStats:
+    connections: int = 0
+    status_requests: int = 0
+    unlock_requests: int = 0
+    dropped: int = 0
+    partial: int = 0
+    resets: int = 0
+    unlocked: List[tuple] = field(default_factory=list)
+
+
+class SimulatedGateway:
+    def __init__(
+        self,
+        boards: int,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        faults: Optional[GatewayFaults] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.boards = boards
+        self.host = host
+        self.port = port
+        self.faults = faults or GatewayFaults()
+        self.masks: Dict[int, int] = {board: ALL_CLOSED for board in range(boards)}
+        self.stats = GatewayStats()
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._timers: Set[asyncio.TimerHandle] = set()
+        self._handlers: Set[asyncio.Task] = set()
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Simulated gateway listening on {self.address} with {self.boards} boards")
+
+    async def stop(self) -> None:
+        await self.refuse_connections()
+        self.reset_connections()
+        for task in self._handlers:
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
+
+    async def refuse_connections(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def accept_connections(self) -> None:
+        if self._server is None:
+            await self.start()
+
+    def reset_connections(self) -> None:
+        for writer in list(self._writers):
+            writer.transport.abort()
+        self._writers.clear()
+
+    def set_lock(self, board: int, lock: int, closed: bool) -> None:
+        bit = 1 << (lock - 1)
+        self.masks[board] = self.masks[board] | bit if closed else self.masks[board] & ~bit
+
+    def is_closed(self, board: int, lock: int) -> bool:
+        return bool(self.masks[board] >> (lock - 1) & 1)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.connections += 1
+        self._writers.add(writer)
+        task = asyncio.current_task()
+        if task:
+            self._handlers.add(task)
+        try:
+            await self._serve_connection(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(task)  # type: ignore[arg-type]
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        decoder = FrameDecoder(REQUEST_LENGTHS)
+        data = await reader.read(256)
+        while data:
+            for frame in decoder.feed(data):
+                if not await self._serve(frame, writer):
+                    return
+            data = await reader.read(256)
+
+    async def _serve(self, frame: Frame, writer: asyncio.StreamWriter) -> bool:
+        if frame.board >= self.boards:
+            return True
+        reply = self._apply(frame)
+        if self.faults.latency or self.faults.jitter:
+            await asyncio.sleep(self.faults.latency + self._random.uniform(0, self.faults.jitter))
+        if self._chance(self.faults.reset_rate):
+            self.stats.resets += 1
+            writer.transport.abort()
+            return False
+        reply = self._corrupt(reply) if reply is not None else None
+        if reply:
+            await self._send(writer, reply)
+        return True
+
+    async def _send(self, writer: asyncio.StreamWriter, reply: bytes) -> None:
+        if self.faults.rtt:
+            asyncio.get_running_loop().call_later(self.faults.rtt, self._deliver, writer, reply)
+            return
+        writer.write(reply)
+        await writer.drain()
+
+    def _deliver(self, writer: asyncio.StreamWriter, reply: bytes) -> None:
+        if not writer.is_closing():
+            writer.write(reply)
+
+    def _corrupt(self, reply: bytes) -> bytes:
+        if self._chance(self.faults.drop_rate):
+            self.stats.dropped += 1
+            return b""
+        if self._chance(self.faults.partial_rate):
+            self.stats.partial += 1
+            reply = reply[: self._random.randint(1, len(reply) - 1)]
+        if self._chance(self.faults.garbage_rate):
+            reply = bytes(self._random.getrandbits(8) for _ in range(self._random.randint(1, 8))) + reply
+        return reply
+
+    def _apply(self, frame: Frame) -> Optional[bytes]:
+        if frame.cmd == CMD_STATUS:
+            self.stats.status_requests += 1
+            return encode_status_reply(frame.board, self.masks[frame.board])
+        if frame.cmd == CMD_UNLOCK and 1 <= frame.lock <= LOCKS_PER_BOARD:
+            self.stats.unlock_requests += 1
+            self.stats.unlocked.append((frame.board, frame.lock))
+            self.set_lock(frame.board, frame.lock, closed=False)
+            if self.faults.close_after is not None:
+                self._schedule_close(frame.board, frame.lock, self.faults.close_after)
+            return encode_unlock_reply(frame.board, frame.lock) if self.faults.ack_unlock else None
+        return None
+
+    def _schedule_close(self, board: int, lock: int, delay: float) -> None:
+        def close() -> None:
+            self._timers.discard(timer)
+            self.set_lock(board, lock, closed=True)
+
+        timer = asyncio.get_running_loop().call_later(delay, close)
+        self._timers.add(timer)
+
+    def _chance(self, rate: float) -> bool:
+        return rate > 0 and self._random.random() < rate
+
+
+def build_config(gateways: int, boards: int, locks_per_board: int = LOCKS_PER_BOARD, base_ip: str = "10.0.0.") -> Dict[str, Any]:
+    config: Dict[str, Any] = {}
+    for gateway in range(gateways):
+        locks = [
+            {"id": f"{gateway + 1}-{board * locks_per_board + lock}", "board": board, "lock": lock}
+            for board in range(boards)
+            for lock in range(1, locks_per_board + 1)
+        ]
+        config[f"{base_ip}{gateway + 1}"] = {"boards": boards, "locks": locks}
+    return config
+
+
+class SimulatedSite:
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        host: str = "127.0.0.1",
+        faults: Optional[GatewayFaults] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.source = config
+        self.config: Dict[str, Any] = {}
+        self.gateways: Dict[str, SimulatedGateway] = {
+            ip: SimulatedGateway(boards=details["boards"], host=host, faults=faults, seed=None if seed is None else seed + i)
+            for i, (ip, details) in enumerate(config.items())
+        }
+
+    async def start(self) -> Dict[str, Any]:
+        for ip, gateway in self.gateways.items():
+            await gateway.start()
+            self.config[ip] = {**self.source[ip], "host": gateway.host, "port": gateway.port}
+        return self.config
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(gateway.stop() for gateway in self.gateways.values()))
+
+    async def __aenter__(self) -> "SimulatedSite":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.stop()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    with open(args.config) as jsonfile:
+        config = json.load(jsonfile)
+    faults = GatewayFaults(latency=args.latency, rtt=args.rtt, drop_rate=args.drop_rate, partial_rate=args.partial_rate, reset_rate=args.reset_rate)
+    site = SimulatedSite(config, host=args.host, faults=faults, seed=args.seed)
+    simulated = await site.start()
+    with open(args.output, "w") as jsonfile:
+        json.dump(simulated, jsonfile, ensure_ascii=False, indent=4)
+    logger.info(f"Simulated config with {len(simulated)} gateways written to {args.output}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await site.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run simulated relay gateways for a config.json")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--output", default="config_sim.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rtt", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--partial-rate", type=float, default=0.0)
+    parser.add_argument("--reset-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from dataclasses import field
+import gzip
+import json
+import time
+from typing import Any, Optional
+import uuid
+import zlib
+
+from fastapi import Response
+
+BOOT_ID = uuid.uuid4().hex[:8]
+GZIP_MIN_SIZE = 1024
+
+
+@dataclass
+class StatusPayload:
+    body: bytes
+    version: int
+    oldest_refresh: Optional[float]
+    health: int = 0
+    etag: str = field(init=False)
+    _gzipped: Optional[bytes] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.etag = f'W/"{BOOT_ID}-{self.version}-{self.health:08x}"'
+
+    @classmethod
+    def build(cls, content: Any, version: int, oldest_refresh: Optional[float]) -> "StatusPayload":
+        body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return cls(body=body, version=version, oldest_refresh=oldest_refresh, health=health_digest(content))
+
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=5)
+        return self._gzipped
+
+    def age(self) -> int:
+        if self.oldest_refresh is None:
+            return 0
+        return max(0, int(time.monotonic() - self.oldest_refresh))
+
+
+def health_digest(content: Any) -> int:
+    gateways = content.get("gateways", {}) if isinstance(content, dict) else {}
+    flags = [[ip, info.get("online"), info.get("stale")] for ip, info in gateways.items()]
+    return zlib.crc32(json.dumps(flags, separators=(",", ":")).encode("utf-8"))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip() == "*" or tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def payload_response(payload: StatusPayload, if_none_match: Optional[str], accept_encoding: str) -> Response:
+    headers = {"ETag": payload.etag, "Age": str(payload.age()), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+    if len(payload.body) >= GZIP_MIN_SIZE and "gzip" in accept_encoding.lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.gzipped(), media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from logger_config import setup_logger
+
+logger = setup_logger()
+
+TokenEntry = Tuple[str, int]
+TokenListener = Callable[[Dict[str, TokenEntry]], None]
+
+
+def newer(entry: TokenEntry, current: Optional[TokenEntry]) -> bool:
+    return current is None or (entry[1], entry[0]) > (current[1], current[0])
+
+
+def next_version(current: Optional[TokenEntry]) -> int:
+    return 1 if current is None else current[1] + 1
+
+
+def active_id(entry: Optional[TokenEntry]) -> Optional[str]:
+    return entry[0] if entry and entry[0] else None
+
+
+class MemoryTokenStore:
+    def __init__(self) -> None:
+        self.tokens: Dict[str, TokenEntry] = {}
+        self.listeners: List[TokenListener] = []
+
+    def _write(self, username: str, token_id: str) -> None:
+        entry = self.tokens[username] = token_id, next_version(self.tokens.get(username))
+        for listener in self.listeners:
+            listener({username: entry})
+
+    def set(self, username: str, token_id: str) -> None:
+        self._write(username, token_id)
+
+    def get(self, username: str) -> Optional[str]:
+        return active_id(self.tokens.get(username))
+
+    def delete(self, username: str) -> None:
+        self._write(username, "")
+
+    def entries(self) -> Dict[str, TokenEntry]:
+        return dict(self.tokens)
+
+    def merge(self, entries: Dict[str, TokenEntry]) -> int:
+        changed = 0
+        for username, (token_id, version) in entries.items():
+            if newer((token_id, version), self.tokens.get(username)):
+                self.tokens[username] = token_id, version
+                changed += 1
+        return changed
+
+
+class SqliteTokenStore:
+    def __init__(self, path: str, refresh_interval: float = 1.0) -> None:
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._next_refresh = 0.0
+        self.listeners: List[TokenListener] = []
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS tokens (username TEXT PRIMARY KEY, token_id TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0)")
+        if "version" not in [row[1] for row in self._connection.execute("PRAGMA table_info(tokens)")]:
+            self._connection.execute("ALTER TABLE tokens ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self.tokens: Dict[str, TokenEntry] = {}
+        self._version: Optional[int] = None
+        self._refresh()
+        logger.info(f"Token store opened at {path} with {sum(1 for entry in self.tokens.values() if entry[0])} active tokens")
+
+    def _load(self) -> None:
+        self.tokens = {
+            username: (token_id, version) for username, token_id, version in self._connection.execute("SELECT username, token_id, version FROM tokens")
+        }
+
+    def _refresh(self) -> None:
+        self._next_refresh = time.monotonic() + self.refresh_interval
+        version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._load()
+            self._version = version
+
+    def _write(self, username: str, token_id: str) -> None:
+        with self._lock:
+            self._refresh()
+            entry = token_id, next_version(self.tokens.get(username))
+            self._connection.execute(
+                "INSERT INTO tokens (username, token_id, version) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET token_id = excluded.token_id, version = excluded.version",
+                (username, *entry),
+            )
+            self.tokens[username] = entry
+        for listener in self.listeners:
+            listener({username: entry})
+
+    def set(self, username: str, token_id: str) -> None:
+        self._write(username, token_id)
+
+    def get(self, username: str) -> Optional[str]:
+        if time.monotonic() >= self._next_refresh:
+            with self._lock:
+                self._refresh()
+        return active_id(self.tokens.get(username))
+
+    def delete(self, username: str) -> None:
+        self._write(username, "")
+
+    def entries(self) -> Dict[str, TokenEntry]:
+        with self._lock:
+            self._refresh()
+            return dict(self.tokens)
+
+    def merge(self, entries: Dict[str, TokenEntry]) -> int:
+        with self._lock:
+            changes = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT INTO tokens (username, token_id, version) VALUES (?, ?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET token_id = excluded.token_id, version = excluded.version "
+                "WHERE (excluded.version, excluded.token_id) > (tokens.version, tokens.token_id)",
+                [(username, token_id, version) for username, (token_id, version) in entries.items()],
+            )
+            changed = self._connection.total_changes - changes
+            if changed:
+                self._load()
+            return changed
+
+
+TokenStore = Union[MemoryTokenStore, SqliteTokenStore]
+
+
+def open_token_store(path: str, refresh_interval: float = 1.0) -> TokenStore:
+    if path:
+        return SqliteTokenStore(path, refresh_interval)
+    return MemoryTokenStore()
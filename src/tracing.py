@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+import contextvars
+import re
+import time
+from typing import Any, Coroutine, Dict, Iterator, List, Optional
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+Spans = Dict[str, List[float]]
+
+
+class Trace:
+    __slots__ = ("request_id", "spans", "started")
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.spans: Spans = {}
+        self.started = time.perf_counter()
+
+    def add(self, name: str, duration: float, count: int = 1) -> None:
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [duration, count]
+        else:
+            entry[0] += duration
+            entry[1] += count
+
+    def merge(self, spans: Spans) -> None:
+        for name, (duration, count) in spans.items():
+            self.add(name, duration, int(count))
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={duration * 1000:.2f}" + (f';desc="{int(count)} calls"' if count > 1 else "") for name, (duration, count) in self.spans.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def current_request_id() -> str:
+    trace = current_trace.get()
+    return trace.request_id if trace is not None else "-"
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def record(trace: Optional[Trace], name: str, duration: float) -> None:
+    if trace is not None:
+        trace.add(name, duration)
+
+
+def background_task(coroutine: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    return asyncio.create_task(coroutine, context=contextvars.Context())
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode("latin-1"), b"").decode("latin-1")
+        trace = Trace(incoming if VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex[:16])
+        token = current_trace.set(trace)
+
+        async def send_with_trace(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append(REQUEST_ID_HEADER, trace.request_id)
+                headers.append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            current_trace.reset(token)
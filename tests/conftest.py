@@ -0,0 +1,89 @@
+import json
+import os
+import pytest
+import tempfile
+from typing import AsyncIterator, Dict, TYPE_CHECKING
+
+import bcrypt
+from helpers import KIOSK_USERNAME
+from helpers import PASSWORD
+from helpers import USERNAME
+from helpers import wait_until
+import httpx
+
+if TYPE_CHECKING:
+    from relay import DeviceManager
+    from simulator import SimulatedSite
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+STATE_DIR = tempfile.mkdtemp(prefix="locker_api_tests_")
+USERS_FILE = os.path.join(STATE_DIR, "users.json")
+
+with open(USERS_FILE, "w") as jsonfile:
+    json.dump({KIOSK_USERNAME: bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")}, jsonfile)
+
+os.environ.update(
+    USERNAME=USERNAME,
+    PASSWORD_HASH=bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8"),
+    USERS_FILE=USERS_FILE,
+    ADMIN_USERS=USERNAME,
+    TOKEN_DB="",
+    JOURNAL_DB=os.path.join(STATE_DIR, "journal.db"),
+    CHECKPOINT_FILE="",
+    CONFIG_WATCH_INTERVAL="0",
+    CLUSTER_NODES="",
+    BROKER_SOCKET="",
+    LOG_LEVEL="CRITICAL",
+    STATUS_POLL_INTERVAL="0.2",
+    PULSE_GAP_MS="50",
+    PULSE_CONFIRM_DELAY_MS="50",
+    GATEWAY_BACKOFF_MIN="0.1",
+    GATEWAY_BACKOFF_MAX="0.5",
+)
+
+
+def pytest_sessionstart(session: pytest.Session) -> None:
+    os.chdir(SRC)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def site() -> AsyncIterator["SimulatedSite"]:
+    from simulator import build_config
+    from simulator import SimulatedSite
+
+    async with SimulatedSite(build_config(gateways=2, boards=2, locks_per_board=4)) as site:
+        yield site
+
+
+@pytest.fixture
+async def manager(site: "SimulatedSite") -> AsyncIterator["DeviceManager"]:
+    from relay import DeviceManager
+
+    manager = DeviceManager()
+    manager.start(site.config)
+    try:
+        await wait_until(lambda: all(snapshot.boards for snapshot in manager.poller.snapshots.values()) and len(manager.poller.snapshots) == len(site.config))
+        yield manager
+    finally:
+        await manager.stop()
+
+
+@pytest.fixture
+async def client(manager: "DeviceManager", monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[httpx.AsyncClient]:
+    import main
+
+    monkeypatch.setattr(main, "device_manager", manager)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def auth() -> Dict[str, str]:
+    from security import create_access_token
+
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': USERNAME})}"}
@@ -0,0 +1,15 @@
+import asyncio
+import time
+from typing import Callable
+
+USERNAME = "tester"
+PASSWORD = "secret"
+KIOSK_USERNAME = "kiosk"
+
+
+async def wait_until(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError(f"Condition not met in {timeout} seconds")
+        await asyncio.sleep(0.02)
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+import time
+from typing import Dict
+
+from helpers import KIOSK_USERNAME
+from helpers import wait_until
+import httpx
+
+from protocol import encode_status
+from relay import DeviceManager
+from relay import PRIORITY_POLL
+from security import create_access_token
+from simulator import SimulatedSite
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_status_requires_token(client: httpx.AsyncClient) -> None:
+    response = await client.get("/api/v1/status")
+    assert response.status_code == 403
+
+
+async def test_status_answers_not_modified_for_current_etag(client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    response = await client.get("/api/v1/status", headers=auth)
+    assert response.status_code == 200
+    assert len(response.json()["id"]) == 16
+    etag = response.headers["ETag"]
+
+    cached = await client.get("/api/v1/status", headers={**auth, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    listed = await client.get("/api/v1/status", headers={**auth, "If-None-Match": f'W/"other", {etag}'})
+    assert listed.status_code == 304
+
+
+async def test_status_etag_changes_with_lock_state(site: SimulatedSite, manager: DeviceManager, client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    etag = (await client.get("/api/v1/status", headers=auth)).headers["ETag"]
+    site.gateways["10.0.0.1"].set_lock(0, 3, closed=False)
+    await manager.poller.refresh("10.0.0.1")
+
+    response = await client.get("/api/v1/status", headers={**auth, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["id"]["1-3"] == {"status": False}
+
+
+async def test_status_etag_changes_when_gateway_goes_offline(
+    site: SimulatedSite, manager: DeviceManager, client: httpx.AsyncClient, auth: Dict[str, str]
+) -> None:
+    etag = (await client.get("/api/v1/status", headers=auth)).headers["ETag"]
+    await site.gateways["10.0.0.2"].stop()
+    await manager.poller.refresh("10.0.0.2")
+    await wait_until(lambda: not manager.devices["10.0.0.2"].health.online)
+
+    response = await client.get("/api/v1/status", headers={**auth, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["gateways"]["10.0.0.2"]["online"] is False
+
+
+async def test_filtered_status_skips_payload_cache(client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    response = await client.get("/api/v1/status", params={"ids": "1-1,2-2"}, headers=auth)
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+    assert response.json()["id"] == {"1-1": {"status": True}, "2-2": {"status": True}}
+    assert (await client.get("/api/v1/status", params={"gateway": "10.9.9.9"}, headers=auth)).status_code == 404
+
+
+async def test_pulse_rejected_when_deadline_cannot_be_met(manager: DeviceManager, client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    started = time.time()
+    device = manager.devices["10.0.0.1"]
+    device.pulse_gap = 2.0
+    queued = [await device.unlock_send(0, lock) for lock in (1, 2, 3)]
+
+    response = await client.post("/api/v1/pulse", json={"id": "1-4"}, headers=auth)
+    assert response.status_code == 503
+    assert "exceeds" in response.json()["detail"]
+    assert int(response.headers["Retry-After"]) >= 1
+    assert all(not command.future.done() or command.future.result() for command in queued)
+
+    await manager.journal.flush()
+    events = await manager.history(lock_id="1-4", start=started)
+    assert [event["outcome"] for event in events] == ["rejected"]
+
+
+async def test_pulse_rejected_when_queue_is_full(site: SimulatedSite, manager: DeviceManager, client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    site.gateways["10.0.0.1"].faults.latency = 1.0
+    device = manager.devices["10.0.0.1"]
+    device.submit(encode_status(0), PRIORITY_POLL)
+    await wait_until(lambda: device.pending == 0)
+    while device.pending < device.command_queue.maxsize:
+        device.submit(encode_status(0), PRIORITY_POLL)
+
+    response = await client.post("/api/v1/pulse", json={"id": "1-1"}, headers=auth)
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Command queue of gateway 10.0.0.1 is full"
+    assert int(response.headers["Retry-After"]) >= 1
+    assert not site.gateways["10.0.0.1"].stats.unlocked
+
+
+async def test_busy_gateway_does_not_block_others(site: SimulatedSite, manager: DeviceManager, client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    manager.devices["10.0.0.1"].pulse_gap = 2.0
+    for lock in (1, 2, 3):
+        await manager.devices["10.0.0.1"].unlock_send(0, lock)
+
+    assert (await client.post("/api/v1/pulse", json={"id": "1-4"}, headers=auth)).status_code == 503
+    response = await client.post("/api/v1/pulse", json={"id": "2-4"}, headers=auth)
+    assert response.status_code == 200
+    assert response.json()["message"] == "Locker # 2-4 opened successfully"
+
+
+async def test_responses_carry_server_timing(client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    response = await client.get("/api/v1/status", headers={**auth, "X-Request-ID": "trace-1"})
+    assert response.headers["X-Request-ID"] == "trace-1"
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+
+async def test_concurrent_profile_is_rejected(client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    responses = await asyncio.gather(*(client.post("/api/v1/admin/profile", params={"seconds": 1}, headers=auth) for _ in range(2)))
+    assert sorted(response.status_code for response in responses) == [200, 409]
+    busy = next(response for response in responses if response.status_code == 409)
+    assert busy.json() == {"detail": "Profiler is already running"}
+
+
+async def test_admin_endpoints_require_admin_user(client: httpx.AsyncClient) -> None:
+    kiosk = {"Authorization": f"Bearer {create_access_token(data={'sub': KIOSK_USERNAME})}"}
+    assert (await client.get("/api/v1/users/me", headers=kiosk)).json() == {"username": KIOSK_USERNAME}
+    assert (await client.post("/api/v1/admin/profile", params={"seconds": 1}, headers=kiosk)).status_code == 403
+    assert (await client.post("/api/v1/admin/reload-config", headers=kiosk)).status_code == 403
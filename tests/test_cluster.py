@@ -0,0 +1,104 @@
+import pytest
+import socket
+from typing import AsyncIterator, Dict, List
+
+from helpers import wait_until
+
+from cluster import ClusterManager
+from cluster import owner_of
+from relay import DeviceManager
+from security import active_tokens
+from simulator import build_config
+from simulator import SimulatedSite
+
+pytestmark = pytest.mark.anyio
+
+GATEWAYS = [f"10.0.0.{index}" for index in range(1, 7)]
+
+
+def free_address() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+async def site() -> AsyncIterator[SimulatedSite]:
+    async with SimulatedSite(build_config(gateways=len(GATEWAYS), boards=1, locks_per_board=4)) as site:
+        yield site
+
+
+@pytest.fixture
+async def cluster(site: SimulatedSite) -> AsyncIterator[List[ClusterManager]]:
+    nodes = [free_address(), free_address()]
+    members = [ClusterManager(DeviceManager(), nodes, node, "secret") for node in nodes]
+    for member in members:
+        member.start(site.config)
+    try:
+        await wait_until(lambda: all(peer._writer is not None for member in members for peer in member.peers.values()))
+        await wait_until(lambda: sum(len(member.local.poller.snapshots) for member in members) == len(GATEWAYS))
+        await wait_until(lambda: all(snapshot.boards for member in members for snapshot in member.local.poller.snapshots.values()))
+        yield members
+    finally:
+        for member in members:
+            await member.stop()
+            active_tokens.listeners.remove(member._share_tokens)
+
+
+def owners(members: List[ClusterManager]) -> Dict[str, str]:
+    return {ip: member.node for member in members for ip in member.local.devices}
+
+
+async def test_each_gateway_is_owned_by_one_node(cluster: List[ClusterManager]) -> None:
+    nodes = cluster[0].nodes
+    assert owners(cluster) == {ip: owner_of(ip, nodes) for ip in GATEWAYS}
+    assert sum(len(member.local.devices) for member in cluster) == len(GATEWAYS)
+    assert all(member.get_devices().keys() == set(GATEWAYS) for member in cluster)
+
+
+async def test_pulse_is_routed_to_owner(site: SimulatedSite, cluster: List[ClusterManager]) -> None:
+    entry = cluster[0]
+    for index, ip in enumerate(GATEWAYS, start=1):
+        assert entry.node_for(f"{index}-2") == owner_of(ip, entry.nodes)
+        assert await entry.pulse_lock(f"{index}-2") == {"message": f"Locker # {index}-2 opened successfully"}
+    await wait_until(lambda: all(gateway.stats.unlocked == [(0, 2)] for gateway in site.gateways.values()))
+    assert await entry.pulse_lock("9-9") == {"error": "Locker # 9-9 not found"}
+
+
+async def test_batch_pulse_is_split_by_owner(site: SimulatedSite, cluster: List[ClusterManager]) -> None:
+    lock_ids = [f"{index}-3" for index in range(1, len(GATEWAYS) + 1)] + ["9-9"]
+    result = await cluster[1].pulse_batch(lock_ids)
+    assert list(result["results"]) == lock_ids
+    assert [result["results"][lock_id]["ok"] for lock_id in lock_ids] == [True] * len(GATEWAYS) + [False]
+    await wait_until(lambda: all(gateway.stats.unlocked == [(0, 3)] for gateway in site.gateways.values()))
+
+
+async def test_status_is_merged_across_nodes(site: SimulatedSite, cluster: List[ClusterManager]) -> None:
+    site.gateways["10.0.0.5"].set_lock(0, 1, closed=False)
+    for member in cluster:
+        for ip in member.local.devices:
+            await member.local.poller.refresh(ip)
+
+    status = await cluster[0].query_status()
+    assert len(status["id"]) == 4 * len(GATEWAYS)
+    assert status["id"]["5-1"] == {"status": False}
+    assert status["id"]["6-1"] == {"status": True}
+    assert status["gateways"].keys() == set(GATEWAYS)
+    assert (await cluster[1].query_status(ids=["5-1", "2-2"]))["id"] == {"5-1": {"status": False}, "2-2": {"status": True}}
+    assert b'"5-1":{"status":false}' in (await cluster[1].status_payload()).body
+
+
+async def test_unreachable_node_reports_its_locks_offline(cluster: List[ClusterManager]) -> None:
+    down = next(member for member in cluster if member.owns("10.0.0.1"))
+    entry = next(member for member in cluster if member is not down)
+    await down.server.stop()
+    peer = entry.peers[down.node]
+    await wait_until(lambda: peer._writer is None)
+
+    status = await entry.query_status()
+    down_gateways = {ip for ip in GATEWAYS if down.owns(ip)}
+    assert {ip for ip, info in status["gateways"].items() if not info["online"]} == down_gateways
+    assert status["id"]["1-1"] == {"status": None}
+    assert all(status["id"][f"{index}-1"] == {"status": True} for index, ip in enumerate(GATEWAYS, start=1) if ip not in down_gateways)
+    result = await entry.pulse_batch(["1-1"])
+    assert result["results"]["1-1"]["ok"] is False
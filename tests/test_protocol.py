@@ -0,0 +1,103 @@
+import pytest
+
+from protocol import CMD_STATUS
+from protocol import CMD_UNLOCK
+from protocol import decode_frame
+from protocol import encode_status
+from protocol import encode_status_reply
+from protocol import encode_unlock
+from protocol import encode_unlock_reply
+from protocol import FrameDecoder
+from protocol import mask_to_status
+from protocol import MAX_BUFFER
+from protocol import REQUEST_LENGTHS
+
+MASK = 0xA5A5_5A5A_F00F
+
+
+@pytest.mark.parametrize("board", [0, 1, 15])
+def test_status_reply_round_trip(board: int) -> None:
+    frame = decode_frame(encode_status_reply(board, MASK))
+    assert frame is not None
+    assert (frame.cmd, frame.board, frame.lock, frame.mask) == (CMD_STATUS, board, 0, MASK)
+
+
+@pytest.mark.parametrize(("board", "lock"), [(0, 1), (2, 24), (3, 48)])
+def test_unlock_round_trip(board: int, lock: int) -> None:
+    frame = decode_frame(encode_unlock_reply(board, lock))
+    assert frame is not None
+    assert (frame.cmd, frame.board, frame.lock) == (CMD_UNLOCK, board, lock)
+    assert decode_frame(encode_unlock(board, lock), REQUEST_LENGTHS) == frame
+
+
+def test_status_request_decodes_with_request_lengths() -> None:
+    frame = decode_frame(encode_status(2), REQUEST_LENGTHS)
+    assert frame is not None
+    assert (frame.cmd, frame.board) == (CMD_STATUS, 2)
+    assert decode_frame(encode_status(2)) is None
+
+
+def test_decode_rejects_bad_checksum() -> None:
+    reply = bytearray(encode_status_reply(1, MASK))
+    reply[-1] ^= 0xFF
+    assert decode_frame(bytes(reply)) is None
+
+
+def test_mask_to_status() -> None:
+    status = mask_to_status(0b101)
+    assert status[1] == {"lock": True}
+    assert status[2] == {"lock": False}
+    assert status[3] == {"lock": True}
+    assert len(status) == 48
+
+
+def test_decoder_reassembles_split_frames() -> None:
+    decoder = FrameDecoder()
+    data = encode_status_reply(1, MASK) + encode_unlock_reply(2, 7)
+    frames = [frame for byte in data for frame in decoder.feed(bytes([byte]))]
+    assert [(frame.cmd, frame.board) for frame in frames] == [(CMD_STATUS, 1), (CMD_UNLOCK, 2)]
+    assert decoder.dropped == 0
+
+
+def test_decoder_skips_garbage_between_frames() -> None:
+    decoder = FrameDecoder()
+    frames = decoder.feed(b"\xff\x00" + encode_status_reply(1, MASK) + b"\x13\x37\x99" + encode_unlock_reply(0, 3))
+    assert [(frame.cmd, frame.board) for frame in frames] == [(CMD_STATUS, 1), (CMD_UNLOCK, 0)]
+    assert decoder.dropped == 5
+
+
+def test_decoder_resyncs_after_garbage_containing_stx() -> None:
+    decoder = FrameDecoder()
+    frames = decoder.feed(bytes([0x02, 0x01, 0x00, 0x50, 0x00]) + encode_status_reply(3, MASK))
+    assert [(frame.board, frame.mask) for frame in frames] == [(3, MASK)]
+    assert decoder.dropped == 5
+
+
+def test_decoder_resyncs_after_truncated_frame() -> None:
+    decoder = FrameDecoder()
+    truncated = encode_status_reply(1, MASK)[:7]
+    frames = decoder.feed(truncated + encode_status_reply(2, MASK))
+    assert [frame.board for frame in frames] == [2]
+    assert decoder.dropped == len(truncated)
+
+
+def test_decoder_waits_for_the_rest_of_a_frame() -> None:
+    decoder = FrameDecoder()
+    reply = encode_status_reply(1, MASK)
+    assert decoder.feed(reply[:5]) == []
+    assert [frame.mask for frame in decoder.feed(reply[5:])] == [MASK]
+
+
+def test_decoder_reset_drops_partial_frame() -> None:
+    decoder = FrameDecoder()
+    decoder.feed(encode_status_reply(1, MASK)[:6])
+    decoder.reset()
+    assert decoder.dropped == 6
+    assert [frame.board for frame in decoder.feed(encode_status_reply(4, MASK))] == [4]
+
+
+def test_decoder_bounds_its_buffer() -> None:
+    decoder = FrameDecoder()
+    assert decoder.feed(b"\x00" * (MAX_BUFFER + 1)) == []
+    assert decoder.dropped == MAX_BUFFER + 1
+    assert [frame.board for frame in decoder.feed(encode_unlock_reply(1, 1))] == [1]
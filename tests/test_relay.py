@@ -0,0 +1,119 @@
+import pytest
+
+from helpers import wait_until
+
+from relay import DeviceManager
+from simulator import SimulatedSite
+
+pytestmark = pytest.mark.anyio
+
+OFFLINE_GATEWAY = "10.0.0.2"
+
+
+async def test_pulse_opens_lock(site: SimulatedSite, manager: DeviceManager) -> None:
+    result = await manager.pulse_lock("1-6")
+    assert result == {"message": "Locker # 1-6 opened successfully"}
+    gateway = site.gateways["10.0.0.1"]
+    await wait_until(lambda: gateway.stats.unlocked == [(1, 2)])
+    assert not gateway.is_closed(1, 2)
+
+
+async def test_confirmed_pulse_reports_open_lock(manager: DeviceManager) -> None:
+    result = await manager.pulse_lock("2-3", confirm=True)
+    assert result["confirmed"] is True
+    assert result["message"] == "Locker # 2-3 opened successfully"
+    assert set(result["timings"]) == {"queue_wait_ms", "write_ms", "confirm_ms"}
+
+
+async def test_confirmed_pulse_reports_lock_that_stayed_closed(site: SimulatedSite, manager: DeviceManager) -> None:
+    site.gateways["10.0.0.1"].faults.close_after = 0
+    result = await manager.pulse_lock("1-1", confirm=True)
+    assert result["confirmed"] is False
+    assert result["message"] == "Locker # 1-1 is still closed"
+
+
+async def test_pulse_unknown_lock(site: SimulatedSite, manager: DeviceManager) -> None:
+    assert await manager.pulse_lock("9-9") == {"error": "Locker # 9-9 not found"}
+    assert all(not gateway.stats.unlocked for gateway in site.gateways.values())
+
+
+async def test_batch_pulse_reports_each_lock(site: SimulatedSite, manager: DeviceManager) -> None:
+    result = await manager.pulse_batch(["1-1", "2-8", "9-9"])
+    assert {lock_id: outcome["ok"] for lock_id, outcome in result["results"].items()} == {"1-1": True, "2-8": True, "9-9": False}
+    await wait_until(lambda: site.gateways["10.0.0.2"].stats.unlocked == [(1, 4)])
+
+
+async def test_status_reports_lock_states(site: SimulatedSite, manager: DeviceManager) -> None:
+    site.gateways["10.0.0.1"].set_lock(1, 2, closed=False)
+    await manager.poller.refresh("10.0.0.1")
+    status = await manager.relaystatus()
+    assert status["id"]["1-6"] == {"status": False}
+    assert status["id"]["1-5"] == {"status": True}
+    assert len(status["id"]) == 16
+    assert all(info["online"] and not info["stale"] for info in status["gateways"].values())
+
+
+async def test_filtered_status_returns_requested_locks(site: SimulatedSite, manager: DeviceManager) -> None:
+    site.gateways["10.0.0.2"].set_lock(0, 4, closed=False)
+    await manager.poller.refresh("10.0.0.2")
+    status = await manager.query_status(ids=["2-4", "2-5", "9-9"])
+    assert status["id"] == {"2-4": {"status": False}, "2-5": {"status": True}}
+    assert list(status["gateways"]) == ["10.0.0.2"]
+    assert (await manager.query_status(prefix="1-"))["id"].keys() == {f"1-{lock}" for lock in range(1, 9)}
+
+
+async def test_status_payload_is_reused_until_locks_change(site: SimulatedSite, manager: DeviceManager) -> None:
+    payload = await manager.status_payload()
+    assert await manager.status_payload() is payload
+    site.gateways["10.0.0.2"].set_lock(0, 1, closed=False)
+    await manager.poller.refresh("10.0.0.2")
+    changed = await manager.status_payload()
+    assert changed.etag != payload.etag
+    assert b'"2-1":{"status":false}' in changed.body
+
+
+async def test_gateway_going_offline(site: SimulatedSite, manager: DeviceManager) -> None:
+    await site.gateways[OFFLINE_GATEWAY].stop()
+    device = manager.devices[OFFLINE_GATEWAY]
+    await manager.poller.refresh(OFFLINE_GATEWAY)
+    await wait_until(lambda: not device.health.online)
+
+    assert await manager.pulse_lock("2-1") == {"message": "Locker # 2-1 gateway is offline", "confirmed": False}
+    assert not site.gateways[OFFLINE_GATEWAY].stats.unlocked
+
+    await manager.poller.refresh(OFFLINE_GATEWAY)
+    status = await manager.relaystatus()
+    assert status["gateways"][OFFLINE_GATEWAY]["online"] is False
+    assert status["gateways"]["10.0.0.1"]["online"] is True
+    assert status["id"]["2-1"] == {"status": None}
+    assert status["id"]["1-1"] == {"status": True}
+
+
+async def test_gateway_recovers_after_reconnect(site: SimulatedSite, manager: DeviceManager) -> None:
+    gateway = site.gateways[OFFLINE_GATEWAY]
+    await gateway.stop()
+    device = manager.devices[OFFLINE_GATEWAY]
+    await manager.poller.refresh(OFFLINE_GATEWAY)
+    await wait_until(lambda: not device.health.online)
+
+    await gateway.accept_connections()
+    await wait_until(lambda: device.health.online)
+    assert await manager.pulse_lock("2-1") == {"message": "Locker # 2-1 opened successfully"}
+    await wait_until(lambda: gateway.stats.unlocked == [(0, 1)])
+
+
+async def test_gateway_offline_at_startup(site: SimulatedSite) -> None:
+    await site.gateways[OFFLINE_GATEWAY].stop()
+    manager = DeviceManager()
+    manager.start(site.config)
+    try:
+        await wait_until(lambda: len(manager.devices) == 2 and all(device.attempted for device in manager.devices.values()))
+        assert manager.devices["10.0.0.1"].health.online
+        assert not manager.devices[OFFLINE_GATEWAY].health.online
+        assert (await manager.pulse_lock("2-2"))["message"] == "Locker # 2-2 gateway is offline"
+        assert (await manager.pulse_lock("1-2"))["message"] == "Locker # 1-2 opened successfully"
+        health = await manager.gateway_health()
+        assert health[OFFLINE_GATEWAY]["state"] == "disconnected"
+        assert health[OFFLINE_GATEWAY]["last_error"]
+    finally:
+        await manager.stop()
@@ -0,0 +1,115 @@
+import pytest
+from typing import Dict, List
+
+from helpers import PASSWORD
+from helpers import USERNAME
+import httpx
+
+from token_store import MemoryTokenStore
+from token_store import open_token_store
+from token_store import SqliteTokenStore
+from token_store import TokenEntry
+from token_store import TokenStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request: pytest.FixtureRequest, tmp_path_factory: pytest.TempPathFactory) -> TokenStore:
+    if request.param == "memory":
+        return MemoryTokenStore()
+    return SqliteTokenStore(str(tmp_path_factory.mktemp("tokens") / "tokens.db"), refresh_interval=0)
+
+
+def test_open_token_store_without_path_keeps_tokens_in_memory() -> None:
+    assert isinstance(open_token_store(""), MemoryTokenStore)
+
+
+def test_store_set_get_delete(store: TokenStore) -> None:
+    assert store.get("alice") is None
+    store.set("alice", "a1")
+    store.set("alice", "a2")
+    assert store.get("alice") == "a2"
+    store.delete("alice")
+    assert store.get("alice") is None
+    assert store.entries() == {"alice": ("", 3)}
+
+
+def test_store_notifies_listeners(store: TokenStore) -> None:
+    changes: List[Dict[str, TokenEntry]] = []
+    store.listeners.append(changes.append)
+    store.set("alice", "a1")
+    store.delete("alice")
+    assert changes == [{"alice": ("a1", 1)}, {"alice": ("", 2)}]
+
+
+def test_merge_keeps_newer_versions(store: TokenStore) -> None:
+    store.set("alice", "a1")
+    store.set("alice", "a2")
+    assert store.merge({"alice": ("old", 1), "bob": ("b1", 4)}) == 1
+    assert store.get("alice") == "a2"
+    assert store.get("bob") == "b1"
+    assert store.merge({"alice": ("", 3)}) == 1
+    assert store.get("alice") is None
+    store.set("alice", "a4")
+    assert store.entries()["alice"] == ("a4", 4)
+
+
+def test_merge_breaks_version_ties_by_token_id(store: TokenStore) -> None:
+    store.merge({"alice": ("b", 2)})
+    assert store.merge({"alice": ("a", 2)}) == 0
+    assert store.merge({"alice": ("c", 2)}) == 1
+    assert store.get("alice") == "c"
+
+
+def test_sqlite_store_sees_writes_of_other_processes(tmp_path_factory: pytest.TempPathFactory) -> None:
+    path = str(tmp_path_factory.mktemp("shared") / "tokens.db")
+    first = SqliteTokenStore(path, refresh_interval=0)
+    second = SqliteTokenStore(path, refresh_interval=0)
+    first.set("alice", "a1")
+    assert second.get("alice") == "a1"
+    second.delete("alice")
+    assert first.get("alice") is None
+
+
+def test_sqlite_store_rereads_only_after_refresh_interval(tmp_path_factory: pytest.TempPathFactory) -> None:
+    path = str(tmp_path_factory.mktemp("interval") / "tokens.db")
+    writer = SqliteTokenStore(path, refresh_interval=0)
+    reader = SqliteTokenStore(path, refresh_interval=3600)
+    writer.set("alice", "a1")
+    assert reader.get("alice") is None
+    reader._next_refresh = 0
+    assert reader.get("alice") == "a1"
+
+
+async def login(client: httpx.AsyncClient) -> Dict[str, str]:
+    response = await client.post("/api/v1/token", json={"username": USERNAME, "password": PASSWORD})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.anyio
+async def test_login_rejects_wrong_password(client: httpx.AsyncClient) -> None:
+    response = await client.post("/api/v1/token", json={"username": USERNAME, "password": "wrong"})
+    assert response.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_logout_revokes_token(client: httpx.AsyncClient) -> None:
+    auth = await login(client)
+    assert (await client.get("/api/v1/users/me", headers=auth)).json() == {"username": USERNAME}
+    assert (await client.delete("/api/v1/token", headers=auth)).status_code == 204
+    assert (await client.get("/api/v1/users/me", headers=auth)).status_code == 401
+    assert (await client.get("/api/v1/status", headers=auth)).status_code == 401
+
+
+@pytest.mark.anyio
+async def test_new_login_replaces_previous_token(client: httpx.AsyncClient) -> None:
+    first = await login(client)
+    assert (await client.get("/api/v1/users/me", headers=first)).status_code == 200
+    second = await login(client)
+    assert (await client.get("/api/v1/users/me", headers=first)).status_code == 401
+    assert (await client.get("/api/v1/users/me", headers=second)).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_tampered_token_is_rejected(client: httpx.AsyncClient, auth: Dict[str, str]) -> None:
+    assert (await client.get("/api/v1/users/me", headers={"Authorization": auth["Authorization"] + "x"})).status_code == 401